@@ -1,9 +1,18 @@
-import boto3
 import json
+import os
+import time
 from datetime import datetime
 import base64
-import PyPDF2
 from io import BytesIO
+from shared import aws
+from shared import metrics
+from shared import profiling
+from shared.lazy import LazyModule
+
+# PyPDF2 is only needed for PDF answers, so text-only invocations never load it
+PyPDF2 = LazyModule('PyPDF2')
+
+BEDROCK_REGION = os.environ.get('BEDROCK_REGION', 'us-east-1')
 
 def extract_text_from_pdf(pdf_base64):
     """Extract text from base64 encoded PDF"""
@@ -24,10 +33,67 @@ def extract_text_from_pdf(pdf_base64):
     except Exception as e:
         raise Exception(f"Failed to extract text from PDF: {str(e)}")
 
+OUTPUT_FORMAT = """**Required Output Format (JSON):**
+{
+    "score": "<numeric score 0-100>",
+    "evaluation": "<brief evaluation of the answer>",
+    "justification": "<explain why this score was given>",
+    "suggessions": "<suggestions for improvement>"
+}
+
+Provide ONLY the JSON output, no additional text."""
+
+def build_prompt(user_answer, example_answer, rubric=None):
+    """Build the evaluation prompt, grading against the key-point rubric when one is provided"""
+    if rubric:
+        key_points = "\n".join(f"{i + 1}. {point}" for i, point in enumerate(rubric))
+        return f'''Grade the student's answer against the marking rubric.
+
+**Student's Answer:**
+{user_answer}
+
+**Rubric (key points):**
+{key_points}
+
+Score 0-100 in proportion to the key points covered correctly; deduct for factual errors.
+
+{OUTPUT_FORMAT}'''
+
+    return f'''You are an expert professor evaluating student answers. Your task is to compare the student's answer with the reference answer and provide a fair, accurate score.
+
+**Student's Answer:**
+{user_answer}
+
+**Reference Answer (Example):**
+{example_answer}
+
+**Evaluation Guidelines:**
+1. Score from 0-100 based on correctness, completeness, and accuracy
+2. If the student's answer matches or closely matches the reference answer, give 90-100
+3. If the answer covers most key points but misses some details, give 70-89
+4. If the answer is partially correct, give 50-69
+5. If the answer is mostly incorrect or incomplete, give below 50
+
+{OUTPUT_FORMAT}'''
+
+def record_usage(chunk_json):
+    """Token counts from the stream's metadata event (or Bedrock's invocation metrics)"""
+    usage = chunk_json.get("metadata", {}).get("usage")
+    if usage:
+        metrics.record("bedrock_input_tokens", usage.get("inputTokens", 0), "Count")
+        metrics.record("bedrock_output_tokens", usage.get("outputTokens", 0), "Count")
+        return
+    invocation = chunk_json.get("amazon-bedrock-invocationMetrics")
+    if invocation:
+        metrics.record("bedrock_input_tokens", invocation.get("inputTokenCount", 0), "Count")
+        metrics.record("bedrock_output_tokens", invocation.get("outputTokenCount", 0), "Count")
+
+@metrics.instrument('msc_evaluate')
+@profiling.profiled('msc_evaluate')
 def lambda_handler(event, context):
     try:
-        # Initialize Bedrock Runtime client
-        client = boto3.client("bedrock-runtime", region_name="us-east-1")
+        # Bedrock Runtime client is created once per container; responses stream for a while
+        client = aws.client("bedrock-runtime", region_name=BEDROCK_REGION, read_timeout=300)
 
         LITE_MODEL_ID = "amazon.nova-micro-v1:0"
 
@@ -35,11 +101,13 @@ def lambda_handler(event, context):
         user_answer = event.get("user_answer", "")
         pdf_data = event.get("pdf_data")
         example_answer = event.get("example_answer", "")
+        rubric = event.get("rubric")
 
         # If PDF is provided, extract text from it
         if pdf_data:
             try:
-                user_answer = extract_text_from_pdf(pdf_data)
+                with metrics.phase("pdf_extract"):
+                    user_answer = extract_text_from_pdf(pdf_data)
             except Exception as e:
                 return {
                     'statusCode': 400,
@@ -54,30 +122,7 @@ def lambda_handler(event, context):
             }
 
         # Construct the prompt for evaluation
-        prompt = f'''You are an expert professor evaluating student answers. Your task is to compare the student's answer with the reference answer and provide a fair, accurate score.
-
-**Student's Answer:**
-{user_answer}
-
-**Reference Answer (Example):**
-{example_answer}
-
-**Evaluation Guidelines:**
-1. Score from 0-100 based on correctness, completeness, and accuracy
-2. If the student's answer matches or closely matches the reference answer, give 90-100
-3. If the answer covers most key points but misses some details, give 70-89
-4. If the answer is partially correct, give 50-69
-5. If the answer is mostly incorrect or incomplete, give below 50
-
-**Required Output Format (JSON):**
-{{
-    "score": "<numeric score 0-100>",
-    "evaluation": "<brief evaluation of the answer>",
-    "justification": "<explain why this score was given>",
-    "suggessions": "<suggestions for improvement>"
-}}
-
-Provide ONLY the JSON output, no additional text.'''
+        prompt = build_prompt(user_answer, example_answer, rubric)
 
         message_list = [
             {"role": "user", "content": [{"text": prompt}]}
@@ -96,6 +141,7 @@ Provide ONLY the JSON output, no additional text.'''
 
         # Start time
         start_time = datetime.now()
+        started = time.perf_counter()
 
         response = client.invoke_model_with_response_stream(
             modelId=LITE_MODEL_ID,
@@ -120,7 +166,12 @@ Provide ONLY the JSON output, no additional text.'''
             if chunk:
                 chunk_json = json.loads(chunk.get("bytes").decode())
                 content_block_delta = chunk_json.get("contentBlockDelta", {}).get("delta", {}).get("text", "")
+                if content_block_delta and not response_data:
+                    metrics.record("bedrock_ttft_ms", (time.perf_counter() - started) * 1000)
                 response_data += content_block_delta
+                record_usage(chunk_json)
+        metrics.record("bedrock_latency_ms", (time.perf_counter() - started) * 1000)
+        metrics.set_property("model_id", LITE_MODEL_ID)
 
         return {
             'statusCode': 200,
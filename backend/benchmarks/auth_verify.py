@@ -0,0 +1,84 @@
+"""
+Session token cost: issuing and verifying tokens per request.
+
+    python benchmarks/auth_verify.py
+    python benchmarks/auth_verify.py -n 200000 --keys 3
+
+Times shared.auth.issue_token, verify_token and authenticate (header parsing
+plus verification, what every handler runs) in-process, and, for comparison,
+the users-table get_item that per-request auth would otherwise need, against
+the in-memory DynamoDB in fake_dynamodb.py. The fake has no network latency,
+so the get_item row is a lower bound; in Lambda a DynamoDB read adds a few
+milliseconds on top. With --keys N the secret holds N keys and tokens are
+signed with the last one, the worst case during a key rotation.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_dynamodb import FakeDynamoDB
+from shared import auth
+from shared import aws
+
+USER = {'user_id': '5f0c7b1e-3f57-4d1c-9a43-0d7f0a3c2b11', 'username': 'student000042', 'role': 'student'}
+
+
+def per_call_us(fn, n):
+    start = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - start) / n * 1e6
+
+
+def run(n, key_count):
+    keys = [f'benchmark-key-{i}' for i in range(key_count)]
+    # Sign with the last key so verification tries every key before it matches
+    os.environ['SESSION_TOKEN_SECRET'] = keys[-1]
+    auth.reset()
+    token, _ = auth.issue_token(USER)
+    os.environ['SESSION_TOKEN_SECRET'] = ','.join(keys)
+    auth.reset()
+
+    start = time.perf_counter()
+    auth.signing_keys()
+    key_load_us = (time.perf_counter() - start) * 1e6
+
+    event = {'headers': {'Authorization': f'Bearer {token}'}}
+    dynamodb = FakeDynamoDB({aws.table_name('users'): ('user_id', None, {})})
+    dynamodb.Table(aws.table_name('users')).put_item(Item=dict(USER, password='x', email='s@example.com'))
+    aws.install(dynamodb=dynamodb)
+    users = aws.table('users')
+
+    return [
+        {'operation': 'key load (cold, env)', 'us_per_call': round(key_load_us, 2), 'dynamodb_reads': 0},
+        {'operation': 'issue_token', 'us_per_call': round(per_call_us(lambda: auth.issue_token(USER), n), 2),
+         'dynamodb_reads': 0},
+        {'operation': 'verify_token', 'us_per_call': round(per_call_us(lambda: auth.verify_token(token), n), 2),
+         'dynamodb_reads': 0},
+        {'operation': 'authenticate(event)', 'us_per_call': round(per_call_us(lambda: auth.authenticate(event), n), 2),
+         'dynamodb_reads': 0},
+        {'operation': 'users get_item (fake)', 'us_per_call': round(per_call_us(
+            lambda: users.get_item(Key={'user_id': USER['user_id']}), max(1, n // 10)), 2), 'dynamodb_reads': 1},
+    ]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('-n', '--iterations', type=int, default=100000)
+    parser.add_argument('--keys', type=int, default=1, help='keys in the secret (rotation)')
+    parser.add_argument('--json', action='store_true', help='print rows as JSON')
+    args = parser.parse_args()
+
+    rows = run(args.iterations, args.keys)
+    if args.json:
+        print(json.dumps(rows, indent=2))
+    else:
+        print(f"{'operation':<24} {'us/call':>10} {'reads':>6}")
+        for row in rows:
+            print(f"{row['operation']:<24} {row['us_per_call']:>10} {row['dynamodb_reads']:>6}")
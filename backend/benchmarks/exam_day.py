@@ -0,0 +1,380 @@
+"""
+Exam-day load generator: a cohort opens a quiz together and submits near the deadline.
+
+    python benchmarks/exam_day.py                                    # local_api.py on port 3001
+    python benchmarks/exam_day.py --students 500 --open-curve burst --open-window 60 \\
+        --duration 300 --submit-curve deadline --pdf-share 0.1
+    python benchmarks/exam_day.py https://<api-id>.execute-api.<region>.amazonaws.com/dev \\
+        --username-format 'cohort{:04d}' --password ... --tutor-user ... --tutor-password ...
+
+Every student runs login -> take_quiz -> submit_quiz. Each student opens the
+quiz at a time drawn from --open-curve over --open-window seconds. They answer
+until a time drawn from --submit-curve over --duration seconds after opening,
+then submit. The answers are --answer-words long, and a --pdf-share of them are
+sent as generated PDFs. get_results only serves staff, so --tutors tutor
+sessions log in and poll the results listing every --poll-interval seconds
+until the last student has submitted.
+
+The report has throughput, latency percentiles, error and timeout rates per
+step, and a timeline in --interval buckets. The timeline shows the same
+figures, plus submissions in flight and the evaluator's concurrency. The
+evaluator concurrency comes from ``/_local/stats`` when the target is
+local_api.py. A deployed stage has no such endpoint, so only the client-side
+figures are shown. Use the MSC_Evaluate metrics in CloudWatch there instead.
+
+The client is plain asyncio with one connection per request, so it needs
+nothing outside the standard library.
+"""
+import argparse
+import asyncio
+import base64
+import json
+import random
+import ssl
+import statistics
+import time
+from urllib.parse import urlencode, urlsplit
+
+# Fractions of a window at which events happen; each curve is a distribution on [0, 1]
+CURVES = {
+    'uniform': lambda rng: rng.random(),
+    'burst': lambda rng: rng.betavariate(1, 12),
+    'ramp': lambda rng: rng.random() ** 0.5,
+    'deadline': lambda rng: rng.betavariate(8, 1.2),
+}
+STEPS = ('login', 'take_quiz', 'submit_quiz', 'get_results')
+WORDS = ('the', 'method', 'applies', 'definition', 'step', 'by', 'concept', 'example', 'because', 'result',
+         'therefore', 'course', 'notes', 'problem', 'proof', 'value', 'function', 'each', 'case', 'shows')
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def pdf_document(text):
+    """A one-page PDF whose text layer is ``text``, readable by PyPDF2"""
+    words, lines, line = text.split(), [], ''
+    for word in words:
+        if len(line) + len(word) > 80:
+            lines.append(line)
+            line = ''
+        line = f'{line} {word}'.strip()
+    lines.append(line)
+    escaped = [l.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)') for l in lines]
+    stream = 'BT /F1 11 Tf 14 TL 72 760 Td ' + ' '.join(f'({l}) Tj T*' for l in escaped) + ' ET'
+    objects = [
+        '<< /Type /Catalog /Pages 2 0 R >>',
+        '<< /Type /Pages /Kids [3 0 R] /Count 1 >>',
+        '<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents 4 0 R '
+        '/Resources << /Font << /F1 5 0 R >> >> >>',
+        f'<< /Length {len(stream)} >>\nstream\n{stream}\nendstream',
+        '<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>',
+    ]
+    out = '%PDF-1.4\n'
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += f'{number} 0 obj\n{body}\nendobj\n'
+    xref = len(out)
+    out += f'xref\n0 {len(objects) + 1}\n0000000000 65535 f \n'
+    out += ''.join(f'{offset:010d} 00000 n \n' for offset in offsets)
+    out += f'trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n'
+    return out.encode('latin-1', 'replace')
+
+
+class Client:
+    """Minimal asyncio HTTP/1.1 client: one connection per request, like a cohort of browsers"""
+
+    def __init__(self, base_url, timeout_s, max_connections):
+        url = urlsplit(base_url)
+        self.secure = url.scheme == 'https'
+        self.host = url.hostname
+        self.port = url.port or (443 if self.secure else 80)
+        self.prefix = url.path.rstrip('/')
+        self.timeout_s = timeout_s
+        self.slots = asyncio.Semaphore(max_connections)
+        self.ssl = ssl.create_default_context() if self.secure else None
+
+    async def request(self, method, path, body=None, headers=None):
+        """(status, parsed JSON body or None); raises asyncio.TimeoutError after timeout_s"""
+        async with self.slots:
+            return await asyncio.wait_for(self._request(method, path, body, headers or {}), self.timeout_s)
+
+    async def _request(self, method, path, body, headers):
+        payload = b'' if body is None else json.dumps(body).encode('utf-8')
+        lines = [f'{method} {self.prefix}{path} HTTP/1.1', f'Host: {self.host}', 'Connection: close',
+                 'Content-Type: application/json', f'Content-Length: {len(payload)}']
+        lines += [f'{name}: {value}' for name, value in headers.items()]
+        reader, writer = await asyncio.open_connection(self.host, self.port, ssl=self.ssl)
+        try:
+            writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + payload)
+            await writer.drain()
+            raw = await reader.read()
+        finally:
+            writer.close()
+        head, _, content = raw.partition(b'\r\n\r\n')
+        status_line, *header_lines = head.decode('latin-1').split('\r\n')
+        response_headers = {k.strip().lower(): v.strip() for k, _, v in (h.partition(':') for h in header_lines)}
+        if response_headers.get('transfer-encoding') == 'chunked':
+            content = _dechunk(content)
+        try:
+            parsed = json.loads(content) if content else None
+        except ValueError:
+            parsed = None
+        return int(status_line.split()[1]), parsed
+
+
+def _dechunk(content):
+    out = b''
+    while content:
+        size_line, _, content = content.partition(b'\r\n')
+        size = int(size_line.split(b';')[0], 16)
+        if size == 0:
+            break
+        out, content = out + content[:size], content[size + 2:]
+    return out
+
+
+class Recorder:
+    """Completed requests and periodic gauges, bucketed into a timeline"""
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.requests = []   # (finished at s, step, latency ms, outcome, HTTP status or None)
+        self.gauges = []     # (at s, submits in flight, evaluator active or None)
+        self.in_flight = {step: 0 for step in STEPS}
+
+    def now(self):
+        return time.monotonic() - self.started
+
+    async def timed(self, step, call, ok_statuses=(200, 201, 304)):
+        """Run ``call()`` and record it; returns the parsed body, or None when the step failed"""
+        self.in_flight[step] += 1
+        started = time.monotonic()
+        try:
+            status, body = await call()
+            outcome = 'ok' if status in ok_statuses else ('timeout' if status == 504 else 'error')
+        except asyncio.TimeoutError:
+            status, body, outcome = None, None, 'timeout'
+        except OSError:
+            status, body, outcome = None, None, 'error'
+        finally:
+            self.in_flight[step] -= 1
+        self.requests.append((self.now(), step, (time.monotonic() - started) * 1000, outcome, status))
+        return body if outcome == 'ok' else None
+
+    def summary(self):
+        rows = []
+        for step in STEPS:
+            records = [r for r in self.requests if r[1] == step]
+            if not records:
+                continue
+            latencies = [r[2] for r in records]
+            ok = sum(r[3] == 'ok' for r in records)
+            span = max(r[0] for r in records) - min(r[0] - r[2] / 1000 for r in records)
+            rows.append({
+                'step': step, 'requests': len(records), 'ok': ok,
+                'errors': sum(r[3] == 'error' for r in records),
+                'timeouts': sum(r[3] == 'timeout' for r in records),
+                'rps': round(ok / span, 2) if span > 0 else None,
+                'p50_ms': round(statistics.median(latencies), 1),
+                'p95_ms': round(percentile(latencies, 0.95), 1),
+                'p99_ms': round(percentile(latencies, 0.99), 1),
+                'failed_statuses': {str(status): sum(1 for r in records if r[3] != 'ok' and r[4] == status)
+                                    for status in sorted({r[4] for r in records if r[3] != 'ok'}, key=str)},
+            })
+        return rows
+
+    def timeline(self, interval):
+        buckets = {}
+        for finished, step, latency, outcome, _ in self.requests:
+            buckets.setdefault(int(finished // interval), []).append((latency, outcome))
+        gauges = {}
+        for at, submits, evaluator in self.gauges:
+            gauges.setdefault(int(at // interval), []).append((submits, evaluator))
+        rows = []
+        for bucket in range(max(list(buckets) + list(gauges) + [0]) + 1):
+            records = buckets.get(bucket, [])
+            samples = gauges.get(bucket, [])
+            evaluator = [e for _, e in samples if e is not None]
+            latencies = [latency for latency, _ in records]
+            rows.append({
+                't_s': bucket * interval,
+                'rps': round(sum(o == 'ok' for _, o in records) / interval, 2),
+                'p95_ms': round(percentile(latencies, 0.95), 1) if latencies else None,
+                'errors': sum(o == 'error' for _, o in records),
+                'timeouts': sum(o == 'timeout' for _, o in records),
+                'submits_in_flight': max((s for s, _ in samples), default=0),
+                'evaluator_active': max(evaluator) if evaluator else None,
+            })
+        return rows
+
+
+async def sleep_until(recorder, at):
+    delay = at - recorder.now()
+    if delay > 0:
+        await asyncio.sleep(delay)
+
+
+def build_answers(rng, questions, words, pdf_share):
+    answers = []
+    for i, question in enumerate(questions):
+        text = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(*words)))
+        answer = {'question_index': question.get('question_index', i), 'answer_text': text}
+        if rng.random() < pdf_share:
+            answer.update(answer_text='', pdf_data=base64.b64encode(pdf_document(text)).decode('ascii'),
+                          pdf_filename=f'answer-{i}.pdf')
+        answers.append(answer)
+    return answers
+
+
+async def student(client, recorder, args, i, template_id, open_at, submit_at, rng):
+    await sleep_until(recorder, open_at)
+    username = args.username_format.format(i)
+    login = await recorder.timed('login', lambda: client.request(
+        'POST', '/users/login', {'username': username, 'password': args.password}))
+    if not login:
+        return
+    auth = {'Authorization': f"Bearer {login['token']}"}
+    view = await recorder.timed('take_quiz', lambda: client.request(
+        'GET', f'/templates/{template_id}/quiz', headers=auth))
+    if not view:
+        return
+    quiz = view.get('quiz', view)
+    body = {'template_id': template_id, 'student_name': username,
+            'answers': build_answers(rng, quiz.get('questions', []), args.answer_words, args.pdf_share)}
+    if view.get('session_id'):
+        body['session_id'] = view['session_id']
+    await sleep_until(recorder, submit_at)
+    await recorder.timed('submit_quiz', lambda: client.request('POST', '/submit', body, headers=auth))
+
+
+async def tutor(client, recorder, args, course, done):
+    login = await recorder.timed('login', lambda: client.request(
+        'POST', '/users/login', {'username': args.tutor_user, 'password': args.tutor_password}))
+    if not login:
+        return
+    auth = {'Authorization': f"Bearer {login['token']}"}
+    query = urlencode({'course': course}) if course else ''
+    while not done.is_set():
+        await recorder.timed('get_results', lambda: client.request('GET', f'/results?{query}', headers=auth))
+        try:
+            await asyncio.wait_for(done.wait(), args.poll_interval)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def sample_gauges(client, recorder, interval, done):
+    """Record submissions in flight and, against local_api.py, the evaluator's active containers"""
+    local_stats = True
+    while not done.is_set():
+        evaluator = None
+        if local_stats:
+            try:
+                status, stats = await client.request('GET', '/_local/stats')
+                if status == 200:
+                    evaluator = stats['functions']['msc_evaluate']['active']
+                else:
+                    local_stats = False
+            except (asyncio.TimeoutError, OSError):
+                local_stats = False
+        recorder.gauges.append((recorder.now(), recorder.in_flight['submit_quiz'], evaluator))
+        try:
+            await asyncio.wait_for(done.wait(), interval)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def discover_template(client, args):
+    """The quiz to take and its course: --template-id, or the first template a tutor can list"""
+    status, login = await client.request('POST', '/users/login',
+                                         {'username': args.tutor_user, 'password': args.tutor_password})
+    if status != 200:
+        raise SystemExit(f'Tutor login failed with status {status}')
+    auth = {'Authorization': f"Bearer {login['token']}"}
+    if args.template_id:
+        status, body = await client.request('GET', f'/templates/{args.template_id}', headers=auth)
+        template = (body or {}).get('template', body or {})
+        return args.template_id, template.get('course')
+    status, body = await client.request('GET', '/templates', headers=auth)
+    templates = (body or {}).get('templates') or []
+    if not templates:
+        raise SystemExit(f'No templates to take (status {status}); pass --template-id')
+    return templates[0]['template_id'], templates[0].get('course')
+
+
+async def run(args):
+    client = Client(args.base_url, args.timeout, args.max_connections)
+    template_id, course = await discover_template(client, args)
+    rng = random.Random(args.seed)
+    open_curve, submit_curve = CURVES[args.open_curve], CURVES[args.submit_curve]
+
+    recorder = Recorder()
+    done = asyncio.Event()
+    students = []
+    for n in range(args.students):
+        open_at = open_curve(rng) * args.open_window
+        submit_at = open_at + max(args.min_answer_time, submit_curve(rng) * args.duration)
+        students.append(student(client, recorder, args, args.first_user + n, template_id, open_at, submit_at,
+                                random.Random(rng.random())))
+    background = [asyncio.create_task(sample_gauges(client, recorder, args.sample_interval, done))]
+    background += [asyncio.create_task(tutor(client, recorder, args, course, done)) for _ in range(args.tutors)]
+    await asyncio.gather(*students)
+    done.set()
+    await asyncio.gather(*background)
+    return {'template_id': template_id, 'duration_s': round(recorder.now(), 1),
+            'steps': recorder.summary(), 'timeline': recorder.timeline(args.interval)}
+
+
+def print_report(report):
+    print(f"template {report['template_id']}, {report['duration_s']} s")
+    print(f"{'step':<12} {'requests':>8} {'ok':>6} {'errors':>7} {'timeouts':>8} {'rps':>8} "
+          f"{'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for row in report['steps']:
+        print(f"{row['step']:<12} {row['requests']:>8} {row['ok']:>6} {row['errors']:>7} {row['timeouts']:>8} "
+              f"{str(row['rps']):>8} {row['p50_ms']:>9} {row['p95_ms']:>9} {row['p99_ms']:>9}")
+    for row in report['steps']:
+        if row['failed_statuses']:
+            failed = ', '.join(f'{status} x{count}' for status, count in row['failed_statuses'].items())
+            print(f"{row['step']} failures by status: {failed}")
+    print()
+    print(f"{'t s':>6} {'rps':>8} {'p95 ms':>9} {'errors':>7} {'timeouts':>8} {'submits':>8} {'evaluator':>9}")
+    for row in report['timeline']:
+        evaluator = '-' if row['evaluator_active'] is None else row['evaluator_active']
+        print(f"{row['t_s']:>6} {row['rps']:>8} {str(row['p95_ms']):>9} {row['errors']:>7} {row['timeouts']:>8} "
+              f"{row['submits_in_flight']:>8} {evaluator:>9}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('base_url', nargs='?', default='http://127.0.0.1:3001/dev', help='stage URL')
+    parser.add_argument('--students', type=int, default=200)
+    parser.add_argument('--open-curve', choices=sorted(CURVES), default='burst')
+    parser.add_argument('--open-window', type=float, default=30, help='seconds over which students open the quiz')
+    parser.add_argument('--submit-curve', choices=sorted(CURVES), default='deadline')
+    parser.add_argument('--duration', type=float, default=120, help='seconds from opening to the deadline')
+    parser.add_argument('--min-answer-time', type=float, default=5, help='seconds a student spends at least')
+    parser.add_argument('--answer-words', type=int, nargs=2, default=[40, 200], metavar=('MIN', 'MAX'))
+    parser.add_argument('--pdf-share', type=float, default=0.0, help='fraction of answers sent as PDFs')
+    parser.add_argument('--tutors', type=int, default=3, help='staff sessions polling get_results')
+    parser.add_argument('--poll-interval', type=float, default=10)
+    parser.add_argument('--username-format', default='student{:06d}')
+    parser.add_argument('--first-user', type=int, default=1)
+    parser.add_argument('--password', default='benchmark-password')
+    parser.add_argument('--tutor-user', default='admin')
+    parser.add_argument('--tutor-password', default='local-admin-password')
+    parser.add_argument('--template-id', help='quiz to take (default: the first listed template)')
+    parser.add_argument('--timeout', type=float, default=30, help='client timeout per request in seconds')
+    parser.add_argument('--max-connections', type=int, default=500)
+    parser.add_argument('--interval', type=float, default=5, help='timeline bucket in seconds')
+    parser.add_argument('--sample-interval', type=float, default=1, help='seconds between gauge samples')
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--json', action='store_true', help='print the report as JSON')
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
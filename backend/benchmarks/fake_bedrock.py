@@ -0,0 +1,117 @@
+"""
+In-memory stand-ins for the Bedrock Runtime and Lambda clients.
+
+``FakeBedrockRuntime.invoke_model_with_response_stream`` returns the event
+stream a Nova model sends (messageStart, contentBlockDelta chunks,
+contentBlockStop, messageStop, metadata), with a configurable time to first
+token and token rate, so MSC_Evaluate can run offline. The reply is a
+grading JSON whose score is derived from the prompt, so the same answer
+always gets the same score.
+
+``FakeLambda`` runs ``lambda_handler`` functions in-process for
+``lambda.invoke``, the way submit_quiz calls the evaluator.
+
+    bedrock = FakeBedrockRuntime(ttft_ms=300, tokens_per_s=150)
+    aws.install(dynamodb=FakeDynamoDB(...), bedrock_runtime=bedrock,
+                lambda_=FakeLambda({aws.function_name('evaluate'): lambda_function.lambda_handler}))
+"""
+import hashlib
+import io
+import json
+import threading
+import time
+import uuid
+
+# Roughly four characters per token, as for English text
+CHARS_PER_TOKEN = 4
+
+
+def grading_reply(prompt):
+    """Deterministic grading JSON for a prompt"""
+    score = 40 + int(hashlib.sha256(prompt.encode('utf-8')).hexdigest()[:8], 16) % 61
+    return json.dumps({
+        'score': str(score),
+        'evaluation': 'The answer covers the main ideas of the reference answer with some gaps.',
+        'justification': f'Most key points are present and correct, which puts the answer at {score}.',
+        'suggessions': 'Explain each step and add an example from the course material.'
+    }, indent=4)
+
+
+class FakeBedrockRuntime:
+    """Streams replies from ``reply(prompt)`` at ``tokens_per_s`` after ``ttft_ms`` (0 means no delay)"""
+
+    def __init__(self, ttft_ms=0, tokens_per_s=0, reply=grading_reply):
+        self.ttft_ms = ttft_ms
+        self.tokens_per_s = tokens_per_s
+        self.reply = reply
+        self._lock = threading.Lock()
+        self.reset_stats()
+
+    def reset_stats(self):
+        with self._lock:
+            self.requests = 0
+            self.input_tokens = 0
+            self.output_tokens = 0
+
+    def _record(self, input_tokens, output_tokens):
+        with self._lock:
+            self.requests += 1
+            self.input_tokens += input_tokens
+            self.output_tokens += output_tokens
+
+    def invoke_model_with_response_stream(self, modelId, body, **kwargs):
+        request = json.loads(body)
+        prompt = ''.join(
+            block.get('text', '')
+            for message in request.get('messages', []) for block in message.get('content', [])
+        )
+        text = self.reply(prompt)
+        return {
+            'ResponseMetadata': {'RequestId': str(uuid.uuid4()), 'HTTPStatusCode': 200},
+            'contentType': 'application/json',
+            'body': self._stream(prompt, text)
+        }
+
+    def _stream(self, prompt, text):
+        started = time.perf_counter()
+        tokens = [text[i:i + CHARS_PER_TOKEN] for i in range(0, len(text), CHARS_PER_TOKEN)]
+        input_tokens = max(1, len(prompt) // CHARS_PER_TOKEN)
+
+        yield _chunk({'messageStart': {'role': 'assistant'}})
+        if self.ttft_ms:
+            time.sleep(self.ttft_ms / 1000)
+        for i, token in enumerate(tokens):
+            if self.tokens_per_s and i:
+                time.sleep(1 / self.tokens_per_s)
+            yield _chunk({'contentBlockDelta': {'delta': {'text': token}, 'contentBlockIndex': 0}})
+        yield _chunk({'contentBlockStop': {'contentBlockIndex': 0}})
+        yield _chunk({'messageStop': {'stopReason': 'end_turn'}})
+        yield _chunk({'metadata': {
+            'usage': {'inputTokens': input_tokens, 'outputTokens': len(tokens)},
+            'metrics': {'latencyMs': round((time.perf_counter() - started) * 1000)}
+        }})
+        self._record(input_tokens, len(tokens))
+
+
+def _chunk(event):
+    return {'chunk': {'bytes': json.dumps(event).encode('utf-8')}}
+
+
+class FakeLambda:
+    """Lambda client whose invoke() calls local handlers: {function name: lambda_handler}"""
+
+    def __init__(self, handlers):
+        self.handlers = handlers
+        self._lock = threading.Lock()
+        self.invocations = {}
+
+    def invoke(self, FunctionName, Payload=b'{}', InvocationType='RequestResponse', **kwargs):
+        with self._lock:
+            self.invocations[FunctionName] = self.invocations.get(FunctionName, 0) + 1
+        handler = self.handlers[FunctionName]
+        event = json.loads(Payload or b'{}')
+        if InvocationType == 'Event':
+            threading.Thread(target=handler, args=(event, None), daemon=True).start()
+            return {'StatusCode': 202, 'Payload': io.BytesIO(b'')}
+        result = handler(event, None)
+        return {'StatusCode': 200, 'Payload': io.BytesIO(json.dumps(result).encode('utf-8'))}
@@ -0,0 +1,967 @@
+"""
+In-memory stand-in for the boto3 DynamoDB resource.
+
+Implements the subset of the Table / resource API the handlers use, including
+condition, filter, key-condition, projection and update expressions, GSIs,
+1 MB result pages, batch and transactional writes, and consumed capacity
+accounting. Batch calls enforce DynamoDB's request limits (25 writes, 100
+keys, no repeated keys) and count as one call however many items they carry. Like boto3 it stores numbers as Decimal and rejects floats, so
+code that works against it behaves the same against DynamoDB. Items are also
+kept per hash key, so a Query reads one partition while a Scan reads them all.
+
+    dynamodb = FakeDynamoDB()
+    dynamodb.create_table('msc-evaluate-users-dev', 'user_id',
+                          indexes={'username-index': ('username', None)})
+    aws.install(dynamodb=dynamodb)
+"""
+import copy
+import json
+import math
+import re
+import threading
+from decimal import Decimal
+
+PAGE_LIMIT_BYTES = 1024 * 1024
+BATCH_WRITE_LIMIT = 25
+BATCH_GET_LIMIT = 100
+
+
+class FakeClientError(Exception):
+    """Mimics botocore.exceptions.ClientError (exposes .response['Error']['Code'])"""
+    def __init__(self, code, message=''):
+        super().__init__(f'An error occurred ({code}): {message}')
+        self.response = {'Error': {'Code': code, 'Message': message}}
+
+
+# ---------------------------------------------------------------------------
+# Values
+
+def to_dynamo(value):
+    """Validate and normalize a value the way boto3's serializer would"""
+    if isinstance(value, bool) or value is None or isinstance(value, str):
+        return value
+    if isinstance(value, float):
+        raise TypeError('Float types are not supported. Use Decimal types instead.')
+    if isinstance(value, int):
+        return Decimal(value)
+    if isinstance(value, Decimal):
+        return value
+    if isinstance(value, (bytes, bytearray)):
+        return bytes(value)
+    if isinstance(value, dict):
+        return {str(k): to_dynamo(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_dynamo(v) for v in value]
+    if isinstance(value, set):
+        return {to_dynamo(v) for v in value}
+    raise TypeError(f'Unsupported type "{type(value).__name__}" for value "{value}"')
+
+
+def item_size(item):
+    """Approximate DynamoDB item size in bytes"""
+    def size(value):
+        if isinstance(value, str):
+            return len(value.encode('utf-8'))
+        if isinstance(value, bool) or value is None:
+            return 1
+        if isinstance(value, Decimal):
+            return len(str(value)) // 2 + 1
+        if isinstance(value, bytes):
+            return len(value)
+        if isinstance(value, dict):
+            return 3 + sum(len(k.encode('utf-8')) + size(v) + 1 for k, v in value.items())
+        if isinstance(value, (list, set)):
+            return 3 + sum(size(v) + 1 for v in value)
+        return len(str(value))
+    return sum(len(name.encode('utf-8')) + size(value) for name, value in item.items())
+
+
+def _key_bytes(value):
+    return json.dumps(value, default=str, sort_keys=True)
+
+
+# ---------------------------------------------------------------------------
+# Expressions
+
+TOKEN_RE = re.compile(r"""
+    \s*(?:
+        (?P<num>\d+)
+      | (?P<op><>|<=|>=|=|<|>|\(|\)|,|\.|\[|\]|\+|-)
+      | (?P<value>:[A-Za-z0-9_]+)
+      | (?P<name>\#[A-Za-z0-9_]+|[A-Za-z_][A-Za-z0-9_\-]*)
+    )""", re.VERBOSE)
+
+KEYWORDS = {'AND', 'OR', 'NOT', 'BETWEEN', 'IN', 'SET', 'REMOVE', 'ADD', 'DELETE'}
+
+
+def tokenize(expression):
+    tokens = []
+    pos = 0
+    expression = expression.strip()
+    while pos < len(expression):
+        match = TOKEN_RE.match(expression, pos)
+        if not match or match.end() == pos:
+            raise FakeClientError('ValidationException', f'Invalid expression near: {expression[pos:]}')
+        pos = match.end()
+        kind = match.lastgroup
+        text = match.group(kind)
+        if kind == 'name' and text.upper() in KEYWORDS:
+            tokens.append(('kw', text.upper()))
+        else:
+            tokens.append((kind, text))
+    return tokens
+
+
+class _Missing:
+    pass
+
+
+MISSING = _Missing()
+
+
+class Parser:
+    def __init__(self, expression, names=None, values=None):
+        self.tokens = tokenize(expression)
+        self.pos = 0
+        self.names = names or {}
+        self.values = values or {}
+        self.used_names = set()
+        self.used_values = set()
+
+    # -- token helpers
+    def peek(self, offset=0):
+        index = self.pos + offset
+        return self.tokens[index] if index < len(self.tokens) else (None, None)
+
+    def next(self):
+        token = self.peek()
+        self.pos += 1
+        return token
+
+    def accept(self, kind, text=None):
+        token = self.peek()
+        if token[0] == kind and (text is None or token[1] == text):
+            self.pos += 1
+            return True
+        return False
+
+    def expect(self, kind, text=None):
+        if not self.accept(kind, text):
+            raise FakeClientError('ValidationException', f'Expected {text or kind}, got {self.peek()[1]}')
+
+    def done(self):
+        return self.pos >= len(self.tokens)
+
+    # -- paths and operands
+    def name(self, text):
+        if text.startswith('#'):
+            if text not in self.names:
+                raise FakeClientError('ValidationException', f'Undefined attribute name {text}')
+            self.used_names.add(text)
+            return self.names[text]
+        return text
+
+    def path(self):
+        kind, text = self.next()
+        if kind != 'name':
+            raise FakeClientError('ValidationException', f'Expected attribute name, got {text}')
+        parts = [self.name(text)]
+        while True:
+            if self.accept('op', '.'):
+                kind, text = self.next()
+                parts.append(self.name(text))
+            elif self.accept('op', '['):
+                kind, text = self.next()
+                parts.append(int(text))
+                self.expect('op', ']')
+            else:
+                return tuple(parts)
+
+    def value_ref(self, text):
+        if text not in self.values:
+            raise FakeClientError('ValidationException', f'Undefined attribute value {text}')
+        self.used_values.add(text)
+        return to_dynamo(self.values[text])
+
+    def operand(self):
+        kind, text = self.peek()
+        if kind == 'value':
+            self.next()
+            value = self.value_ref(text)
+            return lambda item: value
+        if kind == 'name' and self.peek(1) == ('op', '(') and text == 'size':
+            self.next()
+            self.expect('op', '(')
+            path = self.path()
+            self.expect('op', ')')
+            return lambda item: _size(resolve(item, path))
+        path = self.path()
+        return lambda item: resolve(item, path)
+
+    # -- conditions
+    def condition(self):
+        left = self.and_condition()
+        while self.accept('kw', 'OR'):
+            right = self.and_condition()
+            left = (lambda a, b: lambda item: a(item) or b(item))(left, right)
+        return left
+
+    def and_condition(self):
+        left = self.not_condition()
+        while self.accept('kw', 'AND'):
+            right = self.not_condition()
+            left = (lambda a, b: lambda item: a(item) and b(item))(left, right)
+        return left
+
+    def not_condition(self):
+        if self.accept('kw', 'NOT'):
+            inner = self.not_condition()
+            return lambda item: not inner(item)
+        return self.primary_condition()
+
+    def primary_condition(self):
+        kind, text = self.peek()
+        if kind == 'op' and text == '(':
+            self.next()
+            inner = self.condition()
+            self.expect('op', ')')
+            return inner
+        if kind == 'name' and self.peek(1) == ('op', '(') and text in FUNCTIONS:
+            self.next()
+            self.expect('op', '(')
+            if text in ('attribute_exists', 'attribute_not_exists'):
+                path = self.path()
+                self.expect('op', ')')
+                exists = text == 'attribute_exists'
+                return lambda item: (resolve(item, path) is not MISSING) == exists
+            if text == 'attribute_type':
+                path = self.path()
+                self.expect('op', ',')
+                type_value = self.operand()
+                self.expect('op', ')')
+                return lambda item: _type_of(resolve(item, path)) == type_value(item)
+            first = self.operand()
+            self.expect('op', ',')
+            second = self.operand()
+            self.expect('op', ')')
+            return (lambda f, a, b: lambda item: f(a(item), b(item)))(FUNCTIONS[text], first, second)
+
+        left = self.operand()
+        if self.accept('kw', 'BETWEEN'):
+            low = self.operand()
+            self.expect('kw', 'AND')
+            high = self.operand()
+            return lambda item: _compare(low(item), '<=', left(item)) and _compare(left(item), '<=', high(item))
+        if self.accept('kw', 'IN'):
+            self.expect('op', '(')
+            options = [self.operand()]
+            while self.accept('op', ','):
+                options.append(self.operand())
+            self.expect('op', ')')
+            return lambda item: any(_compare(left(item), '=', option(item)) for option in options)
+        kind, op = self.next()
+        if kind != 'op' or op not in ('=', '<>', '<', '<=', '>', '>='):
+            raise FakeClientError('ValidationException', f'Expected comparator, got {op}')
+        right = self.operand()
+        return lambda item: _compare(left(item), op, right(item))
+
+
+def _size(value):
+    if value is MISSING:
+        return MISSING
+    if isinstance(value, (str, bytes, list, dict, set)):
+        return Decimal(len(value))
+    return MISSING
+
+
+def _type_of(value):
+    if isinstance(value, str):
+        return 'S'
+    if isinstance(value, bool):
+        return 'BOOL'
+    if isinstance(value, Decimal):
+        return 'N'
+    if value is None:
+        return 'NULL'
+    if isinstance(value, dict):
+        return 'M'
+    if isinstance(value, list):
+        return 'L'
+    return 'B'
+
+
+def _compare(left, op, right):
+    if left is MISSING or right is MISSING:
+        return op == '<>' and not (left is MISSING and right is MISSING)
+    if op == '=':
+        return left == right
+    if op == '<>':
+        return left != right
+    if type(left) is not type(right) and not (isinstance(left, Decimal) and isinstance(right, Decimal)):
+        return False
+    try:
+        return {'<': left < right, '<=': left <= right, '>': left > right, '>=': left >= right}[op]
+    except TypeError:
+        return False
+
+
+def _contains(container, value):
+    if container is MISSING or value is MISSING:
+        return False
+    if isinstance(container, str):
+        return isinstance(value, str) and value in container
+    if isinstance(container, (list, set)):
+        return value in container
+    return False
+
+
+def _begins_with(value, prefix):
+    return isinstance(value, str) and isinstance(prefix, str) and value.startswith(prefix)
+
+
+FUNCTIONS = {
+    'attribute_exists': None,
+    'attribute_not_exists': None,
+    'attribute_type': None,
+    'contains': _contains,
+    'begins_with': _begins_with,
+}
+
+
+def resolve(item, path):
+    current = item
+    for part in path:
+        if isinstance(part, int):
+            if not isinstance(current, list) or part >= len(current):
+                return MISSING
+            current = current[part]
+        else:
+            if not isinstance(current, dict) or part not in current:
+                return MISSING
+            current = current[part]
+    return current
+
+
+def compile_condition(expression, names=None, values=None):
+    parser = Parser(expression, names, values)
+    condition = parser.condition()
+    if not parser.done():
+        raise FakeClientError('ValidationException', f'Unexpected token {parser.peek()[1]}')
+    return condition
+
+
+def compile_projection(expression, names=None):
+    parser = Parser(expression, names)
+    paths = [parser.path()]
+    while parser.accept('op', ','):
+        paths.append(parser.path())
+    return paths
+
+
+def project(item, paths):
+    result = {}
+    for path in paths:
+        value = resolve(item, path)
+        if value is MISSING:
+            continue
+        target = result
+        for i, part in enumerate(path[:-1]):
+            if isinstance(part, int):
+                break
+            target = target.setdefault(part, {} if not isinstance(path[i + 1], int) else [])
+        else:
+            if isinstance(path[-1], int):
+                target.append(copy.deepcopy(value))
+            else:
+                target[path[-1]] = copy.deepcopy(value)
+    return result
+
+
+class UpdateParser(Parser):
+    def actions(self):
+        actions = []
+        while not self.done():
+            kind, clause = self.next()
+            if kind != 'kw' or clause not in ('SET', 'REMOVE', 'ADD', 'DELETE'):
+                raise FakeClientError('ValidationException', f'Invalid update clause {clause}')
+            while True:
+                path = self.path()
+                if clause == 'SET':
+                    self.expect('op', '=')
+                    actions.append(('SET', path, self.set_value()))
+                elif clause == 'REMOVE':
+                    actions.append(('REMOVE', path, None))
+                else:
+                    actions.append((clause, path, self.operand()))
+                if not self.accept('op', ','):
+                    break
+        return actions
+
+    def set_value(self):
+        left = self.set_operand()
+        if self.accept('op', '+'):
+            right = self.set_operand()
+            return lambda item: left(item) + right(item)
+        if self.accept('op', '-'):
+            right = self.set_operand()
+            return lambda item: left(item) - right(item)
+        return left
+
+    def set_operand(self):
+        kind, text = self.peek()
+        if kind == 'name' and self.peek(1) == ('op', '(') and text in ('list_append', 'if_not_exists'):
+            self.next()
+            self.expect('op', '(')
+            first = self.set_operand()
+            self.expect('op', ',')
+            second = self.set_operand()
+            self.expect('op', ')')
+            if text == 'list_append':
+                return lambda item: list(first(item)) + list(second(item))
+            return lambda item: second(item) if first(item) is MISSING else first(item)
+        operand = self.operand()
+        return operand
+
+
+def apply_update(item, actions):
+    removals = []
+    for action, path, value_fn in actions:
+        if action == 'REMOVE':
+            removals.append(path)
+            continue
+        value = value_fn(item) if value_fn else None
+        if value is MISSING:
+            raise FakeClientError('ValidationException', 'The provided expression refers to an attribute that does not exist in the item')
+        parent = item
+        for part in path[:-1]:
+            parent = parent[part] if isinstance(part, int) else parent.get(part, MISSING)
+            if parent is MISSING:
+                raise FakeClientError('ValidationException', 'The document path provided in the update expression is invalid for update')
+        last = path[-1]
+        current = resolve(parent, (last,)) if not isinstance(last, int) else (parent[last] if last < len(parent) else MISSING)
+        if action == 'SET':
+            new_value = copy.deepcopy(value)
+        elif action == 'ADD':
+            if current is MISSING:
+                new_value = copy.deepcopy(value)
+            elif isinstance(current, set):
+                new_value = current | value
+            else:
+                new_value = current + value
+        else:  # DELETE from a set
+            new_value = current - value if current is not MISSING else MISSING
+            if new_value is not MISSING and not new_value:
+                removals.append(path)
+                continue
+        if isinstance(last, int):
+            if last >= len(parent):
+                parent.append(new_value)
+            else:
+                parent[last] = new_value
+        else:
+            parent[last] = new_value
+    # Remove list elements from the highest index down so earlier removals don't shift later ones
+    for path in sorted(removals, key=lambda p: [(-x if isinstance(x, int) else 0) for x in p]):
+        parent = resolve(item, path[:-1]) if len(path) > 1 else item
+        last = path[-1]
+        if isinstance(last, int):
+            if isinstance(parent, list) and last < len(parent):
+                parent.pop(last)
+        elif isinstance(parent, dict):
+            parent.pop(last, None)
+
+
+# ---------------------------------------------------------------------------
+# Tables
+
+class FakeBatchWriter:
+    """Buffers writes like boto3's batch_writer and sends them as BatchWriteItem calls of up to 25"""
+    def __init__(self, table, overwrite_by_pkeys=None):
+        self.table = table
+        self.overwrite_by_pkeys = overwrite_by_pkeys
+        self.pending = []
+
+    def put_item(self, Item):
+        self._add({'PutRequest': {'Item': Item}})
+
+    def delete_item(self, Key):
+        self._add({'DeleteRequest': {'Key': Key}})
+
+    def _pkey(self, request):
+        values = request['PutRequest']['Item'] if 'PutRequest' in request else request['DeleteRequest']['Key']
+        return tuple(_key_bytes(to_dynamo(values[name])) for name in self.overwrite_by_pkeys)
+
+    def _add(self, request):
+        if self.overwrite_by_pkeys:
+            # Like boto3, a later request for the same key replaces the buffered one
+            key = self._pkey(request)
+            self.pending = [pending for pending in self.pending if self._pkey(pending) != key]
+        self.pending.append(request)
+        if len(self.pending) >= BATCH_WRITE_LIMIT:
+            self._flush()
+
+    def _flush(self):
+        requests, self.pending = self.pending[:BATCH_WRITE_LIMIT], self.pending[BATCH_WRITE_LIMIT:]
+        response = self.table.resource.batch_write_item(RequestItems={self.table.name: requests})
+        self.pending.extend(response['UnprocessedItems'].get(self.table.name, []))
+        self.table.stats['batch_requests'] += 1
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        while self.pending:
+            self._flush()
+        return False
+
+
+class FakeTable:
+    def __init__(self, resource, name, hash_key, range_key=None, indexes=None):
+        self.resource = resource
+        self.name = name
+        self.table_name = name
+        self.hash_key = hash_key
+        self.range_key = range_key
+        # index name -> (hash key, range key or None)
+        self.indexes = dict(indexes or {})
+        self.items = {}
+        # index name (None for the table) -> hash key value -> {primary key: item},
+        # so a Query only touches one partition, as it does in DynamoDB
+        self.partitions = {name: {} for name in [None, *self.indexes]}
+        self.lock = threading.RLock()
+        self.stats = {'calls': {}, 'read_units': 0.0, 'write_units': 0.0, 'batch_requests': 0}
+
+    # -- helpers
+    def _key_of(self, item):
+        try:
+            key = (_key_bytes(item[self.hash_key]),)
+            if self.range_key:
+                key += (_key_bytes(item[self.range_key]),)
+        except KeyError as e:
+            raise FakeClientError('ValidationException', f'Missing the key {e.args[0]} in the item')
+        return key
+
+    def _hash_keys(self):
+        yield None, self.hash_key
+        for name, (hash_key, _) in self.indexes.items():
+            yield name, hash_key
+
+    def _store(self, key, item, existing=None):
+        """Write (or, with item None, delete) an item and keep the partition maps in step"""
+        for name, hash_key in self._hash_keys():
+            partitions = self.partitions[name]
+            old_hash = _key_bytes(existing[hash_key]) if existing and hash_key in existing else None
+            new_hash = _key_bytes(item[hash_key]) if item is not None and hash_key in item else None
+            if old_hash is not None and old_hash != new_hash:
+                partitions[old_hash].pop(key, None)
+                if not partitions[old_hash]:
+                    del partitions[old_hash]
+            if new_hash is not None:
+                partitions.setdefault(new_hash, {})[key] = item
+        if item is None:
+            self.items.pop(key, None)
+        else:
+            self.items[key] = item
+
+    def _hash_value(self, hash_key, kwargs):
+        """Value a key condition requires for the hash key, if it is a plain equality"""
+        names = kwargs.get('ExpressionAttributeNames') or {}
+        values = kwargs.get('ExpressionAttributeValues') or {}
+        for part in re.split(r'\s+AND\s+', kwargs['KeyConditionExpression'], flags=re.IGNORECASE):
+            match = re.fullmatch(r'\s*(#?[\w-]+)\s*=\s*(:\w+)\s*', part)
+            if match and names.get(match.group(1), match.group(1)) == hash_key and match.group(2) in values:
+                return to_dynamo(values[match.group(2)])
+        return MISSING
+
+    def _count(self, operation):
+        self.stats['calls'][operation] = self.stats['calls'].get(operation, 0) + 1
+        self.resource.record_call(self.name, operation)
+
+    def _consumed(self, kwargs, read=0.0, write=0.0):
+        self.stats['read_units'] += read
+        self.stats['write_units'] += write
+        self.resource.record_capacity(read, write)
+        if kwargs.get('ReturnConsumedCapacity') in ('TOTAL', 'INDEXES'):
+            return {'ConsumedCapacity': capacity_entry(self.name, read, write, kwargs)}
+        return {}
+
+    @staticmethod
+    def _read_units(size, consistent=False):
+        units = max(1, math.ceil(size / 4096))
+        return float(units if consistent else units / 2)
+
+    @staticmethod
+    def _write_units(size):
+        return float(max(1, math.ceil(size / 1024)))
+
+    def _check(self, existing, kwargs):
+        expression = kwargs.get('ConditionExpression')
+        if not expression:
+            return
+        condition = compile_condition(expression, kwargs.get('ExpressionAttributeNames'),
+                                      kwargs.get('ExpressionAttributeValues'))
+        if not condition(existing or {}):
+            raise FakeClientError('ConditionalCheckFailedException', 'The conditional request failed')
+
+    def _key_item(self, Key):
+        key = to_dynamo(Key)
+        return self.items.get(self._key_of(key))
+
+    # -- single item operations
+    def get_item(self, Key, **kwargs):
+        self._count('GetItem')
+        return self._get(Key, kwargs)
+
+    def put_item(self, Item, **kwargs):
+        self._count('PutItem')
+        return self._put(Item, kwargs)
+
+    def update_item(self, Key, **kwargs):
+        self._count('UpdateItem')
+        return self._update(Key, kwargs)
+
+    def delete_item(self, Key, **kwargs):
+        self._count('DeleteItem')
+        return self._delete(Key, kwargs)
+
+    # The work of each operation, also used by batches and transactions, which count as one call
+    def _get(self, Key, kwargs):
+        with self.lock:
+            item = self._key_item(Key)
+            consistent = kwargs.get('ConsistentRead', False)
+            result = self._consumed(kwargs, read=self._read_units(item_size(item) if item else 0, consistent))
+            if item is None:
+                return result
+            if kwargs.get('ProjectionExpression'):
+                item = project(item, compile_projection(kwargs['ProjectionExpression'],
+                                                        kwargs.get('ExpressionAttributeNames')))
+            result['Item'] = copy.deepcopy(item)
+            return result
+
+    def _put(self, Item, kwargs):
+        item = to_dynamo(Item)
+        size = item_size(item)
+        if size > 400 * 1024:
+            raise FakeClientError('ValidationException', 'Item size has exceeded the maximum allowed size')
+        with self.lock:
+            key = self._key_of(item)
+            existing = self.items.get(key)
+            self._check(existing, kwargs)
+            self._store(key, item, existing)
+            result = self._consumed(kwargs, write=self._write_units(max(size, item_size(existing) if existing else 0)))
+            if kwargs.get('ReturnValues') == 'ALL_OLD' and existing:
+                result['Attributes'] = copy.deepcopy(existing)
+            return result
+
+    def _update(self, Key, kwargs):
+        key_item = to_dynamo(Key)
+        with self.lock:
+            key = self._key_of(key_item)
+            existing = self.items.get(key)
+            self._check(existing, kwargs)
+            item = copy.deepcopy(existing) if existing else dict(key_item)
+            parser = UpdateParser(kwargs.get('UpdateExpression', ''), kwargs.get('ExpressionAttributeNames'),
+                                  kwargs.get('ExpressionAttributeValues'))
+            apply_update(item, parser.actions())
+            size = item_size(item)
+            if size > 400 * 1024:
+                raise FakeClientError('ValidationException', 'Item size to update has exceeded the maximum allowed size')
+            self._store(key, item, existing)
+            result = self._consumed(kwargs, write=self._write_units(max(size, item_size(existing) if existing else 0)))
+            return_values = kwargs.get('ReturnValues', 'NONE')
+            if return_values == 'ALL_NEW':
+                result['Attributes'] = copy.deepcopy(item)
+            elif return_values == 'ALL_OLD' and existing:
+                result['Attributes'] = copy.deepcopy(existing)
+            elif return_values == 'UPDATED_NEW':
+                result['Attributes'] = {k: copy.deepcopy(v) for k, v in item.items()
+                                        if not existing or existing.get(k) != v}
+            return result
+
+    def _delete(self, Key, kwargs):
+        with self.lock:
+            key = self._key_of(to_dynamo(Key))
+            existing = self.items.get(key)
+            self._check(existing, kwargs)
+            self._store(key, None, existing)
+            result = self._consumed(kwargs, write=self._write_units(item_size(existing) if existing else 0))
+            if kwargs.get('ReturnValues') == 'ALL_OLD' and existing:
+                result['Attributes'] = copy.deepcopy(existing)
+            return result
+
+    # -- multi item operations
+    def _page(self, candidates, kwargs, key_fields):
+        """Apply ExclusiveStartKey, Limit, the 1 MB page limit, filters and projections"""
+        start = kwargs.get('ExclusiveStartKey')
+        if start:
+            start = to_dynamo(start)
+            start_marker = tuple(_key_bytes(start.get(field)) for field in key_fields)
+            for i, item in enumerate(candidates):
+                if tuple(_key_bytes(item.get(field)) for field in key_fields) == start_marker:
+                    candidates = candidates[i + 1:]
+                    break
+        limit = kwargs.get('Limit')
+        filter_fn = None
+        if kwargs.get('FilterExpression'):
+            filter_fn = compile_condition(kwargs['FilterExpression'], kwargs.get('ExpressionAttributeNames'),
+                                          kwargs.get('ExpressionAttributeValues'))
+        projection = None
+        if kwargs.get('ProjectionExpression'):
+            projection = compile_projection(kwargs['ProjectionExpression'], kwargs.get('ExpressionAttributeNames'))
+
+        items = []
+        scanned = 0
+        read_bytes = 0
+        last = None
+        for item in candidates:
+            if limit is not None and scanned >= limit:
+                break
+            if read_bytes >= PAGE_LIMIT_BYTES:
+                break
+            scanned += 1
+            read_bytes += item_size(item)
+            last = item
+            if filter_fn and not filter_fn(item):
+                continue
+            items.append(copy.deepcopy(project(item, projection) if projection else item))
+
+        result = {'Items': items, 'Count': len(items), 'ScannedCount': scanned}
+        if last is not None and candidates and last is not candidates[-1]:
+            result['LastEvaluatedKey'] = {field: copy.deepcopy(last[field]) for field in key_fields if field in last}
+        consistent = kwargs.get('ConsistentRead', False)
+        result.update(self._consumed(kwargs, read=self._read_units(read_bytes, consistent)))
+        return result
+
+    def _primary_fields(self):
+        return [self.hash_key] + ([self.range_key] if self.range_key else [])
+
+    def scan(self, **kwargs):
+        self._count('Scan')
+        with self.lock:
+            index = kwargs.get('IndexName')
+            candidates = list(self.items.values())
+            key_fields = self._primary_fields()
+            if index:
+                hash_key, range_key = self.indexes[index]
+                candidates = [item for item in candidates if hash_key in item]
+                key_fields = [hash_key] + ([range_key] if range_key else []) + key_fields
+            return self._page(candidates, kwargs, key_fields)
+
+    def query(self, **kwargs):
+        self._count('Query')
+        with self.lock:
+            index = kwargs.get('IndexName')
+            if index:
+                if index not in self.indexes:
+                    raise FakeClientError('ValidationException', f'The table does not have the specified index: {index}')
+                hash_key, range_key = self.indexes[index]
+                key_fields = [hash_key] + ([range_key] if range_key else []) + self._primary_fields()
+            else:
+                hash_key, range_key = self.hash_key, self.range_key
+                key_fields = self._primary_fields()
+            condition = compile_condition(kwargs['KeyConditionExpression'], kwargs.get('ExpressionAttributeNames'),
+                                          kwargs.get('ExpressionAttributeValues'))
+            hash_value = self._hash_value(hash_key, kwargs)
+            if hash_value is MISSING:
+                partition = self.items
+            else:
+                partition = self.partitions[index].get(_key_bytes(hash_value), {})
+            candidates = [item for item in partition.values() if hash_key in item and condition(item)]
+            if range_key:
+                candidates.sort(key=lambda item: _sort_key(item.get(range_key)),
+                                reverse=not kwargs.get('ScanIndexForward', True))
+            return self._page(candidates, kwargs, key_fields)
+
+    def batch_writer(self, overwrite_by_pkeys=None):
+        return FakeBatchWriter(self, overwrite_by_pkeys)
+
+    def load(self):
+        return None
+
+
+def _sort_key(value):
+    if isinstance(value, Decimal):
+        return (0, value, '')
+    return (1, 0, str(value))
+
+
+class _FakeMeta:
+    def __init__(self, client):
+        self.client = client
+
+
+class FakeLowLevelClient:
+    """The handful of low-level client calls reached through resource.meta.client"""
+    def __init__(self, resource):
+        self.resource = resource
+
+    def transact_write_items(self, TransactItems, **kwargs):
+        self.resource.record_call('*', 'TransactWriteItems')
+        with self.resource.lock:
+            # Validate every condition first, then apply all writes
+            plans = []
+            for entry in TransactItems:
+                (operation, params), = entry.items()
+                table = self.resource.Table(params['TableName'])
+                params = {k: _from_low_level(v) if k in ('Item', 'Key', 'ExpressionAttributeValues') else v
+                          for k, v in params.items() if k != 'TableName'}
+                if operation == 'Put':
+                    existing = table.items.get(table._key_of(to_dynamo(params['Item'])))
+                elif operation in ('Update', 'Delete', 'ConditionCheck'):
+                    existing = table._key_item(params['Key'])
+                else:
+                    raise FakeClientError('ValidationException', f'Unsupported transaction operation {operation}')
+                try:
+                    table._check(existing, params)
+                except FakeClientError:
+                    raise FakeClientError('TransactionCanceledException',
+                                          'Transaction cancelled, please refer cancellation reasons for specific reasons [ConditionalCheckFailed]')
+                plans.append((operation, table, params))
+            capacity = {}
+            for operation, table, params in plans:
+                params = dict(params, ReturnConsumedCapacity='INDEXES')
+                params.pop('ConditionExpression', None)
+                if operation == 'Put':
+                    add_capacity(capacity, table._put(params.pop('Item'), params))
+                elif operation == 'Update':
+                    add_capacity(capacity, table._update(params.pop('Key'), params))
+                elif operation == 'Delete':
+                    add_capacity(capacity, table._delete(params.pop('Key'), params))
+        return consumed_capacity(capacity, kwargs)
+
+
+def add_capacity(totals, response):
+    """Add the ConsumedCapacity of a single-table response to {table: [read, write]}"""
+    entry = response.get('ConsumedCapacity')
+    if entry:
+        units = totals.setdefault(entry['TableName'], [0.0, 0.0])
+        units[0] += entry['ReadCapacityUnits']
+        units[1] += entry['WriteCapacityUnits']
+
+
+def capacity_entry(name, read, write, kwargs):
+    """A ConsumedCapacity entry; like DynamoDB, TOTAL reports only CapacityUnits and INDEXES also splits by type"""
+    entry = {'TableName': name, 'CapacityUnits': read + write}
+    if kwargs.get('ReturnConsumedCapacity') == 'INDEXES':
+        entry.update(ReadCapacityUnits=read, WriteCapacityUnits=write,
+                     Table={'CapacityUnits': read + write, 'ReadCapacityUnits': read, 'WriteCapacityUnits': write})
+    return entry
+
+
+def consumed_capacity(totals, kwargs):
+    """The per-table ConsumedCapacity list of a batch or transaction response, if it was asked for"""
+    if kwargs.get('ReturnConsumedCapacity') not in ('TOTAL', 'INDEXES'):
+        return {}
+    return {'ConsumedCapacity': [capacity_entry(name, read, write, kwargs) for name, (read, write) in totals.items()]}
+
+
+def _from_low_level(value):
+    """Accept either plain Python values (resource style) or typed {'S': ...} attribute values"""
+    if isinstance(value, dict) and len(value) == 1:
+        (type_key, inner), = value.items()
+        if type_key == 'S':
+            return inner
+        if type_key == 'N':
+            return Decimal(inner)
+        if type_key == 'BOOL':
+            return inner
+        if type_key == 'NULL':
+            return None
+        if type_key == 'M':
+            return {k: _from_low_level(v) for k, v in inner.items()}
+        if type_key == 'L':
+            return [_from_low_level(v) for v in inner]
+    if isinstance(value, dict):
+        return {k: _from_low_level(v) for k, v in value.items()}
+    return value
+
+
+class FakeDynamoDB:
+    """Stand-in for boto3.resource('dynamodb')"""
+    def __init__(self, schemas=None):
+        self.tables = {}
+        self.lock = threading.RLock()
+        self.meta = _FakeMeta(FakeLowLevelClient(self))
+        self.calls = {}
+        self.read_units = 0.0
+        self.write_units = 0.0
+        for name, (hash_key, range_key, indexes) in (schemas or {}).items():
+            self.create_table(name, hash_key, range_key, indexes)
+
+    def create_table(self, name, hash_key, range_key=None, indexes=None):
+        with self.lock:
+            self.tables[name] = FakeTable(self, name, hash_key, range_key, indexes)
+            return self.tables[name]
+
+    def Table(self, name):
+        with self.lock:
+            if name not in self.tables:
+                raise FakeClientError('ResourceNotFoundException', f'Requested resource not found: Table: {name} not found')
+            return self.tables[name]
+
+    def record_call(self, table, operation):
+        with self.lock:
+            key = f'{table}:{operation}'
+            self.calls[key] = self.calls.get(key, 0) + 1
+
+    def record_capacity(self, read, write):
+        with self.lock:
+            self.read_units += read
+            self.write_units += write
+
+    def reset_stats(self):
+        with self.lock:
+            self.calls = {}
+            self.read_units = 0.0
+            self.write_units = 0.0
+
+    def total_calls(self):
+        return sum(self.calls.values())
+
+    def _check_batch(self, operation, limit, keys_by_table):
+        """Reject a batch request the way DynamoDB does before any item is read or written"""
+        if sum(len(keys) for keys in keys_by_table.values()) > limit:
+            raise FakeClientError('ValidationException', f'Too many items requested for the {operation} call')
+        for table_name, keys in keys_by_table.items():
+            table = self.Table(table_name)
+            seen = set()
+            for key in keys:
+                key = table._key_of(to_dynamo(key))
+                if key in seen:
+                    raise FakeClientError('ValidationException', 'Provided list of item keys contains duplicates')
+                seen.add(key)
+
+    def batch_get_item(self, RequestItems, **kwargs):
+        self.record_call('*', 'BatchGetItem')
+        self._check_batch('BatchGetItem', BATCH_GET_LIMIT,
+                          {table_name: request['Keys'] for table_name, request in RequestItems.items()})
+        responses = {}
+        capacity = {}
+        for table_name, request in RequestItems.items():
+            table = self.Table(table_name)
+            found = []
+            for key in request['Keys']:
+                params = {k: v for k, v in request.items() if k != 'Keys'}
+                response = table._get(key, dict(params, ReturnConsumedCapacity='INDEXES'))
+                add_capacity(capacity, response)
+                if response.get('Item') is not None:
+                    found.append(response['Item'])
+            responses[table_name] = found
+        return dict(consumed_capacity(capacity, kwargs), Responses=responses, UnprocessedKeys={})
+
+    def batch_write_item(self, RequestItems, **kwargs):
+        self.record_call('*', 'BatchWriteItem')
+        self._check_batch('BatchWriteItem', BATCH_WRITE_LIMIT, {
+            table_name: [request['PutRequest']['Item'] if 'PutRequest' in request else request['DeleteRequest']['Key']
+                         for request in requests]
+            for table_name, requests in RequestItems.items()})
+        capacity = {}
+        for table_name, requests in RequestItems.items():
+            table = self.Table(table_name)
+            for request in requests:
+                if 'PutRequest' in request:
+                    response = table._put(request['PutRequest']['Item'], {'ReturnConsumedCapacity': 'INDEXES'})
+                else:
+                    response = table._delete(request['DeleteRequest']['Key'], {'ReturnConsumedCapacity': 'INDEXES'})
+                add_capacity(capacity, response)
+        return dict(consumed_capacity(capacity, kwargs), UnprocessedItems={})
@@ -0,0 +1,371 @@
+"""
+Benchmark suite for every Lambda handler, run offline against local stand-ins.
+
+    python benchmarks/handler_suite.py                          # 1k and 10k results, compare with the baseline
+    python benchmarks/handler_suite.py get_results.list --results 100000 -n 20
+    python benchmarks/handler_suite.py submit_quiz.submit --ttft-ms 300 --tokens-per-s 150
+    python benchmarks/handler_suite.py --save-baseline
+
+Each handler's ``lambda_handler`` runs in-process against the in-memory
+DynamoDB in fake_dynamodb.py. The fake is seeded with templates, users and N
+quiz results. Answers are graded by MSC_Evaluate through fake_bedrock.py, and
+its Bedrock stand-in streams replies at the given time to first token and
+token rate. The default of zero means no delay, so timings show handler CPU.
+
+One warm-up request per scenario is excluded from the timings, which makes
+them warm-container numbers, and the garbage collector is paused while
+requests are timed. For every scenario the suite reports p50/p95/p99
+latency, DynamoDB calls and consumed read/write capacity per request, Bedrock
+tokens per request, and the peak memory allocated by one request.
+
+Rows are compared with handler_baseline.json. The script exits with status 1
+in two cases. The first is when a scenario's p50, p95 or peak memory regresses
+by more than --tolerance in two runs. The second is when it makes more
+DynamoDB calls or uses more capacity than the baseline recorded. p99 is
+reported but not compared, because at -n 50 it is a single sample.
+"""
+import argparse
+import gc
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+BACKEND = os.path.dirname(BENCHMARKS)
+for directory in ('MSC_Evaluate', 'quiz', 'templates', 'users'):
+    sys.path.insert(0, os.path.join(BACKEND, directory))
+sys.path.insert(0, BACKEND)
+sys.path.insert(0, BENCHMARKS)
+os.environ.setdefault('SESSION_TOKEN_SECRET', 'benchmark-signing-key')
+os.environ.setdefault('PASSWORD_SCRYPT_N', '1024')
+os.environ.setdefault('TEMPLATE_CACHE_STATS_EVERY', '0')
+
+from fake_bedrock import FakeBedrockRuntime, FakeLambda
+from fake_dynamodb import FakeDynamoDB
+from shared import auth
+from shared import aws
+from shared import metrics
+from shared import passwords
+from shared import question_bank
+from shared import similarity
+from shared import template_cache
+import delete_result
+import get_results
+import lambda_function
+import submit_quiz
+import take_quiz
+import template_api
+import user_crud
+
+# Handlers write one EMF line per request; keep them out of the report
+metrics.set_sink(lambda record: None)
+
+BASELINE_FILE = os.path.join(BENCHMARKS, 'handler_baseline.json')
+TEMPLATES = 20
+QUESTIONS = 10
+USERS = 1000
+COURSES = 10
+PASSWORD = 'benchmark-password'
+OK_STATUSES = (200, 201, 304)
+
+# Timing metrics compared with --tolerance; below these absolute differences a change is noise
+TIMING_FLOORS = {'p50_ms': 0.5, 'p95_ms': 1.0, 'peak_kb': 64}
+# Work metrics are deterministic, so any increase beyond rounding is a regression
+WORK_METRICS = ('calls', 'rcu', 'wcu')
+
+
+def schemas():
+    return {
+        aws.table_name('users'): ('user_id', None, {user_crud.USERNAME_INDEX: ('username', None),
+                                                    user_crud.ROLE_INDEX: ('role', 'username')}),
+        aws.table_name('usernames'): ('username', None, {}),
+        aws.table_name('templates'): ('template_id', None, {template_api.COURSE_INDEX: ('course', 'subject'),
+                                                            template_api.SUBJECT_INDEX: ('subject', 'course')}),
+        aws.table_name('results'): ('result_id', None, {}),
+        aws.table_name('sessions'): ('session_id', None, {}),
+        aws.table_name('questions'): ('question_id', None, {question_bank.BANK_INDEX: ('bank_key', 'question_id')}),
+        aws.table_name('versions'): ('template_id', 'version', {}),
+        aws.table_name('question_content'): ('content_hash', None, {}),
+        aws.table_name('similarity'): ('bucket_key', 'member', {similarity.COLLISION_INDEX: ('question_key', 'bucket_key')}),
+    }
+
+
+def bearer(role):
+    token, _ = auth.issue_token({'user_id': f'benchmark-{role}', 'username': f'benchmark-{role}', 'role': role})
+    return {'Authorization': f'Bearer {token}'}
+
+
+def answer_text(i, q):
+    return f'Student {i} explains concept {q}: the method applies the definition step by step. ' * 3
+
+
+def seed(result_count, ttft_ms, tokens_per_s):
+    """Install fresh stand-ins holding templates, users and result_count results"""
+    dynamodb = FakeDynamoDB(schemas())
+    bedrock = FakeBedrockRuntime(ttft_ms=ttft_ms, tokens_per_s=tokens_per_s)
+    evaluator = FakeLambda({aws.function_name('evaluate'): lambda_function.lambda_handler})
+    aws.install(dynamodb=dynamodb, bedrock_runtime=bedrock, lambda_=evaluator)
+    template_cache.invalidate()
+
+    admin = bearer('admin')
+    template_ids = []
+    for t in range(TEMPLATES):
+        questions = [{
+            'question_text': f'Question {q} of template {t}: explain the concept and give an example.',
+            'question_type': 'text',
+            'example_answer': f'Concept {q} is defined formally. It is applied step by step. '
+                              f'For example, the course notes apply it to problem {q}.',
+        } for q in range(QUESTIONS)]
+        response = template_api.lambda_handler({
+            'httpMethod': 'POST', 'path': '/templates', 'headers': admin,
+            'body': json.dumps({'title': f'Quiz {t}', 'subject': f'Subject {t % 4}',
+                                'course': f'COURSE{t % COURSES}', 'questions': questions})
+        }, None)
+        template_ids.append(json.loads(response['body'])['template_id'])
+
+    stored = passwords.hash_password(PASSWORD)
+    with dynamodb.Table(aws.table_name('users')).batch_writer() as batch:
+        for i in range(USERS):
+            batch.put_item(Item={
+                'user_id': f'{i:032x}', 'username': f'student{i:06d}', 'password': stored,
+                'email': f'student{i:06d}@example.com', 'role': 'student' if i % 20 else 'tutor',
+                'full_name': f'Student {i}', 'is_active': True,
+                'created_at': '2024-01-01T00:00:00', 'updated_at': '2024-01-01T00:00:00'
+            })
+
+    with dynamodb.Table(aws.table_name('results')).batch_writer() as batch:
+        for i in range(result_count):
+            t = i % TEMPLATES
+            batch.put_item(Item={
+                'result_id': f'result-{i:08d}', 'template_id': template_ids[t], 'session_id': f'session-{i:08d}',
+                'student_name': f'Student {i % USERS}', 'course': f'COURSE{t % COURSES}',
+                'subject': f'Subject {t % 4}', 'title': f'Quiz {t}',
+                'answers': [{'question_index': q, 'answer_text': answer_text(i, q)} for q in range(QUESTIONS)],
+                'evaluations': [{'question_index': q, 'question_text': f'Question {q}', 'score': str(50 + q),
+                                 'evaluation': 'Covers the main ideas with some gaps.',
+                                 'justification': 'Most key points are present.', 'suggessions': 'Add an example.'}
+                                for q in range(QUESTIONS)],
+                'average_score': 55, 'total_questions': QUESTIONS, 'template_version': 1,
+                'completed_at': f'2024-05-{1 + i % 28:02d}T10:00:00',
+                'created_at': '2024-05-01T10:00:00', 'updated_at': '2024-05-01T10:00:00'
+            })
+
+    dynamodb.reset_stats()
+    bedrock.reset_stats()
+    return dynamodb, bedrock, template_ids
+
+
+def scenarios(template_ids, result_count):
+    """name -> (lambda_handler, event for request i)"""
+    admin, tutor, student = bearer('admin'), bearer('tutor'), bearer('student')
+
+    def template(i):
+        return template_ids[i % len(template_ids)]
+
+    return {
+        'user_crud.login': (user_crud.lambda_handler, lambda i: {
+            'httpMethod': 'POST', 'path': '/users/login',
+            'body': json.dumps({'username': f'student{i % USERS:06d}', 'password': PASSWORD})}),
+        'user_crud.list': (user_crud.lambda_handler, lambda i: {
+            'httpMethod': 'GET', 'path': '/users', 'headers': admin, 'queryStringParameters': {'role': 'student'}}),
+        'template_api.list': (template_api.lambda_handler, lambda i: {
+            'httpMethod': 'GET', 'path': '/templates', 'headers': student,
+            'queryStringParameters': {'course': f'COURSE{i % COURSES}'}}),
+        'template_api.get': (template_api.lambda_handler, lambda i: {
+            'httpMethod': 'GET', 'path': f'/templates/{template(i)}', 'headers': student,
+            'pathParameters': {'template_id': template(i)}}),
+        'take_quiz.view': (take_quiz.lambda_handler, lambda i: {
+            'httpMethod': 'GET', 'path': f'/templates/{template(i)}/quiz', 'headers': student,
+            'pathParameters': {'template_id': template(i)}}),
+        'take_quiz.page': (take_quiz.lambda_handler, lambda i: {
+            'httpMethod': 'GET', 'path': f'/templates/{template(i)}/quiz', 'headers': student,
+            'pathParameters': {'template_id': template(i)}, 'queryStringParameters': {'page': '1', 'page_size': '5'}}),
+        'submit_quiz.submit': (submit_quiz.lambda_handler, lambda i: {
+            'httpMethod': 'POST', 'path': '/submit', 'headers': student,
+            'body': json.dumps({'template_id': template(i), 'student_name': f'Student {i}',
+                                'answers': [{'question_index': q, 'answer_text': answer_text(i, q)}
+                                            for q in range(QUESTIONS)]})}),
+        'get_results.list': (get_results.lambda_handler, lambda i: {
+            'httpMethod': 'GET', 'path': '/results', 'headers': tutor,
+            'queryStringParameters': {'course': f'COURSE{i % COURSES}'}}),
+        'delete_result.delete': (delete_result.lambda_handler, lambda i: {
+            'httpMethod': 'DELETE', 'path': f'/results/result-{i % result_count:08d}', 'headers': admin,
+            'pathParameters': {'id': f'result-{i % result_count:08d}'}}),
+        'msc_evaluate.evaluate': (lambda_function.lambda_handler, lambda i: {
+            'user_answer': answer_text(i, 0), 'example_answer': 'Concept 0 is defined formally.',
+            'rubric': ['Concept 0 is defined formally', 'It is applied step by step']}),
+    }
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def peak_kb(handler, event):
+    tracemalloc.start()
+    handler(event, None)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak / 1024
+
+
+def measure(name, handler, make_event, requests, dynamodb, bedrock):
+    handler(make_event(0), None)
+    dynamodb.reset_stats()
+    bedrock.reset_stats()
+
+    latencies = []
+    failures = 0
+    # Collector pauses land on arbitrary requests and make runs hard to compare
+    gc.collect()
+    gc.disable()
+    try:
+        for i in range(1, requests + 1):
+            event = make_event(i)
+            start = time.perf_counter()
+            response = handler(event, None)
+            latencies.append((time.perf_counter() - start) * 1000)
+            failures += 0 if response.get('statusCode') in OK_STATUSES else 1
+    finally:
+        gc.enable()
+
+    row = {
+        'scenario': name,
+        'p50_ms': round(statistics.median(latencies), 3),
+        'p95_ms': round(percentile(latencies, 0.95), 3),
+        'p99_ms': round(percentile(latencies, 0.99), 3),
+        'calls': round(dynamodb.total_calls() / requests, 2),
+        'rcu': round(dynamodb.read_units / requests, 2),
+        'wcu': round(dynamodb.write_units / requests, 2),
+        'tokens': round((bedrock.input_tokens + bedrock.output_tokens) / requests, 1),
+        'failed': failures,
+        'requests': requests,
+    }
+    # Measured separately because tracing allocations slows every request down
+    row['peak_kb'] = round(max(peak_kb(handler, make_event(requests + 1 + i)) for i in range(3)), 1)
+    return row
+
+
+def run(result_counts, requests, selected, ttft_ms, tokens_per_s):
+    rows = []
+    for count in result_counts:
+        dynamodb, bedrock, template_ids = seed(count, ttft_ms, tokens_per_s)
+        for name, (handler, make_event) in scenarios(template_ids, count).items():
+            if selected and name not in selected:
+                continue
+            rows.append(dict(measure(name, handler, make_event, requests, dynamodb, bedrock), results=count))
+    return rows
+
+
+def row_key(row):
+    return f"{row['results']}:{row['scenario']}"
+
+
+def compare(rows, baseline, tolerance):
+    """Attach the baseline p95 to each row and return {row key: [regression, ...]}"""
+    regressions = {}
+    for row in rows:
+        base = baseline.get(row_key(row))
+        if not base:
+            continue
+        row['baseline_p95_ms'] = base['p95_ms']
+        found = []
+        for metric, floor in TIMING_FLOORS.items():
+            if row[metric] > base[metric] * (1 + tolerance) and row[metric] - base[metric] > floor:
+                found.append(f"{metric}: {base[metric]} -> {row[metric]}")
+        for metric in WORK_METRICS:
+            if row[metric] > base[metric] + 0.01:
+                found.append(f"{metric}/request: {base[metric]} -> {row[metric]}")
+        if found:
+            regressions[row_key(row)] = found
+    return regressions
+
+
+def remeasure(rows, keys, args):
+    """Run the scenarios behind ``keys`` again and replace their rows"""
+    fresh = {}
+    for count in args.results:
+        names = {key.split(':', 1)[1] for key in keys if key.startswith(f'{count}:')}
+        if names:
+            fresh.update((row_key(row), row) for row in run([count], args.requests, names,
+                                                              args.ttft_ms, args.tokens_per_s))
+    return [fresh.get(row_key(row), row) for row in rows]
+
+
+def load_baseline():
+    if not os.path.exists(BASELINE_FILE):
+        return {}
+    with open(BASELINE_FILE) as f:
+        return json.load(f)['rows']
+
+
+def save_baseline(rows, args):
+    stored = load_baseline()
+    stored.update({row_key(row): {key: value for key, value in row.items() if not key.startswith('baseline_')}
+                   for row in rows})
+    with open(BASELINE_FILE, 'w') as f:
+        json.dump({
+            'requests': args.requests,
+            'ttft_ms': args.ttft_ms,
+            'tokens_per_s': args.tokens_per_s,
+            'python': sys.version.split()[0],
+            'rows': dict(sorted(stored.items()))
+        }, f, indent=2)
+        f.write('\n')
+
+
+def print_table(rows):
+    header = (f"{'results':>8}  {'scenario':<22} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'base p95':>9} "
+              f"{'calls':>6} {'RCU':>7} {'WCU':>6} {'tokens':>7} {'peak KB':>8} {'failed':>9}")
+    print(header)
+    print('-' * len(header))
+    for row in rows:
+        print(f"{row['results']:>8}  {row['scenario']:<22} {row['p50_ms']:>8} {row['p95_ms']:>8} {row['p99_ms']:>8} "
+              f"{row.get('baseline_p95_ms', '-'):>9} {row['calls']:>6} {row['rcu']:>7} {row['wcu']:>6} "
+              f"{row['tokens']:>7} {row['peak_kb']:>8} {row['failed']:>4}/{row['requests']:<4}")
+
+
+if __name__ == '__main__':
+    names = list(scenarios([''], 1))
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('scenarios', nargs='*', metavar='scenario',
+                        help=f"scenarios to run (default: all): {', '.join(names)}")
+    parser.add_argument('--results', type=int, nargs='+', default=[1000, 10000], help='quiz results seeded')
+    parser.add_argument('-n', '--requests', type=int, default=50, help='measured requests per scenario')
+    parser.add_argument('--ttft-ms', type=float, default=0, help='Bedrock time to first token')
+    parser.add_argument('--tokens-per-s', type=float, default=0, help='Bedrock output token rate (0: no delay)')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed timing regression (0.25 = 25%%)')
+    parser.add_argument('--save-baseline', action='store_true', help='store these rows as the baseline')
+    parser.add_argument('--json', action='store_true', help='print rows as JSON')
+    args = parser.parse_args()
+    unknown = set(args.scenarios) - set(names)
+    if unknown:
+        parser.error(f"unknown scenario: {', '.join(sorted(unknown))}")
+
+    rows = run(args.results, args.requests, set(args.scenarios), args.ttft_ms, args.tokens_per_s)
+    regressions = {}
+    if not args.save_baseline:
+        baseline = load_baseline()
+        regressions = compare(rows, baseline, args.tolerance)
+        if regressions:
+            # A slow run on a busy machine rarely repeats, so only regressions measured twice count
+            rows = remeasure(rows, regressions, args)
+            regressions = compare(rows, baseline, args.tolerance)
+    if args.json:
+        print(json.dumps(rows, indent=2))
+    else:
+        print_table(rows)
+
+    if args.save_baseline:
+        save_baseline(rows, args)
+        print(f'\nBaseline written to {os.path.relpath(BASELINE_FILE)}')
+    elif regressions:
+        print('\nRegressions against the baseline:')
+        for key, found in regressions.items():
+            for regression in found:
+                print(f'  {key} {regression}')
+        sys.exit(1)
@@ -0,0 +1,129 @@
+"""
+Cold-start import benchmark for every Lambda handler.
+
+Each handler is imported in a fresh interpreter with ``python -X importtime``,
+laid out the way it is packaged (handler directory plus ``backend/shared``).
+The median cumulative import time over several runs is compared with the
+budget in import_budgets.json, and modules listed under ``forbidden`` must not
+be imported at load time at all (they have to stay behind a lazy import).
+
+Usage:
+    python benchmarks/import_budget.py              # check every handler
+    python benchmarks/import_budget.py take_quiz -n 10 --top 15
+
+Exits with status 1 when any handler is over budget or imports a forbidden module.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BUDGETS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'import_budgets.json')
+
+# Handler name -> (directory under backend/, module name)
+HANDLERS = {
+    'user_crud': ('users', 'user_crud'),
+    'template_api': ('templates', 'template_api'),
+    'take_quiz': ('quiz', 'take_quiz'),
+    'submit_quiz': ('quiz', 'submit_quiz'),
+    'get_results': ('quiz', 'get_results'),
+    'delete_result': ('quiz', 'delete_result'),
+    'msc_evaluate': ('MSC_Evaluate', 'lambda_function'),
+}
+
+
+def parse_importtime(stderr):
+    """Parse -X importtime output into (module, self_us, cumulative_us, depth) rows"""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|', 2)
+        depth = (len(name) - len(name.lstrip(' ')) - 1) // 2
+        rows.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return rows
+
+
+def measure(handler, runs):
+    """Import a handler in fresh interpreters and return (median ms, rows from the last run)"""
+    directory, module = HANDLERS[handler]
+    handler_dir = os.path.join(BACKEND_DIR, directory)
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join([handler_dir, BACKEND_DIR])
+    env['PYTHONDONTWRITEBYTECODE'] = '1'
+
+    timings = []
+    rows = []
+    for _ in range(runs):
+        proc = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+            cwd=handler_dir, env=env, capture_output=True, text=True
+        )
+        if proc.returncode != 0:
+            raise RuntimeError(f'{handler} failed to import:\n{proc.stderr[-2000:]}')
+        rows = parse_importtime(proc.stderr)
+        total = next((cumulative for name, _, cumulative, depth in rows if name == module and depth == 0), None)
+        if total is None:
+            raise RuntimeError(f'{handler}: no importtime entry for {module}')
+        timings.append(total / 1000)
+    return statistics.median(timings), rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check handler import times against their budgets')
+    parser.add_argument('handlers', nargs='*', help='Handlers to check (default: all)')
+    parser.add_argument('-n', '--runs', type=int, default=5, help='Fresh interpreter runs per handler')
+    parser.add_argument('--top', type=int, default=5, help='Slowest imports to list per handler')
+    parser.add_argument('--json', action='store_true', help='Print results as JSON')
+    args = parser.parse_args()
+
+    with open(BUDGETS_FILE) as f:
+        budgets = json.load(f)
+    default_forbidden = budgets.get('forbidden', [])
+
+    failures = []
+    report = {}
+    for handler in args.handlers or list(HANDLERS):
+        budget = budgets['handlers'][handler]
+        median_ms, rows = measure(handler, args.runs)
+        imported = {name for name, _, _, _ in rows}
+        forbidden = sorted(
+            name for name in imported
+            for blocked in budget.get('forbidden', default_forbidden)
+            if name == blocked or name.startswith(blocked + '.')
+        )
+        slowest = sorted(rows, key=lambda row: row[1], reverse=True)[:args.top]
+        over = median_ms > budget['budget_ms']
+        report[handler] = {
+            'median_ms': round(median_ms, 2),
+            'budget_ms': budget['budget_ms'],
+            'over_budget': over,
+            'forbidden_imports': forbidden,
+            'slowest': [{'module': name, 'self_ms': round(self_us / 1000, 2)} for name, self_us, _, _ in slowest],
+        }
+        if over:
+            failures.append(f'{handler}: {median_ms:.1f} ms > budget {budget["budget_ms"]} ms')
+        if forbidden:
+            failures.append(f'{handler}: imports {", ".join(forbidden)} at load time')
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        for handler, entry in report.items():
+            status = 'FAIL' if entry['over_budget'] or entry['forbidden_imports'] else 'ok'
+            print(f"{handler:<15} {entry['median_ms']:>8.1f} ms  (budget {entry['budget_ms']} ms)  {status}")
+            for slow in entry['slowest']:
+                print(f"    {slow['self_ms']:>7.2f} ms  {slow['module']}")
+
+    if failures:
+        print('\nImport budget exceeded:', file=sys.stderr)
+        for failure in failures:
+            print(f'  {failure}', file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
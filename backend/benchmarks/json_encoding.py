@@ -0,0 +1,157 @@
+"""
+Microbenchmarks for shared.serialization against the per-handler helpers it replaced.
+
+    python benchmarks/json_encoding.py
+    python benchmarks/json_encoding.py --results 5000 -n 20
+
+Encoding compares the old ``decimal_to_number`` copy followed by
+``json.dumps`` (get_results, template_api) with ``serialization.dumps``,
+which converts Decimals inside the encoder. Decoding compares
+``json.loads`` followed by ``convert_to_decimal`` (submit_quiz) with
+``serialization.loads`` (``parse_float=Decimal``). The payloads are shaped
+like a results listing, a 50-question template and a quiz submission. Each
+row reports time per call and the peak memory allocated during one call.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+from decimal import Decimal
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+
+from shared import serialization
+
+
+# The helpers as they were in get_results.py/template_api.py and submit_quiz.py
+def decimal_to_number(obj):
+    if isinstance(obj, list):
+        return [decimal_to_number(i) for i in obj]
+    elif isinstance(obj, dict):
+        return {k: decimal_to_number(v) for k, v in obj.items()}
+    elif isinstance(obj, Decimal):
+        return int(obj) if obj % 1 == 0 else float(obj)
+    else:
+        return obj
+
+
+def convert_to_decimal(obj):
+    if isinstance(obj, list):
+        return [convert_to_decimal(i) for i in obj]
+    elif isinstance(obj, dict):
+        return {k: convert_to_decimal(v) for k, v in obj.items()}
+    elif isinstance(obj, float):
+        return Decimal(str(obj))
+    else:
+        return obj
+
+
+def question(i):
+    return {
+        'question_text': f'Explain concept {i} and give an example from the course material.',
+        'question_type': 'text',
+        'example_answer': 'A model answer of a few sentences. ' * 6,
+        'rubric': [f'key point {j}' for j in range(6)],
+        'points': Decimal(10),
+        'weight': Decimal('1.5'),
+    }
+
+
+def result(i, questions):
+    return {
+        'result_id': f'{i:032x}',
+        'template_id': 'template-1',
+        'student_name': f'Student {i}',
+        'course': 'MSC101',
+        'subject': 'Statistics',
+        'title': 'Midterm',
+        'average_score': Decimal(str(round(5 + (i % 50) / 10, 2))),
+        'total_questions': Decimal(len(questions)),
+        'template_version': Decimal(3),
+        'answers': [{'question_index': Decimal(q), 'answer_text': 'Student answer text. ' * 10}
+                    for q in range(len(questions))],
+        'evaluations': [{'question_index': Decimal(q), 'score': Decimal('7.5'),
+                         'evaluation': 'Good coverage of the main points. ' * 4,
+                         'justification': 'Mentions most key points. ' * 3, 'suggessions': 'Add an example.'}
+                        for q in range(len(questions))],
+        'questions': questions,
+        'completed_at': '2024-05-01T10:00:00',
+    }
+
+
+def timed(fn, n):
+    start = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - start) / n * 1000
+
+
+def peak_kb(fn):
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak / 1024
+
+
+def compare(name, legacy, new, n):
+    expected, actual = legacy(), new()
+    if isinstance(actual, str):
+        expected, actual = json.loads(expected), json.loads(actual)
+    assert expected == actual, f'{name}: shared serialization output differs from the legacy helpers'
+    legacy_ms, new_ms = timed(legacy, n), timed(new, n)
+    return {
+        'payload': name,
+        'legacy_ms': round(legacy_ms, 3),
+        'shared_ms': round(new_ms, 3),
+        'speedup': round(legacy_ms / new_ms, 2),
+        'legacy_peak_kb': round(peak_kb(legacy), 1),
+        'shared_peak_kb': round(peak_kb(new), 1),
+    }
+
+
+def run(result_count, n):
+    questions = [question(i) for i in range(10)]
+    results = {'results': [result(i, questions) for i in range(result_count)], 'count': result_count}
+    template = {'template_id': 'template-1', 'title': 'Midterm', 'questions': [question(i) for i in range(50)],
+                'version': Decimal(3)}
+    submission = json.dumps({
+        'template_id': 'template-1',
+        'student_name': 'Student 1',
+        'answers': [{'question_index': q, 'answer_text': 'Student answer text. ' * 20, 'confidence': 0.75}
+                    for q in range(20)],
+    })
+
+    return [
+        compare(f'results listing ({result_count})',
+                lambda: json.dumps(decimal_to_number(results)),
+                lambda: serialization.dumps(results), n),
+        compare('template (50 questions)',
+                lambda: json.dumps(decimal_to_number(template)),
+                lambda: serialization.dumps(template), n * 50),
+        compare('submit body decode',
+                lambda: convert_to_decimal(json.loads(submission)),
+                lambda: serialization.loads(submission), n * 50),
+    ]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--results', type=int, default=1000, help='results in the listing payload')
+    parser.add_argument('-n', '--iterations', type=int, default=10)
+    parser.add_argument('--json', action='store_true', help='print rows as JSON')
+    args = parser.parse_args()
+
+    rows = run(args.results, args.iterations)
+    if args.json:
+        print(json.dumps(rows, indent=2))
+    else:
+        header = f"{'payload':<26} {'legacy ms':>10} {'shared ms':>10} {'speedup':>8} {'legacy KB':>10} {'shared KB':>10}"
+        print(header)
+        print('-' * len(header))
+        for row in rows:
+            print(f"{row['payload']:<26} {row['legacy_ms']:>10} {row['shared_ms']:>10} {row['speedup']:>7}x "
+                  f"{row['legacy_peak_kb']:>10} {row['shared_peak_kb']:>10}")
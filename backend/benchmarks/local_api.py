@@ -0,0 +1,556 @@
+"""
+Local API Gateway emulator: every handler behind the routes of the CloudFormation stack.
+
+    python benchmarks/local_api.py                          # http://127.0.0.1:3001, 1,000 seeded results
+    python benchmarks/local_api.py --workers 64 --results 10000 --ttft-ms 300 --tokens-per-s 150
+    python benchmarks/local_api.py --max-concurrency 10 --idle-timeout 60 --cold-start-ms 250
+    python benchmarks/local_api.py --profile --emf
+
+Routes, path parameters and function timeouts are read from
+cloudformation/deploy-stack.yaml, so the server serves exactly what the stack
+deploys. Requests become API Gateway REST proxy events. Paths may carry the
+stage prefix (``/dev/templates``) or not. Unknown routes get API Gateway's 403
+"Missing Authentication Token", OPTIONS gets the stack's mock CORS response,
+and handler exceptions or malformed responses become 502s. MSC_Evaluate has no
+HTTP route in the stack. submit_quiz reaches it through the Lambda client, and
+it can be called directly with the Lambda Invoke API at
+``POST /2015-03-31/functions/<name>/invocations``.
+
+Requests are served by a pool of --workers threads. Each function has its own
+pool of emulated containers. A request that finds no idle container starts a
+new one, which is a cold start: it waits for the function's init time before
+the handler runs. The init time is the handler's import time, measured in a
+fresh interpreter at startup, or --cold-start-ms. Containers idle for longer
+than --idle-timeout are discarded. With --max-concurrency, a request that would
+start one container too many is throttled (429 over HTTP,
+TooManyRequestsException for the evaluator). Handler modules are imported once
+and share the process, so module-level caches are shared by every emulated
+container of a function. Cold starts model the init delay, not an empty cache.
+Handlers share the GIL too, so the server shows queueing and concurrency
+behaviour rather than multi-core throughput.
+
+Storage is the in-memory DynamoDB in fake_dynamodb.py, seeded like
+handler_suite.py, plus an ``admin`` user. Bedrock is fake_bedrock.py.
+``GET /_local/stats`` returns per-function container and latency counters.
+"""
+import argparse
+import base64
+import concurrent.futures
+import itertools
+import json
+import os
+import re
+import sys
+import threading
+import time
+import traceback
+import uuid
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCHMARKS)
+
+import handler_suite
+import import_budget
+from fake_bedrock import FakeLambda
+from fake_dynamodb import FakeClientError
+from shared import aws
+from shared import metrics
+from shared import passwords
+from shared import profiling
+
+STACK_FILE = os.path.join(os.path.dirname(handler_suite.BACKEND), 'cloudformation', 'deploy-stack.yaml')
+
+# Handler module -> lambda_handler, for the modules handler_suite imports
+HANDLER_MODULES = {module: sys.modules[module].lambda_handler for _, module in import_budget.HANDLERS.values()}
+
+# API Gateway caps integrations at 29 s; Lambda caps synchronous payloads at 6 MB
+INTEGRATION_TIMEOUT_S = 29
+MAX_PAYLOAD_BYTES = 6 * 1024 * 1024
+ADMIN_PASSWORD = 'local-admin-password'
+
+
+def load_stack(path=STACK_FILE):
+    """Parse the template, keeping CloudFormation tags (!Ref, !Sub...) as {'Ref': value} dicts"""
+    import yaml
+
+    class StackLoader(yaml.SafeLoader):
+        pass
+
+    def tagged(loader, suffix, node):
+        if isinstance(node, yaml.ScalarNode):
+            value = loader.construct_scalar(node)
+        elif isinstance(node, yaml.SequenceNode):
+            value = loader.construct_sequence(node, deep=True)
+        else:
+            value = loader.construct_mapping(node, deep=True)
+        return {suffix: value}
+
+    StackLoader.add_multi_constructor('!', tagged)
+    with open(path) as f:
+        return yaml.load(f, Loader=StackLoader)['Resources']
+
+
+def _logical_id(reference):
+    """Logical id in {'Ref': X} or {'GetAtt': 'X.RootResourceId'}; None for the API root"""
+    if 'Ref' in reference:
+        return reference['Ref']
+    return None
+
+
+def load_routes(stack):
+    """(HTTP method, resource path, target) for every method in the stack
+
+    The target is ('lambda', function logical id) for proxy integrations and
+    ('mock', response headers) for the OPTIONS mocks.
+    """
+    resources = {name: spec['Properties'] for name, spec in stack.items()
+                 if spec['Type'] == 'AWS::ApiGateway::Resource'}
+
+    def resource_path(name):
+        if name is None:
+            return ''
+        properties = resources[name]
+        return resource_path(_logical_id(properties['ParentId'])) + '/' + properties['PathPart']
+
+    routes = []
+    for spec in stack.values():
+        if spec['Type'] != 'AWS::ApiGateway::Method':
+            continue
+        properties = spec['Properties']
+        integration = properties['Integration']
+        path = resource_path(_logical_id(properties['ResourceId']))
+        if integration['Type'] == 'AWS_PROXY':
+            function = re.search(r'\$\{(\w+)\.Arn\}', integration['Uri']['Sub']).group(1)
+            target = ('lambda', function)
+        else:
+            parameters = integration['IntegrationResponses'][0].get('ResponseParameters', {})
+            target = ('mock', {name.rsplit('.', 1)[1]: value.strip("'") for name, value in parameters.items()})
+        routes.append((properties['HttpMethod'], path, target))
+    return routes
+
+
+def load_functions(stack):
+    """Function logical id -> {'name', 'function_name', 'handler', 'timeout_s', 'memory_mb'}"""
+    functions = {}
+    for logical_id, spec in stack.items():
+        if spec['Type'] != 'AWS::Lambda::Function':
+            continue
+        properties = spec['Properties']
+        module, _ = properties['Handler'].split('.')
+        metric_name = next(name for name, (_, m) in import_budget.HANDLERS.items() if m == module)
+        functions[logical_id] = {
+            'name': metric_name,
+            'function_name': properties['FunctionName']['Sub'].replace('${Environment}', aws.ENVIRONMENT),
+            'handler': HANDLER_MODULES[module],
+            'timeout_s': properties.get('Timeout', 3),
+            'memory_mb': properties.get('MemorySize', 128),
+        }
+    return functions
+
+
+class Router:
+    """Matches request paths to resources, literal segments before {parameters}, then methods"""
+
+    def __init__(self, routes):
+        self.methods = {}
+        for method, path, target in routes:
+            self.methods.setdefault(path, {})[method] = target
+        self.resources = []
+        for path in self.methods:
+            segments = path.strip('/').split('/')
+            pattern = '/'.join(f'(?P<{s[1:-1]}>[^/]+)' if s.startswith('{') else re.escape(s) for s in segments)
+            literals = sum(not s.startswith('{') for s in segments)
+            self.resources.append((-literals, path, re.compile(f'^/{pattern}/?$')))
+        self.resources.sort(key=lambda resource: resource[0])
+
+    def match(self, method, path):
+        """(resource path, path parameters, target), or None when the resource or method is not defined"""
+        for _, resource, pattern in self.resources:
+            found = pattern.match(path)
+            if found:
+                target = self.methods[resource].get(method)
+                return (resource, found.groupdict() or None, target) if target else None
+        return None
+
+
+class Container:
+    def __init__(self, container_id):
+        self.container_id = container_id
+        self.last_used = time.monotonic()
+        self.invocations = 0
+
+
+class ContainerPool:
+    """Warm containers of one function; a request that finds none starts a cold one"""
+
+    def __init__(self, function, init_ms, idle_timeout_s, max_concurrency):
+        self.function = function
+        self.init_ms = init_ms
+        self.idle_timeout_s = idle_timeout_s
+        self.max_concurrency = max_concurrency
+        self._lock = threading.Lock()
+        self._idle = []
+        self._ids = itertools.count(1)
+        self.active = 0
+        self.peak_active = 0
+        self.cold_starts = 0
+        self.warm_starts = 0
+        self.throttles = 0
+        self.expired = 0
+
+    def acquire(self):
+        """(container, cold) or (None, False) when the function is at its concurrency limit"""
+        with self._lock:
+            now = time.monotonic()
+            fresh = [c for c in self._idle if now - c.last_used <= self.idle_timeout_s]
+            self.expired += len(self._idle) - len(fresh)
+            self._idle = fresh
+            if self._idle:
+                # Lambda routes to the most recently used container first
+                container, cold = self._idle.pop(), False
+                self.warm_starts += 1
+            elif self.max_concurrency and self.active >= self.max_concurrency:
+                self.throttles += 1
+                return None, False
+            else:
+                container, cold = Container(next(self._ids)), True
+                self.cold_starts += 1
+            self.active += 1
+            self.peak_active = max(self.peak_active, self.active)
+            return container, cold
+
+    def release(self, container):
+        with self._lock:
+            container.last_used = time.monotonic()
+            container.invocations += 1
+            self._idle.append(container)
+            self.active -= 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'init_ms': self.init_ms, 'active': self.active, 'peak_active': self.peak_active,
+                'idle': len(self._idle), 'cold_starts': self.cold_starts, 'warm_starts': self.warm_starts,
+                'throttles': self.throttles, 'expired': self.expired,
+            }
+
+
+class LocalContext:
+    """The parts of the Lambda context object that handlers and shared modules read"""
+
+    def __init__(self, spec):
+        self.aws_request_id = str(uuid.uuid4())
+        self.function_name = spec['function_name']
+        self.invoked_function_arn = f'arn:aws:lambda:local:000000000000:function:{self.function_name}'
+        self.memory_limit_in_mb = spec['memory_mb']
+        self._deadline = time.monotonic() + spec['timeout_s']
+
+    def get_remaining_time_in_millis(self):
+        return max(0, int((self._deadline - time.monotonic()) * 1000))
+
+
+class Throttled(Exception):
+    pass
+
+
+class Emulator:
+    """Routes API Gateway proxy events and evaluator invocations to handlers through container pools"""
+
+    def __init__(self, stage, init_ms, idle_timeout_s, max_concurrency):
+        stack = load_stack()
+        functions = load_functions(stack)
+        self.stage = stage
+        self.router = Router(load_routes(stack))
+        self.functions = {spec['name']: spec for spec in functions.values()}
+        self.logical_ids = {logical_id: spec['name'] for logical_id, spec in functions.items()}
+        self.pools = {name: ContainerPool(name, init_ms[name], idle_timeout_s, max_concurrency)
+                      for name in self.functions}
+        self._lock = threading.Lock()
+        self.latencies = {name: [] for name in self.functions}
+        self.errors = {name: 0 for name in self.functions}
+        self.started = time.time()
+
+    def invoke(self, function, event):
+        """Run a handler in a container of its pool: (result, cold, duration_ms); raises Throttled"""
+        spec = self.functions[function]
+        pool = self.pools[function]
+        container, cold = pool.acquire()
+        if container is None:
+            raise Throttled(function)
+        started = time.perf_counter()
+        try:
+            if cold:
+                time.sleep(pool.init_ms / 1000)
+            context = LocalContext(spec)
+            result = spec['handler'](event, context)
+        except Exception:
+            with self._lock:
+                self.errors[function] += 1
+            raise
+        finally:
+            duration_ms = (time.perf_counter() - started) * 1000
+            pool.release(container)
+            with self._lock:
+                self.latencies[function].append(duration_ms)
+        return result, cold, duration_ms
+
+    def invoke_evaluator(self, event, context=None):
+        """lambda_handler stand-in given to FakeLambda, so evaluator calls go through the pool"""
+        try:
+            result, _, _ = self.invoke('msc_evaluate', event)
+        except Throttled:
+            raise FakeClientError('TooManyRequestsException', 'Rate Exceeded.')
+        return result
+
+    def strip_stage(self, path):
+        prefix = f'/{self.stage}'
+        if path == prefix or path.startswith(prefix + '/'):
+            return path[len(prefix):] or '/'
+        return path
+
+    def stats(self):
+        with self._lock:
+            latencies = {name: sorted(values) for name, values in self.latencies.items()}
+            errors = dict(self.errors)
+        functions = {}
+        for name, pool in self.pools.items():
+            values = latencies[name]
+            functions[name] = dict(pool.stats(), invocations=len(values), errors=errors[name])
+            if values:
+                functions[name].update({
+                    'p50_ms': round(handler_suite.percentile(values, 0.50), 3),
+                    'p95_ms': round(handler_suite.percentile(values, 0.95), 3),
+                    'p99_ms': round(handler_suite.percentile(values, 0.99), 3),
+                })
+        return {'uptime_s': round(time.time() - self.started, 3), 'functions': functions}
+
+
+def proxy_event(method, path, query, headers, body, resource, path_parameters, stage, source_ip):
+    """API Gateway REST proxy integration event"""
+    multi_query = {}
+    for name, value in query:
+        multi_query.setdefault(name, []).append(value)
+    multi_headers = {}
+    for name, value in headers:
+        multi_headers.setdefault(name, []).append(value)
+    text = None
+    is_base64 = False
+    if body:
+        try:
+            text = body.decode('utf-8')
+        except UnicodeDecodeError:
+            text, is_base64 = base64.b64encode(body).decode('ascii'), True
+    now = time.time()
+    return {
+        'resource': resource,
+        'path': path,
+        'httpMethod': method,
+        'headers': {name: values[-1] for name, values in multi_headers.items()} or None,
+        'multiValueHeaders': multi_headers or None,
+        'queryStringParameters': {name: values[-1] for name, values in multi_query.items()} or None,
+        'multiValueQueryStringParameters': multi_query or None,
+        'pathParameters': path_parameters,
+        'stageVariables': None,
+        'requestContext': {
+            'resourcePath': resource,
+            'httpMethod': method,
+            'path': f'/{stage}{path}',
+            'stage': stage,
+            'requestId': str(uuid.uuid4()),
+            'requestTimeEpoch': int(now * 1000),
+            'identity': {'sourceIp': source_ip, 'userAgent': multi_headers.get('User-Agent', [None])[-1]},
+        },
+        'body': text,
+        'isBase64Encoded': is_base64,
+    }
+
+
+class RequestHandler(BaseHTTPRequestHandler):
+    server_version = 'LocalApiGateway/1.0'
+    emulator = None
+    access_log = False
+
+    def do_request(self):
+        url = urlsplit(self.path)
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        path = self.emulator.strip_stage(url.path)
+
+        if path == '/_local/stats' and self.command == 'GET':
+            return self.reply(200, {'Content-Type': 'application/json'}, json.dumps(self.emulator.stats()).encode())
+
+        found = re.match(r'^/2015-03-31/functions/([^/]+)/invocations$', path)
+        if found and self.command == 'POST':
+            return self.lambda_invoke(found.group(1), body)
+
+        route = self.emulator.router.match(self.command, path)
+        if route is None:
+            return self.reply(403, {'Content-Type': 'application/json', 'x-amzn-ErrorType': 'MissingAuthenticationTokenException'},
+                              b'{"message":"Missing Authentication Token"}')
+        resource, path_parameters, (kind, target) = route
+        if kind == 'mock':
+            return self.reply(200, dict(target, **{'Content-Type': 'application/json'}), b'')
+
+        function = self.emulator.logical_ids[target]
+        event = proxy_event(self.command, path, parse_qsl(url.query, keep_blank_values=True), self.headers.items(),
+                            body, resource, path_parameters, self.emulator.stage, self.client_address[0])
+        api_headers = {'x-amzn-RequestId': event['requestContext']['requestId']}
+        try:
+            result, cold, duration_ms = self.emulator.invoke(function, event)
+        except Throttled:
+            return self.reply(429, dict(api_headers, **{'Content-Type': 'application/json'}),
+                              b'{"message":"Too Many Requests"}')
+        except Exception:
+            traceback.print_exc()
+            return self.reply(502, dict(api_headers, **{'Content-Type': 'application/json'}),
+                              b'{"message": "Internal server error"}')
+
+        api_headers.update({'X-Local-Cold-Start': '1' if cold else '0', 'X-Local-Duration-Ms': f'{duration_ms:.3f}'})
+        if duration_ms > min(self.emulator.functions[function]['timeout_s'], INTEGRATION_TIMEOUT_S) * 1000:
+            return self.reply(504, dict(api_headers, **{'Content-Type': 'application/json'}),
+                              b'{"message": "Endpoint request timed out"}')
+        if not isinstance(result, dict) or not isinstance(result.get('statusCode'), int):
+            print(f'{function}: malformed Lambda proxy response: {result!r:.200}')
+            return self.reply(502, dict(api_headers, **{'Content-Type': 'application/json'}),
+                              b'{"message": "Internal server error"}')
+
+        payload = result.get('body') or ''
+        if result.get('isBase64Encoded'):
+            payload = base64.b64decode(payload)
+        elif not isinstance(payload, bytes):
+            payload = str(payload).encode('utf-8')
+        if len(payload) > MAX_PAYLOAD_BYTES:
+            print(f'{function}: response of {len(payload)} bytes is over the Lambda payload limit')
+            return self.reply(502, dict(api_headers, **{'Content-Type': 'application/json'}),
+                              b'{"message": "Internal server error"}')
+        headers = dict(api_headers)
+        for name, values in (result.get('multiValueHeaders') or {}).items():
+            headers[name] = ', '.join(str(value) for value in values)
+        headers.update({name: str(value) for name, value in (result.get('headers') or {}).items()})
+        self.reply(result['statusCode'], headers, payload)
+
+    def lambda_invoke(self, name, body):
+        """The Lambda Invoke API, for functions without an HTTP route"""
+        function = next((f for f, spec in self.emulator.functions.items() if name in (f, spec['function_name'])), None)
+        if function is None:
+            return self.reply(404, {'x-amzn-ErrorType': 'ResourceNotFoundException'},
+                              json.dumps({'Message': f'Function not found: {name}'}).encode())
+        try:
+            result, cold, _ = self.emulator.invoke(function, json.loads(body or b'{}'))
+        except Throttled:
+            return self.reply(429, {'x-amzn-ErrorType': 'TooManyRequestsException'}, b'{"Message":"Rate Exceeded."}')
+        except Exception as e:
+            return self.reply(200, {'X-Amz-Function-Error': 'Unhandled'},
+                              json.dumps({'errorMessage': str(e), 'errorType': type(e).__name__}).encode())
+        self.reply(200, {'Content-Type': 'application/json', 'X-Local-Cold-Start': '1' if cold else '0'},
+                   json.dumps(result).encode())
+
+    def reply(self, status, headers, payload):
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(payload)
+
+    do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = do_OPTIONS = do_HEAD = do_request
+
+    def log_message(self, format, *args):
+        if self.access_log:
+            super().log_message(format, *args)
+
+
+class PooledHTTPServer(HTTPServer):
+    """HTTPServer that handles each connection on a fixed pool of worker threads"""
+
+    # The default backlog of 5 drops connections when a cohort connects at once
+    request_queue_size = 1024
+
+    def __init__(self, address, handler, workers):
+        super().__init__(address, handler)
+        self.pool = concurrent.futures.ThreadPoolExecutor(workers, thread_name_prefix='local-api')
+
+    def process_request(self, request, client_address):
+        self.pool.submit(self._process, request, client_address)
+
+    def _process(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        self.pool.shutdown(wait=False)
+
+
+def init_times(cold_start_ms):
+    """Cold start delay per function: a fixed value, or its import time in a fresh interpreter"""
+    if cold_start_ms is not None:
+        return {name: cold_start_ms for name in import_budget.HANDLERS}
+    return {name: round(import_budget.measure(name, 3)[0], 3) for name in import_budget.HANDLERS}
+
+
+def build(args):
+    """Seed storage, install the stand-ins and return the Emulator"""
+    dynamodb, bedrock, template_ids = handler_suite.seed(args.results, args.ttft_ms, args.tokens_per_s)
+    dynamodb.Table(aws.table_name('users')).put_item(Item={
+        'user_id': 'local-admin', 'username': 'admin', 'password': passwords.hash_password(ADMIN_PASSWORD),
+        'email': 'admin@example.com', 'role': 'admin', 'full_name': 'Local Admin', 'is_active': True,
+        'created_at': '2024-01-01T00:00:00', 'updated_at': '2024-01-01T00:00:00'
+    })
+    emulator = Emulator(args.stage, init_times(args.cold_start_ms), args.idle_timeout, args.max_concurrency)
+    evaluator = FakeLambda({aws.function_name('evaluate'): emulator.invoke_evaluator})
+    aws.install(dynamodb=dynamodb, bedrock_runtime=bedrock, lambda_=evaluator)
+    dynamodb.reset_stats()
+    return emulator, template_ids
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=3001)
+    parser.add_argument('--stage', default=aws.ENVIRONMENT, help='stage prefix accepted in paths')
+    parser.add_argument('--workers', type=int, default=32, help='worker threads serving connections')
+    parser.add_argument('--max-concurrency', type=int, default=0,
+                        help='containers per function before requests are throttled (0: no limit)')
+    parser.add_argument('--idle-timeout', type=float, default=300, help='seconds an idle container stays warm')
+    parser.add_argument('--cold-start-ms', type=float, default=None,
+                        help='init delay of a cold container (default: measured import time)')
+    parser.add_argument('--results', type=int, default=1000, help='quiz results to seed')
+    parser.add_argument('--ttft-ms', type=float, default=0, help='Bedrock time to first token')
+    parser.add_argument('--tokens-per-s', type=float, default=0, help='Bedrock streaming rate (0: no delay)')
+    parser.add_argument('--profile', action='store_true', help='honour X-Profile headers (see shared/profiling.py)')
+    parser.add_argument('--emf', action='store_true', help='print the handlers\' EMF metric lines')
+    parser.add_argument('--access-log', action='store_true', help='log every request')
+    args = parser.parse_args()
+
+    if args.profile:
+        profiling.ALLOW_HEADER = True
+    metrics.set_sink(None if args.emf else (lambda record: None))
+    emulator, template_ids = build(args)
+
+    RequestHandler.emulator = emulator
+    RequestHandler.access_log = args.access_log
+    server = PooledHTTPServer((args.host, args.port), RequestHandler, args.workers)
+    base = f'http://{args.host}:{server.server_address[1]}/{args.stage}'
+    print(f'Serving {len(emulator.router.resources)} resources at {base} with {args.workers} workers')
+    print(f'Log in as admin / {ADMIN_PASSWORD}, student000001 / {handler_suite.PASSWORD}; '
+          f'templates include {template_ids[0]}')
+    print('Cold start ms: ' + ', '.join(f'{name} {pool.init_ms}' for name, pool in emulator.pools.items()))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(json.dumps(emulator.stats(), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,161 @@
+"""
+Login load test: latency and DynamoDB work per login as the users table grows.
+
+    python benchmarks/login_load.py                      # 1k, 10k and 100k users
+    python benchmarks/login_load.py --users 100000 -n 2000
+    python benchmarks/login_load.py --legacy             # also run the old filtered scan
+
+Runs user_crud.lambda_handler against the in-memory DynamoDB in
+fake_dynamodb.py, seeded with N users, and reports per-login latency
+percentiles, DynamoDB calls and read units. The index lookup
+should stay flat as N grows. With --legacy the old
+``scan(FilterExpression='username = ...')`` is measured as well: one page of
+it (what the handler used to do, which misses users stored past the first
+1 MB) and the full paginated scan that a correct scan-based login would need.
+Password hashing runs at a low cost here so the numbers show the lookup;
+login_throughput.py measures the hashing cost.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(BACKEND, 'users'))
+sys.path.insert(0, BACKEND)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault('SESSION_TOKEN_SECRET', 'benchmark-signing-key')
+os.environ.setdefault('PASSWORD_SCRYPT_N', '1024')
+
+from fake_dynamodb import FakeDynamoDB
+from shared import aws
+from shared import metrics
+from shared import passwords
+import user_crud
+
+# Handlers write one EMF line per request; keep them out of the report
+metrics.set_sink(lambda record: None)
+
+USERS_TABLE = aws.table_name('users')
+PASSWORD = 'benchmark-password'
+
+
+def seed(count):
+    dynamodb = FakeDynamoDB({USERS_TABLE: ('user_id', None, {user_crud.USERNAME_INDEX: ('username', None)})})
+    table = dynamodb.Table(USERS_TABLE)
+    # One hash shared by every user keeps seeding fast; logins still verify it
+    stored = passwords.hash_password(PASSWORD)
+    with table.batch_writer() as batch:
+        for i in range(count):
+            batch.put_item(Item={
+                'user_id': f'{i:032x}',
+                'username': f'student{i:06d}',
+                'password': stored,
+                'email': f'student{i:06d}@example.com',
+                'role': 'student',
+                'full_name': f'Student {i}',
+                'is_active': True,
+                'created_at': '2024-01-01T00:00:00',
+                'updated_at': '2024-01-01T00:00:00'
+            })
+    dynamodb.reset_stats()
+    aws.install(dynamodb=dynamodb)
+    return dynamodb
+
+
+def login_event(i):
+    return {
+        'httpMethod': 'POST',
+        'path': '/users/login',
+        'body': json.dumps({'username': f'student{i:06d}', 'password': PASSWORD})
+    }
+
+
+def legacy_login(username, paginate):
+    """The pre-index lookup: a filtered scan, optionally followed through every page"""
+    kwargs = {
+        'FilterExpression': 'username = :username',
+        'ExpressionAttributeValues': {':username': username}
+    }
+    while True:
+        response = aws.table('users').scan(**kwargs)
+        if response.get('Items'):
+            return response['Items'][0]
+        if not paginate or 'LastEvaluatedKey' not in response:
+            return None
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def measure(dynamodb, requests, call):
+    dynamodb.reset_stats()
+    latencies = []
+    failures = 0
+    for i in requests:
+        start = time.perf_counter()
+        ok = call(i)
+        latencies.append((time.perf_counter() - start) * 1000)
+        failures += 0 if ok else 1
+    n = len(requests)
+    return {
+        'p50_ms': round(statistics.median(latencies), 3),
+        'p95_ms': round(percentile(latencies, 0.95), 3),
+        'p99_ms': round(percentile(latencies, 0.99), 3),
+        'calls_per_login': round(dynamodb.total_calls() / n, 2),
+        'rcu_per_login': round(dynamodb.read_units / n, 2),
+        'failed': failures,
+        'requests': n,
+    }
+
+
+def run(user_counts, requests, legacy, seed_value):
+    rows = []
+    for count in user_counts:
+        dynamodb = seed(count)
+        rng = random.Random(seed_value)
+        sample = [rng.randrange(count) for _ in range(requests)]
+
+        def index_login(i):
+            return user_crud.lambda_handler(login_event(i), None)['statusCode'] == 200
+        rows.append(dict(measure(dynamodb, sample, index_login), users=count, lookup='username-index query'))
+
+        if legacy:
+            # Full scans are slow at this size, so the legacy runs use fewer requests
+            legacy_sample = sample[:max(1, min(requests, 50))]
+            rows.append(dict(measure(dynamodb, legacy_sample, lambda i: legacy_login(f'student{i:06d}', False)),
+                             users=count, lookup='scan, first page (old)'))
+            rows.append(dict(measure(dynamodb, legacy_sample, lambda i: legacy_login(f'student{i:06d}', True)),
+                             users=count, lookup='scan, all pages'))
+    return rows
+
+
+def print_table(rows):
+    header = f"{'users':>8}  {'lookup':<24} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'calls':>7} {'RCU':>8} {'failed':>10}"
+    print(header)
+    print('-' * len(header))
+    for row in rows:
+        print(f"{row['users']:>8}  {row['lookup']:<24} {row['p50_ms']:>9} {row['p95_ms']:>9} {row['p99_ms']:>9} "
+              f"{row['calls_per_login']:>7} {row['rcu_per_login']:>8} {row['failed']:>5}/{row['requests']:<4}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--users', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('-n', '--requests', type=int, default=1000, help='logins per table size')
+    parser.add_argument('--legacy', action='store_true', help='also measure the old filtered scan')
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--json', action='store_true', help='print rows as JSON')
+    args = parser.parse_args()
+
+    rows = run(args.users, args.requests, args.legacy, args.seed)
+    if args.json:
+        print(json.dumps(rows, indent=2))
+    else:
+        print_table(rows)
@@ -0,0 +1,140 @@
+"""
+Login throughput at the password hashing cost.
+
+    python benchmarks/login_throughput.py                       # PASSWORD_SCRYPT_N (default 16384)
+    python benchmarks/login_throughput.py --cost 8192 16384 32768 --memory-mb 1024
+
+Runs user_crud.lambda_handler logins against the in-memory DynamoDB in
+fake_dynamodb.py for users whose passwords are stored two ways:
+
+- ``hashed``: already at the current cost, the steady state.
+- ``plaintext``: legacy rows; the first login verifies and rehashes.
+
+It reports p50/p95/p99 latency and logins per second for one container.
+Lambda runs one request per container at a time, so burst capacity is that
+rate times the concurrent containers. Timings are also scaled to the CPU share
+Lambda gives the function's memory size (one vCPU at 1,769 MB) to estimate
+the deployed p99.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(BACKEND, 'users'))
+sys.path.insert(0, BACKEND)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault('SESSION_TOKEN_SECRET', 'benchmark-signing-key')
+
+from fake_dynamodb import FakeDynamoDB
+from shared import aws
+from shared import metrics
+from shared import passwords
+import user_crud
+
+# Handlers write one EMF line per request; keep them out of the report
+metrics.set_sink(lambda record: None)
+
+LAMBDA_MB_PER_VCPU = 1769
+USERS_TABLE = aws.table_name('users')
+
+
+def stored_password(kind, password):
+    if kind == 'plaintext':
+        return password
+    return passwords.hash_password(password)
+
+
+def seed(count, kind):
+    dynamodb = FakeDynamoDB({USERS_TABLE: ('user_id', None, {user_crud.USERNAME_INDEX: ('username', None)})})
+    table = dynamodb.Table(USERS_TABLE)
+    with table.batch_writer() as batch:
+        for i in range(count):
+            batch.put_item(Item={
+                'user_id': f'{i:032x}',
+                'username': f'student{i:06d}',
+                'password': stored_password(kind, f'password-{i}'),
+                'email': f'student{i:06d}@example.com',
+                'role': 'student',
+                'full_name': f'Student {i}',
+                'is_active': True
+            })
+    dynamodb.reset_stats()
+    aws.install(dynamodb=dynamodb)
+    return dynamodb
+
+
+def login(i):
+    event = {
+        'httpMethod': 'POST',
+        'path': '/users/login',
+        'body': json.dumps({'username': f'student{i:06d}', 'password': f'password-{i}'})
+    }
+    return user_crud.lambda_handler(event, None)['statusCode'] == 200
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def measure(cost, kind, users, cpu_share):
+    passwords.SCRYPT_N = cost
+    dynamodb = seed(users, kind)
+    latencies = []
+    failures = 0
+    started = time.perf_counter()
+    # Each user logs in once, so plaintext rows show the first (rehashing) login
+    for i in range(users):
+        start = time.perf_counter()
+        failures += 0 if login(i) else 1
+        latencies.append((time.perf_counter() - start) * 1000)
+    elapsed = time.perf_counter() - started
+    return {
+        'cost_n': cost,
+        'stored': kind,
+        'p50_ms': round(statistics.median(latencies), 2),
+        'p95_ms': round(percentile(latencies, 0.95), 2),
+        'p99_ms': round(percentile(latencies, 0.99), 2),
+        'logins_per_s': round(users / elapsed, 1),
+        'lambda_p99_ms': round(percentile(latencies, 0.99) / cpu_share, 1),
+        'lambda_logins_per_s': round(users / elapsed * cpu_share, 1),
+        'writes_per_login': round(dynamodb.calls.get(f'{USERS_TABLE}:UpdateItem', 0) / users, 2),
+        'failed': failures,
+    }
+
+
+def run(costs, users, kinds, memory_mb):
+    cpu_share = min(1.0, memory_mb / LAMBDA_MB_PER_VCPU)
+    return [measure(cost, kind, users, cpu_share) for cost in costs for kind in kinds]
+
+
+def print_table(rows, memory_mb):
+    header = (f"{'N':>7}  {'stored':<10} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'logins/s':>9} "
+              f"{'@' + str(memory_mb) + 'MB p99':>13} {'@' + str(memory_mb) + 'MB /s':>11} {'writes':>7} {'failed':>6}")
+    print(header)
+    print('-' * len(header))
+    for row in rows:
+        print(f"{row['cost_n']:>7}  {row['stored']:<10} {row['p50_ms']:>8} {row['p95_ms']:>8} {row['p99_ms']:>8} "
+              f"{row['logins_per_s']:>9} {row['lambda_p99_ms']:>13} {row['lambda_logins_per_s']:>11} "
+              f"{row['writes_per_login']:>7} {row['failed']:>6}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--cost', type=int, nargs='+', default=[passwords.SCRYPT_N], help='scrypt N values to compare')
+    parser.add_argument('--users', type=int, default=200, help='users seeded, each logs in once')
+    parser.add_argument('--stored', nargs='+', choices=('hashed', 'plaintext'),
+                        default=['hashed', 'plaintext'])
+    parser.add_argument('--memory-mb', type=int, default=1024, help='memory size of the users function')
+    parser.add_argument('--json', action='store_true', help='print rows as JSON')
+    args = parser.parse_args()
+
+    rows = run(args.cost, args.users, args.stored, args.memory_mb)
+    if args.json:
+        print(json.dumps(rows, indent=2))
+    else:
+        print_table(rows, args.memory_mb)
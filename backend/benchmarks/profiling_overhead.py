@@ -0,0 +1,117 @@
+"""
+Overhead of the profiling wrapper in shared/profiling.py.
+
+    python benchmarks/profiling_overhead.py
+    python benchmarks/profiling_overhead.py -n 200 get_results.list submit_quiz.submit
+
+The first table times the wrapper around an empty handler, for invocations
+that are not profiled: profiling off, the header allowed but absent, and
+sampling on but not picked. The second table runs handler_suite.py
+scenarios unwrapped, wrapped but not profiled, and profiled in each mode.
+It reports the mean per request and the slowdown against the unwrapped
+handler.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import handler_suite
+from shared import profiling
+
+
+def empty_handler(event, context):
+    return {'statusCode': 200}
+
+
+@contextlib.contextmanager
+def settings(**values):
+    previous = {name: getattr(profiling, name) for name in values}
+    for name, value in values.items():
+        setattr(profiling, name, value)
+    try:
+        yield
+    finally:
+        for name, value in previous.items():
+            setattr(profiling, name, value)
+
+
+def mean_us(handler, make_event, n):
+    events = [make_event(i) for i in range(1, n + 1)]
+    timings = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for event in events:
+            start = time.perf_counter()
+            handler(event, None)
+            timings.append((time.perf_counter() - start) * 1e6)
+    return statistics.mean(timings)
+
+
+def wrapper_rows(n):
+    event = {'httpMethod': 'GET', 'headers': {'Authorization': 'Bearer x'}}
+    wrapped = profiling.profiled('empty')(empty_handler)
+    base = mean_us(empty_handler, lambda i: event, n)
+    cases = [
+        ('profiling off', {}),
+        ('header allowed, absent', {'ALLOW_HEADER': True}),
+        ('sampling on, not picked', {'SAMPLE_RATE': 1e-12}),
+    ]
+    rows = [{'case': 'unwrapped', 'mean_us': round(base, 3), 'overhead_us': 0.0}]
+    for name, values in cases:
+        with settings(**values):
+            cost = mean_us(wrapped, lambda i: event, n)
+        rows.append({'case': name, 'mean_us': round(cost, 3), 'overhead_us': round(cost - base, 3)})
+    return rows
+
+
+def handler_rows(scenarios, n):
+    _, _, template_ids = handler_suite.seed(1000, 0, 0)
+    available = handler_suite.scenarios(template_ids, 1000)
+    rows = []
+    for name in scenarios:
+        handler, make_event = available[name]
+        # The handlers are decorated; __wrapped__ chains back through metrics and profiling
+        unwrapped = handler.__wrapped__.__wrapped__
+        handler(make_event(0), None)
+        base = mean_us(unwrapped, make_event, n)
+        cases = [('wrapped, not profiled', {}, make_event)]
+        for mode in profiling.MODES:
+            def profiled_event(i, mode=mode):
+                event = make_event(i)
+                event['headers'] = dict(event.get('headers') or {}, **{'X-Profile': mode})
+                return event
+            cases.append((f'profiled: {mode}', {'ALLOW_HEADER': True, 'MIN_INTERVAL_S': 0}, profiled_event))
+        rows.append({'scenario': name, 'case': 'unwrapped', 'mean_us': round(base, 1), 'slowdown': 1.0})
+        for case, values, events in cases:
+            with settings(**values):
+                cost = mean_us(handler, events, n)
+            rows.append({'scenario': name, 'case': case, 'mean_us': round(cost, 1), 'slowdown': round(cost / base, 2)})
+    return rows
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('scenarios', nargs='*', default=['take_quiz.view', 'get_results.list'],
+                        help='handler_suite.py scenarios to profile')
+    parser.add_argument('-n', '--requests', type=int, default=100)
+    parser.add_argument('--json', action='store_true', help='print rows as JSON')
+    args = parser.parse_args()
+
+    wrapper = wrapper_rows(args.requests * 100)
+    handlers = handler_rows(args.scenarios, args.requests)
+    if args.json:
+        print(json.dumps({'wrapper': wrapper, 'handlers': handlers}, indent=2))
+    else:
+        print(f"{'not profiled':<26} {'mean us':>9} {'overhead us':>12}")
+        for row in wrapper:
+            print(f"{row['case']:<26} {row['mean_us']:>9} {row['overhead_us']:>12}")
+        print()
+        print(f"{'scenario':<22} {'case':<24} {'mean us':>10} {'slowdown':>9}")
+        for row in handlers:
+            print(f"{row['scenario']:<22} {row['case']:<24} {row['mean_us']:>10} {row['slowdown']:>8}x")
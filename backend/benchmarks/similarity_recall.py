@@ -0,0 +1,113 @@
+"""
+Recall of the similarity index at the default threshold.
+
+    python benchmarks/similarity_recall.py
+    python benchmarks/similarity_recall.py --pairs 1000 --min-recall 0.97
+
+Builds pairs of answers whose word shingles have a known Jaccard similarity
+by replacing words of a random answer, and reports for each similarity how
+often the pair shares an LSH bucket, next to the rate the banding predicts.
+
+It then indexes one known pair just above 0.7 similarity into the in-memory
+DynamoDB in fake_dynamodb.py and runs find_clusters at DEFAULT_THRESHOLD. The
+script exits with status 1 when that pair is not found, or when pairs at
+DEFAULT_THRESHOLD share a bucket less often than --min-recall.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+
+BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARKS))
+sys.path.insert(0, BENCHMARKS)
+
+from fake_dynamodb import FakeDynamoDB
+from shared import aws
+from shared import similarity
+
+ANSWER_WORDS = 80
+SIMILARITIES = (0.5, 0.6, 0.7, 0.8, 0.9)
+# Jaccard similarities are rounded to this when a pair is matched to a target
+TOLERANCE = 0.02
+# Chosen once so the known pair is the same on every run
+KNOWN_PAIR_SEED = 7
+
+
+def jaccard(first, second):
+    first, second = set(similarity.shingles(first)), set(similarity.shingles(second))
+    return len(first & second) / len(first | second)
+
+
+def make_pair(rng, target):
+    """Two answers whose shingle sets are target similar (within TOLERANCE), and their similarity"""
+    while True:
+        words = [f'w{rng.randrange(10 ** 6)}' for _ in range(ANSWER_WORDS)]
+        changed = list(words)
+        positions = list(range(ANSWER_WORDS))
+        rng.shuffle(positions)
+        for position in positions:
+            changed[position] = f'x{rng.randrange(10 ** 6)}'
+            score = jaccard(' '.join(words), ' '.join(changed))
+            if abs(score - target) <= TOLERANCE:
+                return ' '.join(words), ' '.join(changed), score
+            if score < target:
+                break
+
+
+def candidate_rate(target, pairs, seed):
+    """Share of pairs at a similarity that land in a common bucket"""
+    rng = random.Random(seed)
+    found = 0
+    for _ in range(pairs):
+        first, second, _ = make_pair(rng, target)
+        first_keys = set(similarity.band_keys('t', 'q', similarity.signature(first)))
+        found += bool(first_keys & set(similarity.band_keys('t', 'q', similarity.signature(second))))
+    return found / pairs
+
+
+def predicted_rate(target):
+    return 1 - (1 - target ** similarity.ROWS) ** similarity.BANDS
+
+
+def known_pair_found():
+    """Index the known pair and report whether find_clusters groups it at DEFAULT_THRESHOLD"""
+    rng = random.Random(KNOWN_PAIR_SEED)
+    first, second, score = make_pair(rng, similarity.DEFAULT_THRESHOLD + TOLERANCE)
+    dynamodb = FakeDynamoDB({
+        aws.table_name('similarity'): ('bucket_key', 'member', {similarity.COLLISION_INDEX: ('question_key', 'bucket_key')}),
+    })
+    aws.install(dynamodb=dynamodb)
+    for result_id, text in (('first', first), ('second', second)):
+        similarity.index_answers('t', result_id, [{'question_id': 'q', 'answer_text': text}])
+    clusters = similarity.find_clusters('t', 'q')['clusters']
+    found = any({member['result_id'] for member in cluster['members']} == {'first', 'second'} for cluster in clusters)
+    return score, found
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--pairs', type=int, default=300, help='pairs generated per similarity')
+    parser.add_argument('--min-recall', type=float, default=0.95,
+                        help='share of pairs at DEFAULT_THRESHOLD that must share a bucket')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', action='store_true', help='print rows as JSON')
+    args = parser.parse_args()
+
+    rows = [{'similarity': target, 'predicted': round(predicted_rate(target), 3),
+             'measured': round(candidate_rate(target, args.pairs, args.seed), 3)} for target in SIMILARITIES]
+    score, found = known_pair_found()
+    if args.json:
+        print(json.dumps({'bands': similarity.BANDS, 'rows': similarity.ROWS, 'recall': rows,
+                          'known_pair': {'similarity': round(score, 3), 'found': found}}, indent=2))
+    else:
+        print(f'{similarity.BANDS} bands of {similarity.ROWS} rows, threshold {similarity.DEFAULT_THRESHOLD}')
+        print(f"{'similarity':>10} {'predicted':>10} {'measured':>10}")
+        for row in rows:
+            print(f"{row['similarity']:>10} {row['predicted']:>10} {row['measured']:>10}")
+        print(f"Known pair at {score:.3f} similarity: {'found' if found else 'NOT found'}")
+
+    at_threshold = [row for row in rows if row['similarity'] == similarity.DEFAULT_THRESHOLD]
+    failed = not found or (at_threshold and at_threshold[0]['measured'] < args.min_recall)
+    sys.exit(1 if failed else 0)
@@ -1,9 +1,9 @@
 import json
-import boto3
-from decimal import Decimal
-
-# DynamoDB setup
-dynamodb = boto3.resource('dynamodb')
+from shared import auth
+from shared import aws
+from shared import metrics
+from shared import profiling
+from shared import similarity
 
 def get_cors_headers():
     return {
@@ -13,6 +13,8 @@ def get_cors_headers():
         'Access-Control-Allow-Methods': 'GET,POST,PUT,DELETE,OPTIONS'
     }
 
+@metrics.instrument('delete_result')
+@profiling.profiled('delete_result')
 def lambda_handler(event, context):
     # Handle OPTIONS request for CORS preflight
     if event.get('httpMethod') == 'OPTIONS':
@@ -22,6 +24,16 @@ def lambda_handler(event, context):
             'body': ''
         }
     
+    # Results are for staff only; the session token is verified locally, without a database read
+    try:
+        auth.authenticate(event, roles=auth.STAFF_ROLES)
+    except auth.AuthError as e:
+        return {
+            'statusCode': e.status_code,
+            'headers': get_cors_headers(),
+            'body': json.dumps({'error': e.message})
+        }
+    
     try:
         # Get result_id from path parameters
         path_params = event.get('pathParameters') or {}
@@ -34,8 +46,7 @@ def lambda_handler(event, context):
                 'body': json.dumps({'error': 'Result ID is required'})
             }
         
-        table_name = 'msc-evaluate-quiz-results-dev'
-        table = dynamodb.Table(table_name)
+        table = aws.table('results')
         
         # Check if result exists
         response = table.get_item(Key={'result_id': result_id})
@@ -50,6 +61,15 @@ def lambda_handler(event, context):
         # Delete the result
         table.delete_item(Key={'result_id': result_id})
         
+        # Drop its answers from similarity clusters; bucket entries without a signature are ignored
+        result = response['Item']
+        try:
+            similarity.remove_answers(result['template_id'],
+                                      result_id,
+                                      similarity.answer_question_ids(result).values())
+        except Exception as e:
+            print(f"Similarity index error for {result_id}: {e}")
+        
         return {
             'statusCode': 200,
             'headers': get_cors_headers(),
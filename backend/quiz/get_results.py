@@ -1,20 +1,103 @@
 import json
-import boto3
-from decimal import Decimal
+from shared import auth
+from shared import aws
+from shared import metrics
+from shared import profiling
+from shared import question_bank
+from shared import serialization
+from shared import similarity
+from shared import template_cache
+from shared import template_versions
 
-# DynamoDB setup
-dynamodb = boto3.resource('dynamodb')
+def result_questions(result):
+    """Questions of the template version a result was graded against, or None if that version is unavailable"""
+    template_id = result['template_id']
+    version = result.get('template_version')
+    if version is None:
+        # Results from before versioning only have the live template
+        template = template_cache.get_template(template_id)
+        return template.get('questions', []) if template else []
+    try:
+        template = template_versions.get_version(template_id, version)
+    except template_versions.MissingContent as e:
+        print(f"Error loading template {template_id} version {version}: {e}")
+        return None
+    # The live template may have changed since, so it is never shown in place of the graded version
+    return template['questions'] if template else None
+
+def enrich_results(results):
+    """Attach to each result the bank questions it drew, or the questions of its template version
+
+    A result whose template version cannot be rebuilt gets no questions and
+    ``questions_unavailable`` set.
+    """
+    for result in results:
+        template_id = result.get('template_id')
+        if result.get('question_ids'):
+            try:
+                result['questions'] = question_bank.get_questions(list(result['question_ids']))
+            except Exception as e:
+                print(f"Error fetching bank questions for result {result.get('result_id')}: {e}")
+                result['questions'] = []
+        elif template_id:
+            try:
+                questions = result_questions(result)
+            except Exception as e:
+                print(f"Error fetching template {template_id}: {e}")
+                questions = []
+            if questions is None:
+                result['questions'] = []
+                result['questions_unavailable'] = f"Version {result['template_version']} of this quiz is not available"
+            else:
+                result['questions'] = questions
 
-# Helper function to convert Decimal to int/float for JSON serialization
-def decimal_to_number(obj):
-    if isinstance(obj, list):
-        return [decimal_to_number(i) for i in obj]
-    elif isinstance(obj, dict):
-        return {k: decimal_to_number(v) for k, v in obj.items()}
-    elif isinstance(obj, Decimal):
-        return int(obj) if obj % 1 == 0 else float(obj)
-    else:
-        return obj
+def similarity_clusters(event):
+    """GET /results/similarity - Groups of near-identical answers to one question of a template"""
+    query_params = event.get('queryStringParameters') or {}
+    template_id = query_params.get('template_id')
+    question_id = query_params.get('question_id')
+    try:
+        question_index = int(query_params['question_index']) if not question_id else None
+        threshold = float(query_params.get('threshold', similarity.DEFAULT_THRESHOLD))
+    except (KeyError, ValueError):
+        question_index, threshold = None, None
+    
+    if not template_id or (question_id is None and question_index is None) or threshold is None or not 0 < threshold <= 1:
+        return {
+            'statusCode': 400,
+            'headers': get_cors_headers(),
+            'body': json.dumps({'error': 'template_id, a question_id or integer question_index and a threshold between 0 and 1 are required'})
+        }
+    
+    try:
+        if question_id is None:
+            # Answers are grouped by question id; a position only names a question of a fixed template
+            template = template_cache.get_template(template_id)
+            questions = template.get('questions', []) if template and not template.get('sampling') else []
+            if not 0 <= question_index < len(questions):
+                return {
+                    'statusCode': 400,
+                    'headers': get_cors_headers(),
+                    'body': json.dumps({'error': 'question_index does not name a question of this template; pass question_id'})
+                }
+            question_id = question_bank.stable_id(questions[question_index])
+        with metrics.phase('query'):
+            clusters = similarity.find_clusters(template_id, question_id, threshold)
+        if question_index is not None:
+            clusters['question_index'] = question_index
+        metrics.count('similarity_candidates', clusters['candidates'])
+        return {
+            'statusCode': 200,
+            'headers': get_cors_headers(),
+            'body': serialization.dumps(dict(clusters, template_id=template_id, threshold=threshold))
+        }
+    except Exception as e:
+        print(f"Similarity clusters error: {e}")
+        return {
+            'statusCode': 500,
+            'headers': get_cors_headers(),
+            'body': json.dumps({'error': f'Internal server error: {str(e)}'})
+        }
 
 def get_cors_headers():
     return {
@@ -24,6 +107,8 @@ def get_cors_headers():
         'Access-Control-Allow-Methods': 'GET,POST,PUT,DELETE,OPTIONS'
     }
 
+@metrics.instrument('get_results')
+@profiling.profiled('get_results')
 def lambda_handler(event, context):
     # Handle OPTIONS request for CORS preflight
     if event.get('httpMethod') == 'OPTIONS':
@@ -33,11 +118,22 @@ def lambda_handler(event, context):
             'body': ''
         }
     
+    # Results are for staff only; the session token is verified locally, without a database read
+    try:
+        auth.authenticate(event, roles=auth.STAFF_ROLES)
+    except auth.AuthError as e:
+        return {
+            'statusCode': e.status_code,
+            'headers': get_cors_headers(),
+            'body': json.dumps({'error': e.message})
+        }
+    
+    # Answer-similarity clusters for staff reviewing a question
+    if event.get('path', '').rstrip('/').endswith('/similarity'):
+        return similarity_clusters(event)
+    
     try:
-        results_table_name = 'msc-evaluate-quiz-results-dev'
-        templates_table_name = 'msc-evaluate-templates-dev'
-        results_table = dynamodb.Table(results_table_name)
-        templates_table = dynamodb.Table(templates_table_name)
+        results_table = aws.table('results')
         
         # Get query parameters for filtering
         query_params = event.get('queryStringParameters') or {}
@@ -62,43 +158,36 @@ def lambda_handler(event, context):
             expression_values[':subject'] = subject
         
         # Execute scan
-        if filter_parts:
-            filter_expression = ' AND '.join(filter_parts)
-            response = results_table.scan(
-                FilterExpression=filter_expression,
-                ExpressionAttributeValues=expression_values
-            )
-        else:
-            response = results_table.scan()
+        with metrics.phase('query'):
+            if filter_parts:
+                filter_expression = ' AND '.join(filter_parts)
+                response = results_table.scan(
+                    FilterExpression=filter_expression,
+                    ExpressionAttributeValues=expression_values
+                )
+            else:
+                response = results_table.scan()
         
         results = response.get('Items', [])
         
-        # Enrich results with template questions
-        for result in results:
-            template_id = result.get('template_id')
-            if template_id:
-                try:
-                    template_response = templates_table.get_item(Key={'template_id': template_id})
-                    template = template_response.get('Item')
-                    if template:
-                        result['questions'] = template.get('questions', [])
-                except Exception as e:
-                    print(f"Error fetching template {template_id}: {e}")
-                    result['questions'] = []
-        
-        # Convert Decimal types to int/float for JSON serialization
-        results = decimal_to_number(results)
+        # Enrich results with template questions (or the bank questions a sampled quiz drew)
+        with metrics.phase('enrich'):
+            enrich_results(results)
         
         # Sort by completed_at descending (most recent first)
         results.sort(key=lambda x: x.get('completed_at', ''), reverse=True)
         
-        return {
-            'statusCode': 200,
-            'headers': get_cors_headers(),
-            'body': json.dumps({
+        with metrics.phase('serialize'):
+            body = serialization.dumps({
                 'results': results,
                 'count': len(results)
             })
+        metrics.count('results', len(results))
+        
+        return {
+            'statusCode': 200,
+            'headers': get_cors_headers(),
+            'body': body
         }
         
     except Exception as e:
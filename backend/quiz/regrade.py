@@ -0,0 +1,332 @@
+"""
+Re-grade stored quiz results after an example answer, rubric, model or prompt changes.
+
+    python quiz/regrade.py --template-id <id>                 # re-grade one template's results
+    python quiz/regrade.py --course CS101 --rate 5 --concurrency 8
+    python quiz/regrade.py --course CS101 --dry-run           # report only, write nothing
+    python quiz/regrade.py --template-id <id> --restart       # ignore an existing checkpoint
+
+Results are scanned page by page, so memory stays flat however many match.
+Each answer is graded the way submit_quiz grades it: evaluate_answer() calls
+the MSC_Evaluate function with the current example answer and rubric. Calls
+run on --concurrency threads and are limited to --rate calls per second.
+
+Every evaluation stores an ``input_hash`` (see submit_quiz.grading_hash). It
+covers the answer, the example answer, the rubric and GRADER_VERSION. An answer
+whose hash has not changed keeps its grade without an evaluator call. Set
+GRADER_VERSION to a new value, or pass --force, to re-grade after a model or
+prompt change. Results stored before hashes existed are re-graded once.
+
+Answers are matched to the current questions by the ``question_id`` stored on
+each answer (or resolved through the result's template version snapshot), not
+by position. An answer whose question was removed or reworded since, or whose
+question cannot be identified, keeps its grade and is reported under
+``structure_changed``.
+
+Changed results are updated in place: their evaluations, average_score,
+regraded_at and, when every answer was matched by id, template_version. The write is conditional on updated_at, so a
+result edited meanwhile is reported as a conflict and left alone. A failed
+evaluation keeps its previous grade. Progress is checkpointed after every
+result, and an interrupted run resumes where it stopped. One JSON line per
+result goes to the --report file, with old and new scores. A summary is printed
+at the end.
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from shared import aws
+from shared import pagination
+from shared import question_bank
+from shared import rubrics
+from shared import serialization
+from shared import similarity
+from shared import template_cache
+import submit_quiz
+
+PAGE_SIZE = 100
+SELECTORS = ('template_id', 'course', 'subject', 'student_name')
+COUNTERS = ('matched', 'updated', 'unchanged', 'conflicts', 'failed_results', 'evaluations', 'failed_evaluations',
+            'structure_changed', 'raised', 'lowered', 'total_abs_delta')
+
+
+class RateLimiter:
+    """Spaces calls at least 1/rate seconds apart across threads"""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0.0
+        self._lock = threading.Lock()
+        self._next = time.monotonic()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class Checkpoint:
+    """Progress of one re-grade run, saved atomically after every result"""
+
+    def __init__(self, path, selection):
+        self.path = path
+        self.selection = selection
+        self.next_token = None
+        self.page_done = []
+        self.finished = False
+        self.summary = dict.fromkeys(COUNTERS, 0)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path, selection):
+        checkpoint = cls(path, selection)
+        if os.path.exists(path):
+            with open(path) as f:
+                saved = json.load(f)
+            if saved['selection'] != selection:
+                raise SystemExit(f'{path} belongs to a run with a different selection; pass --restart to replace it')
+            checkpoint.next_token = saved['next_token']
+            checkpoint.page_done = saved['page_done']
+            checkpoint.finished = saved['finished']
+            checkpoint.summary.update(saved['summary'])
+        return checkpoint
+
+    def save(self):
+        with self._lock:
+            state = {'selection': self.selection, 'next_token': self.next_token, 'page_done': self.page_done,
+                     'finished': self.finished, 'summary': self.summary}
+            temporary = self.path + '.tmp'
+            with open(temporary, 'w') as f:
+                json.dump(state, f)
+            os.replace(temporary, self.path)
+
+    def result_done(self, result_id, counts):
+        with self._lock:
+            self.page_done.append(result_id)
+            for name, value in counts.items():
+                self.summary[name] += value
+        self.save()
+
+    def page_finished(self, next_token):
+        with self._lock:
+            self.next_token = next_token
+            self.page_done = []
+            self.finished = next_token is None
+        self.save()
+
+
+def scan_pages(selection, start_token):
+    """(items, token of the next page) for every page of matching results"""
+    names, values, parts = {}, {}, []
+    for field in SELECTORS:
+        if selection.get(field):
+            names[f'#{field}'] = field
+            values[f':{field}'] = selection[field]
+            parts.append(f'#{field} = :{field}')
+    kwargs = {'Limit': PAGE_SIZE}
+    if parts:
+        kwargs.update(FilterExpression=' AND '.join(parts), ExpressionAttributeNames=names,
+                      ExpressionAttributeValues=values)
+    start_key = pagination.decode_token(start_token)
+    while True:
+        if start_key:
+            kwargs['ExclusiveStartKey'] = start_key
+        response = aws.table('results').scan(**kwargs)
+        start_key = response.get('LastEvaluatedKey')
+        yield response.get('Items', []), pagination.encode_token(start_key)
+        if not start_key:
+            return
+
+
+def evaluate(answer, question, limiter, retries):
+    """evaluate_answer() with rate limiting and retries; None when every attempt failed"""
+    for attempt in range(retries + 1):
+        if attempt:
+            time.sleep(min(30, 2 ** attempt))
+        limiter.wait()
+        evaluation = submit_quiz.evaluate_answer(answer.get('answer_text', ''), question.get('example_answer', ''),
+                                                 answer.get('pdf_data'), rubrics.current_rubric(question))
+        if evaluation.get('score') != 'Error':
+            return evaluation
+    return None
+
+
+def regrade_result(result, limiter, args):
+    """Re-grade one result; returns (report row, counters)"""
+    counts = dict.fromkeys(COUNTERS, 0)
+    counts['matched'] = 1
+    row = {'result_id': result['result_id'], 'template_id': result.get('template_id'),
+           'student_name': result.get('student_name'), 'old_average': float(result.get('average_score', 0))}
+
+    template = template_cache.get_template(result.get('template_id'))
+    if not template:
+        counts['failed_results'] = 1
+        return dict(row, status='template_missing'), counts
+    if result.get('question_ids'):
+        questions = question_bank.get_questions(list(result['question_ids']), skip_missing=True)
+    else:
+        questions = template.get('questions', [])
+    # Answers go to the question they were written for, wherever it sits in the template now
+    current = {question_bank.stable_id(question): question for question in questions}
+    question_ids = similarity.answer_question_ids(result, live_template=False)
+    previous = {evaluation.get('question_index'): evaluation for evaluation in result.get('evaluations', [])}
+
+    evaluations, changed, structure_changed = [], [], []
+    for answer in result.get('answers', []):
+        # Stored numbers come back from DynamoDB as Decimal
+        index = answer.get('question_index')
+        index = int(index) if isinstance(index, (int, Decimal)) else None
+        old = previous.get(index, {})
+        question = current.get(question_ids.get(index))
+        if question is None:
+            evaluations.append(old)
+            structure_changed.append(index)
+            continue
+        input_hash = submit_quiz.grading_hash(answer, question)
+        if old.get('input_hash') == input_hash and not args.force:
+            evaluations.append(old)
+            continue
+        counts['evaluations'] += 1
+        evaluation = evaluate(answer, question, limiter, args.retries)
+        if evaluation is None:
+            counts['failed_evaluations'] += 1
+            evaluations.append(old)
+            continue
+        evaluations.append({
+            'question_index': index,
+            'score': evaluation.get('score'),
+            'evaluation': evaluation.get('evaluation'),
+            'justification': evaluation.get('justification'),
+            'suggessions': evaluation.get('suggessions'),
+            'user_answer': old.get('user_answer') or answer.get('answer_text')
+                           or f"PDF: {answer.get('pdf_filename', 'uploaded')}",
+            'input_hash': input_hash,
+        })
+        if str(old.get('score')) != str(evaluation.get('score')):
+            changed.append({'question_index': index, 'old_score': old.get('score'),
+                            'new_score': evaluation.get('score')})
+
+    counts['structure_changed'] = len(structure_changed)
+    if structure_changed:
+        row['structure_changed'] = structure_changed
+    if not counts['evaluations']:
+        counts['unchanged'] = 1
+        return dict(row, status='structure_changed' if structure_changed else 'unchanged'), counts
+
+    total_questions = int(result.get('total_questions') or len(questions))
+    total_score = sum(submit_quiz.score_value(evaluation.get('score', '0')) for evaluation in evaluations)
+    new_average = (total_score / total_questions) if total_questions > 0 else 0.0
+    delta = new_average - row['old_average']
+    row.update(new_average=round(new_average, 2), delta=round(delta, 2), changed_questions=changed)
+
+    if not args.dry_run:
+        now = datetime.utcnow().isoformat()
+        values = {':evaluations': evaluations, ':average': Decimal(str(new_average)), ':now': now}
+        update = 'SET evaluations = :evaluations, average_score = :average, regraded_at = :now, updated_at = :now'
+        # A result with unmatched answers was not fully graded against this version
+        if template.get('version') is not None and not structure_changed:
+            update += ', template_version = :version'
+            values[':version'] = int(template['version'])
+        if result.get('updated_at'):
+            condition = 'updated_at = :seen'
+            values[':seen'] = result['updated_at']
+        else:
+            condition = 'attribute_not_exists(updated_at)'
+        try:
+            aws.table('results').update_item(Key={'result_id': result['result_id']}, UpdateExpression=update,
+                                             ConditionExpression=condition, ExpressionAttributeValues=values)
+        except Exception as e:
+            if aws.error_code(e) != 'ConditionalCheckFailedException':
+                raise
+            counts['conflicts'] = 1
+            return dict(row, status='conflict'), counts
+
+    counts['updated'] = 1
+    if delta > 0:
+        counts['raised'] = 1
+    elif delta < 0:
+        counts['lowered'] = 1
+    counts['total_abs_delta'] = abs(delta)
+    return dict(row, status='dry_run' if args.dry_run else 'updated'), counts
+
+
+def run(selection, args):
+    checkpoint = Checkpoint(args.checkpoint, selection)
+    if not args.restart:
+        checkpoint = Checkpoint.load(args.checkpoint, selection)
+    if checkpoint.finished:
+        print(f'{args.checkpoint} records a finished run; pass --restart to run again')
+        return checkpoint.summary
+
+    limiter = RateLimiter(args.rate)
+    report_lock = threading.Lock()
+    with open(args.report, 'a') as report, ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        def process(result):
+            row, counts = regrade_result(result, limiter, args)
+            with report_lock:
+                report.write(serialization.dumps(row, compact=True) + '\n')
+                report.flush()
+            checkpoint.result_done(result['result_id'], counts)
+
+        for items, next_token in scan_pages(selection, checkpoint.next_token):
+            done = set(checkpoint.page_done)
+            for future in [pool.submit(process, item) for item in items if item['result_id'] not in done]:
+                future.result()
+            checkpoint.page_finished(next_token)
+    return checkpoint.summary
+
+
+def print_summary(summary, elapsed, dry_run):
+    updated = summary['updated']
+    print(f"matched {summary['matched']}, {'would update' if dry_run else 'updated'} {updated}, unchanged {summary['unchanged']}, "
+          f"conflicts {summary['conflicts']}, failed results {summary['failed_results']}")
+    print(f"evaluator calls {summary['evaluations']}, failed evaluations {summary['failed_evaluations']}, "
+          f"{summary['evaluations'] / elapsed:.2f} calls/s this run")
+    if summary['structure_changed']:
+        print(f"answers skipped because their question changed or was removed: {summary['structure_changed']}")
+    if updated:
+        print(f"average score raised for {summary['raised']}, lowered for {summary['lowered']}, "
+              f"mean absolute change {summary['total_abs_delta'] / updated:.2f} points")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    for field in SELECTORS:
+        parser.add_argument(f"--{field.replace('_', '-')}", dest=field)
+    parser.add_argument('--all', action='store_true', help='re-grade every result')
+    parser.add_argument('--rate', type=float, default=5, help='evaluator calls per second (0: unlimited)')
+    parser.add_argument('--concurrency', type=int, default=4, help='results graded at once')
+    parser.add_argument('--retries', type=int, default=2, help='retries of a failed evaluation')
+    parser.add_argument('--force', action='store_true', help='re-grade answers whose inputs have not changed')
+    parser.add_argument('--dry-run', action='store_true', help='grade and report, but do not update results')
+    parser.add_argument('--checkpoint', help='progress file (default: regrade-<selection>.checkpoint.json)')
+    parser.add_argument('--report', help='JSON lines report (default: regrade-<selection>.report.jsonl)')
+    parser.add_argument('--restart', action='store_true', help='start over instead of resuming')
+    args = parser.parse_args()
+
+    selection = {field: getattr(args, field) for field in SELECTORS if getattr(args, field)}
+    if not selection and not args.all:
+        parser.error('select results with --template-id, --course, --subject or --student-name, or pass --all')
+    name = '-'.join(f'{field}-{value}' for field, value in sorted(selection.items())) or 'all'
+    name = ''.join(c if c.isalnum() or c in '-_.' else '_' for c in name) + ('-dry-run' if args.dry_run else '')
+    args.checkpoint = args.checkpoint or f'regrade-{name}.checkpoint.json'
+    args.report = args.report or f'regrade-{name}.report.jsonl'
+    if args.restart and os.path.exists(args.report):
+        os.remove(args.report)
+
+    started = time.monotonic()
+    summary = run(selection, args)
+    print_summary(summary, max(time.monotonic() - started, 1e-9), args.dry_run)
+    print(f'report: {args.report}')
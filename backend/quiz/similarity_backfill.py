@@ -0,0 +1,104 @@
+"""
+Index stored quiz results for answer-similarity detection.
+
+    python quiz/similarity_backfill.py --all                     # every result
+    python quiz/similarity_backfill.py --template-id <id>
+    python quiz/similarity_backfill.py --course CS101 --concurrency 8
+    python quiz/similarity_backfill.py --all --restart           # ignore an existing checkpoint
+
+submit_quiz indexes each result as it is saved (see shared/similarity.py).
+This indexes results saved before that, or whose index write failed. Answers
+saved before they carried a question_id are matched to their question through
+the result's bank questions or template version. Results
+are scanned page by page and indexed on --concurrency threads. Indexing is
+idempotent, so re-running over indexed results is safe. It also marks buckets
+whose collision was missed when two answers first landed in them at the same
+moment. The scan position is checkpointed after every page, and an interrupted
+run resumes from the last finished page.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from shared import similarity
+from regrade import SELECTORS, scan_pages
+
+
+def load_checkpoint(path, selection):
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        saved = json.load(f)
+    if saved['selection'] != selection:
+        raise SystemExit(f'{path} belongs to a run with a different selection; pass --restart to replace it')
+    return saved
+
+
+def save_checkpoint(path, state):
+    temporary = path + '.tmp'
+    with open(temporary, 'w') as f:
+        json.dump(state, f)
+    os.replace(temporary, path)
+
+
+def index_result(result):
+    """Answers indexed for one result; 0 when it has none to compare"""
+    if not result.get('template_id'):
+        return 0
+    question_ids = similarity.answer_question_ids(result)
+    answers = [dict(answer, question_id=question_ids.get(int(answer.get('question_index', 0))))
+               for answer in result.get('answers', [])]
+    return similarity.index_answers(result['template_id'], result['result_id'], answers,
+                                    result.get('student_name', ''))
+
+
+def run(selection, args):
+    state = None if args.restart else load_checkpoint(args.checkpoint, selection)
+    state = state or {'selection': selection, 'next_token': None, 'finished': False,
+                      'summary': {'results': 0, 'answers': 0, 'failed': 0}}
+    if state['finished']:
+        print(f'{args.checkpoint} records a finished run; pass --restart to run again')
+        return state['summary']
+
+    summary = state['summary']
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        for items, next_token in scan_pages(selection, state['next_token']):
+            for item, future in [(item, pool.submit(index_result, item)) for item in items]:
+                try:
+                    summary['answers'] += future.result()
+                except Exception as e:
+                    print(f"Error indexing {item['result_id']}: {e}")
+                    summary['failed'] += 1
+                summary['results'] += 1
+            state.update(next_token=next_token, finished=next_token is None)
+            save_checkpoint(args.checkpoint, state)
+    return summary
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    for field in SELECTORS:
+        parser.add_argument(f"--{field.replace('_', '-')}", dest=field)
+    parser.add_argument('--all', action='store_true', help='index every result')
+    parser.add_argument('--concurrency', type=int, default=4, help='results indexed at once')
+    parser.add_argument('--checkpoint', help='progress file (default: similarity-<selection>.checkpoint.json)')
+    parser.add_argument('--restart', action='store_true', help='start over instead of resuming')
+    args = parser.parse_args()
+
+    selection = {field: getattr(args, field) for field in SELECTORS if getattr(args, field)}
+    if not selection and not args.all:
+        parser.error('select results with --template-id, --course, --subject or --student-name, or pass --all')
+    name = '-'.join(f'{field}-{value}' for field, value in sorted(selection.items())) or 'all'
+    name = ''.join(c if c.isalnum() or c in '-_.' else '_' for c in name)
+    args.checkpoint = args.checkpoint or f'similarity-{name}.checkpoint.json'
+
+    started = time.monotonic()
+    summary = run(selection, args)
+    elapsed = max(time.monotonic() - started, 1e-9)
+    print(f"results {summary['results']}, answers indexed {summary['answers']}, failed {summary['failed']}, "
+          f"{summary['results'] / elapsed:.1f} results/s this run")
@@ -1,58 +1,73 @@
 import json
-import boto3
+import os
 from datetime import datetime
-from typing import Dict, Optional
 from decimal import Decimal
 import uuid
+import hashlib
+from shared import auth
+from shared import aws
+from shared import metrics
+from shared import profiling
+from shared import question_bank
+from shared import quiz_sessions
+from shared import rubrics
+from shared import serialization
+from shared import similarity
+from shared import template_cache
 
-# DynamoDB and Lambda setup
-dynamodb = boto3.resource('dynamodb')
-lambda_client = boto3.client('lambda')
+# Bump when the evaluator's model or prompt changes, so regrade.py re-grades every answer
+GRADER_VERSION = os.environ.get('GRADER_VERSION', '1')
 
-# Helper function to convert float to Decimal for DynamoDB
-def convert_to_decimal(obj):
-    if isinstance(obj, list):
-        return [convert_to_decimal(i) for i in obj]
-    elif isinstance(obj, dict):
-        return {k: convert_to_decimal(v) for k, v in obj.items()}
-    elif isinstance(obj, float):
-        return Decimal(str(obj))
-    else:
-        return obj
+def grading_hash(answer, question):
+    """Short hash of everything a grade depends on: answer, PDF, example answer, rubric and grader version"""
+    pdf_data = answer.get('pdf_data')
+    inputs = [
+        GRADER_VERSION,
+        answer.get('answer_text', ''),
+        hashlib.sha256(pdf_data.encode('utf-8')).hexdigest() if pdf_data else '',
+        (question.get('example_answer') or '').strip(),
+        rubrics.current_rubric(question) or [],
+    ]
+    return hashlib.sha256(json.dumps(inputs).encode('utf-8')).hexdigest()[:16]
 
-# Database Models
-class Template:
-    def __init__(self):
-        table_name = 'msc-evaluate-templates-dev'
-        self.table = dynamodb.Table(table_name)
-    
-    def get_item(self, key):
-        response = self.table.get_item(Key=key)
-        return response.get('Item')
+def score_value(score):
+    """Numeric value of an evaluator score such as '85'; 0 when it has no digits"""
+    try:
+        return float(''.join(filter(lambda x: x.isdigit() or x == '.', str(score))))
+    except:
+        return 0.0
 
+# Database Models
 class QuizResult:
     def __init__(self):
-        table_name = 'msc-evaluate-quiz-results-dev'
-        self.table = dynamodb.Table(table_name)
+        self.table = aws.table('results')
     
-    def save_result(self, template_id, session_id, student_name, course, subject, title, answers, evaluations, average_score, total_questions):
+    def save_result(self, template_id, session_id, user_id, student_name, course, subject, title, answers, evaluations, average_score, total_questions, question_ids=None, template_version=None):
         result_id = str(uuid.uuid4())
         result = {
             'result_id': result_id,
             'session_id': session_id,
             'template_id': template_id,
+            'user_id': user_id,
             'student_name': student_name,
             'course': course,
             'subject': subject,
             'title': title,
-            'answers': convert_to_decimal(answers),
-            'evaluations': convert_to_decimal(evaluations),
+            # Parsed with serialization.loads, so numbers are already Decimal
+            'answers': answers,
+            'evaluations': evaluations,
             'average_score': Decimal(str(average_score)),
             'total_questions': total_questions,
             'completed_at': datetime.utcnow().isoformat(),
             'created_at': datetime.utcnow().isoformat(),
             'updated_at': datetime.utcnow().isoformat()
         }
+        # The template version the answers were graded against, for history views
+        if template_version is not None:
+            result['template_version'] = int(template_version)
+        # Sampled quizzes record which bank questions this student answered
+        if question_ids:
+            result['question_ids'] = list(question_ids)
         self.table.put_item(Item=result)
         return result
     
@@ -68,7 +83,7 @@ def get_cors_headers():
         'Access-Control-Allow-Methods': 'GET,POST,PUT,DELETE,OPTIONS'
     }
 
-def evaluate_answer(user_answer, example_answer, pdf_data=None):
+def evaluate_answer(user_answer, example_answer, pdf_data=None, rubric=None):
     """Call MSC_Evaluate Lambda to evaluate an answer"""
     try:
         # If no example answer provided, return a default evaluation
@@ -88,20 +103,26 @@ def evaluate_answer(user_answer, example_answer, pdf_data=None):
         if pdf_data:
             payload['pdf_data'] = pdf_data
         
-        response = lambda_client.invoke(
-            FunctionName='msc-evaluate-function-dev',
-            InvocationType='RequestResponse',
-            Payload=json.dumps(payload)
-        )
+        # Grade against the cached key-point rubric instead of the full prose when available
+        if rubric:
+            payload['rubric'] = rubric
         
-        response_payload = json.loads(response['Payload'].read())
+        # Evaluator calls stream for a while, so allow a longer read timeout than table calls
+        metrics.count('evaluations')
+        with metrics.phase('evaluation'):
+            response = aws.client('lambda', read_timeout=300).invoke(
+                FunctionName=aws.function_name('evaluate'),
+                InvocationType='RequestResponse',
+                Payload=json.dumps(payload)
+            )
+            response_payload = json.loads(response['Payload'].read())
         
         if response_payload.get('statusCode') == 200:
             # Parse the evaluation response
             evaluation_text = response_payload.get('body', '{}')
             try:
                 # Try to parse as JSON
-                evaluation = json.loads(evaluation_text)
+                evaluation = serialization.loads(evaluation_text)
             except:
                 # If not JSON, return as text
                 evaluation = {
@@ -127,6 +148,93 @@ def evaluate_answer(user_answer, example_answer, pdf_data=None):
             'suggessions': ''
         }
 
+def grade_answers(answers, questions):
+    """Evaluate each answer with MSC_Evaluate; returns (evaluations, average_score)"""
+    evaluations = []
+    total_score = 0
+    
+    for answer in answers:
+        # The handler has checked that the answers cover exactly range(len(questions))
+        question_index = answer.get('question_index')
+        answer_text = answer.get('answer_text', '')
+        question = questions[question_index]
+        
+        # Call MSC_Evaluate to get evaluation
+        evaluation = evaluate_answer(answer_text, question.get('example_answer', ''), answer.get('pdf_data'),
+                                     rubrics.current_rubric(question))
+        
+        total_score += score_value(evaluation.get('score', '0'))
+        
+        evaluations.append({
+            'question_index': question_index,
+            'score': evaluation.get('score'),
+            'evaluation': evaluation.get('evaluation'),
+            'justification': evaluation.get('justification'),
+            'suggessions': evaluation.get('suggessions'),
+            'user_answer': answer_text if answer_text else f"PDF: {answer.get('pdf_filename', 'uploaded')}",
+            'input_hash': grading_hash(answer, question)
+        })
+    
+    # Calculate average score
+    average_score = (total_score / len(questions)) if questions else 0.0
+    return evaluations, average_score
+
+def save_answer(event, claims):
+    """POST /submit/answer - Store a single answer on the caller's paged quiz session"""
+    try:
+        body = serialization.loads(event['body'])
+        session_id = body.get('session_id')
+        question_index = body.get('question_index')
+        answer_text = body.get('answer_text', '')
+        
+        if not session_id or not isinstance(question_index, int):
+            return {
+                'statusCode': 400,
+                'headers': get_cors_headers(),
+                'body': json.dumps({'error': 'session_id and an integer question_index are required'})
+            }
+        
+        if body.get('pdf_data'):
+            return {
+                'statusCode': 400,
+                'headers': get_cors_headers(),
+                'body': json.dumps({'error': 'PDF answers must be sent with the final submit'})
+            }
+        
+        quiz_sessions.save_answer(session_id, claims['sub'], question_index, answer_text)
+        
+        return {
+            'statusCode': 200,
+            'headers': get_cors_headers(),
+            'body': json.dumps({
+                'message': 'Answer saved',
+                'session_id': session_id,
+                'question_index': question_index
+            })
+        }
+    
+    except quiz_sessions.SessionError as e:
+        return {
+            'statusCode': e.status_code,
+            'headers': get_cors_headers(),
+            'body': json.dumps({'error': e.message})
+        }
+    except json.JSONDecodeError:
+        return {
+            'statusCode': 400,
+            'headers': get_cors_headers(),
+            'body': json.dumps({'error': 'Invalid JSON in request body'})
+        }
+    except Exception as e:
+        print(f"Save answer error: {str(e)}")
+        return {
+            'statusCode': 500,
+            'headers': get_cors_headers(),
+            'body': json.dumps({'error': f'Internal server error: {str(e)}'})
+        }
+
+@metrics.instrument('submit_quiz')
+@profiling.profiled('submit_quiz')
 def lambda_handler(event, context):
     # Handle OPTIONS request for CORS preflight
     if event.get('httpMethod') == 'OPTIONS':
@@ -136,13 +244,46 @@ def lambda_handler(event, context):
             'body': ''
         }
     
+    # Every request needs a valid session token; it is verified locally, without a database read
     try:
-        body = json.loads(event['body'])
+        claims = auth.authenticate(event)
+    except auth.AuthError as e:
+        return {
+            'statusCode': e.status_code,
+            'headers': get_cors_headers(),
+            'body': json.dumps({'error': e.message})
+        }
+    
+    # Question-level answers for paged quizzes
+    if event.get('path', '').rstrip('/').endswith('/answer'):
+        return save_answer(event, claims)
+    
+    try:
+        body = serialization.loads(event['body'])
         template_id = body.get('template_id')
         session_id = body.get('session_id')
-        student_name = body.get('student_name', 'Anonymous')
+        # Results are filed under the signed-in user, never a name from the request
+        student_name = auth.display_name(claims)
         answers = body.get('answers', [])  # List of {question_index, answer_text, pdf_data, pdf_filename}
         
+        # Paged sessions already hold most answers; anything in the body (e.g. PDFs) takes precedence
+        session = quiz_sessions.get_session(session_id, consistent=True) if session_id else None
+        if session:
+            quiz_sessions.check_owner(session, claims['sub'])
+            if not quiz_sessions.submission_open(session):
+                return {
+                    'statusCode': 409,
+                    'headers': get_cors_headers(),
+                    'body': json.dumps({'error': 'Session has already been submitted'})
+                }
+            template_id = template_id or session['template_id']
+            submitted_indices = {answer.get('question_index') for answer in answers}
+            answers = [
+                answer for answer in quiz_sessions.session_answers(session)
+                if answer['question_index'] not in submitted_indices
+            ] + answers
+            answers.sort(key=lambda answer: answer.get('question_index', 0))
+        
         # Validate required fields
         if not template_id:
             return {
@@ -170,8 +311,8 @@ def lambda_handler(event, context):
             session_id = str(uuid.uuid4())
         
         # Get template to access example answers
-        template_model = Template()
-        template = template_model.get_item({'template_id': template_id})
+        with metrics.phase('template_fetch'):
+            template = template_cache.get_template(template_id)
         
         if not template:
             return {
@@ -180,7 +321,14 @@ def lambda_handler(event, context):
                 'body': json.dumps({'error': 'Template not found'})
             }
         
-        questions = template.get('questions', [])
+        if template.get('sampling') and not session:
+            return {
+                'statusCode': 400,
+                'headers': get_cors_headers(),
+                'body': json.dumps({'error': 'Sampled quizzes must be submitted with the session_id from GET /templates/{template_id}/quiz'})
+            }
+        
+        questions = question_bank.session_questions(template, session)
         total_questions = len(questions)
         course = template.get('course', 'Unknown')
         subject = template.get('subject', 'Unknown')
@@ -201,69 +349,55 @@ def lambda_handler(event, context):
                 })
             }
         
-        # Evaluate each answer using MSC_Evaluate Lambda
-        evaluations = []
-        total_score = 0
-        
+        # Similarity clusters group answers by question, wherever the question sat in this quiz
         for answer in answers:
-            question_index = answer.get('question_index')
-            answer_text = answer.get('answer_text', '')
-            pdf_data = answer.get('pdf_data')
-            
-            if question_index < 0 or question_index >= total_questions:
-                return {
-                    'statusCode': 400,
-                    'headers': get_cors_headers(),
-                    'body': json.dumps({'error': f'Invalid question_index: {question_index}'})
-                }
-            
-            question = questions[question_index]
-            example_answer = question.get('example_answer', '')
-            
-            # Call MSC_Evaluate to get evaluation
-            evaluation = evaluate_answer(answer_text, example_answer, pdf_data)
-            
-            # Extract numeric score
-            score_str = evaluation.get('score', '0')
-            try:
-                # Try to extract number from score string
-                score_value = float(''.join(filter(lambda x: x.isdigit() or x == '.', str(score_str))))
-            except:
-                score_value = 0.0
-            
-            total_score += score_value
-            
-            evaluations.append({
-                'question_index': question_index,
-                'score': evaluation.get('score'),
-                'evaluation': evaluation.get('evaluation'),
-                'justification': evaluation.get('justification'),
-                'suggessions': evaluation.get('suggessions'),
-                'user_answer': answer_text if answer_text else f"PDF: {answer.get('pdf_filename', 'uploaded')}"
-            })
+            answer['question_id'] = question_bank.stable_id(questions[answer['question_index']])
         
-        # Calculate average score
-        average_score = (total_score / total_questions) if total_questions > 0 else 0.0
+        # Claim the session before any evaluator call, so a concurrent submit of the same
+        # session gets a 409 instead of grading and saving a second result
+        claim_id = quiz_sessions.claim_submission(session_id) if session else None
         
-        # Save results to database
-        quiz_result_model = QuizResult()
-        result = quiz_result_model.save_result(
-            session_id=session_id,
-            template_id=template_id,
-            student_name=student_name.strip(),
-            course=course,
-            subject=subject,
-            title=title,
-            answers=answers,
-            evaluations=evaluations,
-            average_score=average_score,
-            total_questions=total_questions
-        )
+        try:
+            evaluations, average_score = grade_answers(answers, questions)
+            
+            # Save results to database
+            with metrics.phase('persistence'):
+                result = QuizResult().save_result(
+                    session_id=session_id,
+                    template_id=template_id,
+                    user_id=claims['sub'],
+                    student_name=student_name.strip(),
+                    course=course,
+                    subject=subject,
+                    title=title,
+                    answers=answers,
+                    evaluations=evaluations,
+                    average_score=average_score,
+                    total_questions=total_questions,
+                    question_ids=session.get('question_ids') if session else None,
+                    template_version=template.get('version')
+                )
+        except Exception:
+            # Nothing was saved; reopen the session so the student can submit again
+            if claim_id:
+                quiz_sessions.release_submission(session_id, claim_id)
+            raise
         
+        if claim_id:
+            with metrics.phase('persistence'):
+                quiz_sessions.mark_submitted(session_id, claim_id, result['result_id'])
+        
+        # The result is already saved; a failed index write is repaired by quiz/similarity_backfill.py
+        with metrics.phase('similarity'):
+            try:
+                similarity.index_answers(template_id, result['result_id'], answers, result['student_name'])
+            except Exception as e:
+                print(f"Similarity index error for {result['result_id']}: {str(e)}")
+
         return {
             'statusCode': 200,
             'headers': get_cors_headers(),
-            'body': json.dumps({
+            'body': serialization.dumps({
                 'result_id': result['result_id'],
                 'session_id': session_id,
                 'average_score': float(average_score),
@@ -272,6 +406,12 @@ def lambda_handler(event, context):
             })
         }
         
+    except quiz_sessions.SessionError as e:
+        return {
+            'statusCode': e.status_code,
+            'headers': get_cors_headers(),
+            'body': json.dumps({'error': e.message})
+        }
     except json.JSONDecodeError as e:
         print(f"JSON decode error: {str(e)}")
         return {
@@ -1,30 +1,82 @@
 import json
-import boto3
-import uuid
-from datetime import datetime
-from typing import Dict, Optional
+import os
+from shared import auth
+from shared import metrics
+from shared import profiling
+from shared import question_bank
+from shared import quiz_sessions
+from shared import quiz_view
+from shared import serialization
+from shared import template_cache
 
-# DynamoDB setup
-dynamodb = boto3.resource('dynamodb')
-
-# Database Models
-class Template:
-    def __init__(self):
-        table_name = 'msc-evaluate-templates-dev'
-        self.table = dynamodb.Table(table_name)
-    
-    def get_item(self, key):
-        response = self.table.get_item(Key=key)
-        return response.get('Item')
+# Browsers may reuse the quiz for this long before revalidating; it is private to the signed-in caller
+QUIZ_CACHE_MAX_AGE = int(os.environ.get('QUIZ_CACHE_MAX_AGE', '60'))
 
 def get_cors_headers():
     return {
         'Content-Type': 'application/json',
         'Access-Control-Allow-Origin': '*',
-        'Access-Control-Allow-Headers': 'Content-Type,X-Amz-Date,Authorization,X-Api-Key,X-Amz-Security-Token',
-        'Access-Control-Allow-Methods': 'GET,POST,PUT,DELETE,OPTIONS'
+        'Access-Control-Allow-Headers': 'Content-Type,X-Amz-Date,Authorization,X-Api-Key,X-Amz-Security-Token,If-None-Match',
+        'Access-Control-Allow-Methods': 'GET,POST,PUT,DELETE,OPTIONS',
+        'Access-Control-Expose-Headers': 'ETag'
     }
 
+def get_cache_headers(etag):
+    headers = get_cors_headers()
+    headers['ETag'] = etag
+    headers['Cache-Control'] = f'private, max-age={QUIZ_CACHE_MAX_AGE}, must-revalidate'
+    headers['Vary'] = 'Authorization'
+    return headers
+
+def get_header(event, name):
+    """Case-insensitive request header lookup"""
+    headers = event.get('headers') or {}
+    name = name.lower()
+    for key, value in headers.items():
+        if key.lower() == name:
+            return value
+    return None
+
+def get_quiz_page(template, query_params, claims):
+    """One page of the caller's session, creating the session on the first request"""
+    session_id = query_params.get('session_id')
+    if session_id:
+        session = quiz_sessions.get_session(session_id)
+        if not session or session['template_id'] != template['template_id']:
+            raise quiz_sessions.SessionError(404, 'Session not found')
+        quiz_sessions.check_owner(session, claims['sub'])
+    else:
+        session = quiz_sessions.create_session(template, claims['sub'], student_name=auth.display_name(claims))
+    
+    questions = question_bank.session_questions(template, session)
+    order = [int(i) for i in session['question_order']]
+    page, page_size, total_pages, start, end = quiz_sessions.page_bounds(
+        query_params.get('page'), query_params.get('page_size'), len(order)
+    )
+    
+    page_questions = []
+    for question_index in order[start:end]:
+        question = quiz_view.sanitize_question(questions[question_index])
+        question['question_index'] = question_index
+        page_questions.append(question)
+    
+    return {
+        'template_id': template['template_id'],
+        'title': template['title'],
+        'subject': template['subject'],
+        'course': template['course'],
+        'session_id': session['session_id'],
+        'page': page,
+        'page_size': page_size,
+        'total_pages': total_pages,
+        'total_questions': len(order),
+        'questions': page_questions,
+        'time_limit': template.get('time_limit', quiz_view.DEFAULT_TIME_LIMIT),
+        'instructions': template.get('instructions', quiz_view.DEFAULT_INSTRUCTIONS)
+    }
+
+@metrics.instrument('take_quiz')
+@profiling.profiled('take_quiz')
 def lambda_handler(event, context):
     # Handle OPTIONS request for CORS preflight
     if event.get('httpMethod') == 'OPTIONS':
@@ -34,13 +86,31 @@ def lambda_handler(event, context):
             'body': ''
         }
     
+    # Every request needs a valid session token; it is verified locally, without a database read
+    try:
+        claims = auth.authenticate(event)
+    except auth.AuthError as e:
+        return {
+            'statusCode': e.status_code,
+            'headers': get_cors_headers(),
+            'body': json.dumps({'error': e.message})
+        }
+    
     try:
-        # Get template ID from path parameters
-        template_id = event['pathParameters']['templateId']
+        # Get template ID from path parameters (/templates/{template_id}/quiz)
+        path_params = event.get('pathParameters') or {}
+        template_id = path_params.get('template_id') or path_params.get('templateId')
         
-        # Get template from database
-        template_model = Template()
-        template = template_model.get_item({'template_id': template_id})
+        if not template_id:
+            return {
+                'statusCode': 400,
+                'headers': get_cors_headers(),
+                'body': json.dumps({'error': 'Template ID is required'})
+            }
+        
+        # Get template (cached per container, revalidated by version)
+        with metrics.phase('template_fetch'):
+            template = template_cache.get_template(template_id)
         if not template:
             return {
                 'statusCode': 404,
@@ -48,31 +118,51 @@ def lambda_handler(event, context):
                 'body': json.dumps({'error': 'Template not found'})
             }
         
-        # Remove correct answers from questions before sending to client
-        questions_without_answers = []
-        for question in template.get('questions', []):
-            question_copy = {
-                'question_text': question['question_text'],
-                'options': question['options']
-                # Intentionally omit 'correct_answer' field
+        # Paged mode: GET /templates/{template_id}/quiz?page=&page_size=&session_id=
+        # Sampled templates always go through a session because every student gets different questions
+        query_params = event.get('queryStringParameters') or {}
+        if template.get('sampling') or any(query_params.get(param) for param in ('page', 'page_size', 'session_id')):
+            try:
+                with metrics.phase('render'):
+                    quiz_page = get_quiz_page(template, query_params, claims)
+            except quiz_sessions.SessionError as e:
+                return {
+                    'statusCode': e.status_code,
+                    'headers': get_cors_headers(),
+                    'body': json.dumps({'error': e.message})
+                }
+            body = serialization.dumps({'quiz': quiz_page})
+            headers = get_cors_headers()
+            # Pages of an existing session are stable; the request that creates a session is not
+            if query_params.get('session_id'):
+                headers['Cache-Control'] = f'private, max-age={QUIZ_CACHE_MAX_AGE}'
+            else:
+                headers['Cache-Control'] = 'no-store'
+            return {
+                'statusCode': 200,
+                'headers': headers,
+                'body': body
             }
-            questions_without_answers.append(question_copy)
         
-        # Return template data for quiz taking
-        quiz_data = {
-            'template_id': template['template_id'],
-            'title': template['title'],
-            'subject': template['subject'],
-            'course': template['course'],
-            'questions': questions_without_answers,
-            'time_limit': template.get('time_limit', 3600),  # Default 1 hour
-            'instructions': template.get('instructions', 'Answer all questions to the best of your ability.')
-        }
+        # Serve the view precomputed at template write time; older templates are built on the fly
+        body = template.get('quiz_view')
+        etag = template.get('quiz_etag')
+        metrics.cache('quiz_view', bool(body and etag))
+        if not body or not etag:
+            with metrics.phase('render'):
+                body, etag = quiz_view.build_quiz_view(template)
+        
+        if quiz_view.etag_matches(get_header(event, 'If-None-Match'), etag):
+            return {
+                'statusCode': 304,
+                'headers': get_cache_headers(etag),
+                'body': ''
+            }
         
         return {
             'statusCode': 200,
-            'headers': get_cors_headers(),
-            'body': json.dumps({'quiz': quiz_data})
+            'headers': get_cache_headers(etag),
+            'body': body
         }
         
     except Exception as e:
@@ -81,4 +171,4 @@ def lambda_handler(event, context):
             'statusCode': 500,
             'headers': get_cors_headers(),
             'body': json.dumps({'error': 'Internal server error'})
-        }
\ No newline at end of file
+        }
@@ -0,0 +1,6 @@
+"""
+Code shared by every MSC Evaluate Lambda handler.
+
+The deployment scripts copy this package next to each handler file, so handlers
+import it as a top-level package (``from shared import aws``).
+"""
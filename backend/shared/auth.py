@@ -0,0 +1,138 @@
+"""
+Signed, expiring session tokens.
+
+``handle_login`` issues a token and every handler verifies it locally, so an
+authenticated request costs one HMAC and no DynamoDB read. A token is
+``<payload>.<signature>``: the URL-safe base64 of compact JSON claims
+(``sub`` user_id, ``username``, ``name``, ``role``, ``iat``, ``exp``) and of
+their HMAC-SHA256. Handlers take the caller's identity from these claims, never
+from the request body.
+
+The signing key is read once per container from ``SESSION_TOKEN_SECRET``, or
+from the Secrets Manager secret named by ``SESSION_TOKEN_SECRET_ARN``. The
+secret may hold several keys separated by commas: the first signs, all of
+them verify, so keys can be rotated without logging everyone out. Tokens stay
+valid until they expire, so disabling a user takes effect within
+``SESSION_TOKEN_TTL`` seconds.
+"""
+import base64
+import hashlib
+import hmac
+import json
+import os
+import time
+
+from shared import aws
+
+TOKEN_TTL = int(os.environ.get('SESSION_TOKEN_TTL', str(8 * 3600)))
+CLOCK_SKEW = 30
+STAFF_ROLES = ('admin', 'tutor')
+
+# Signing keys, first one signs; loaded on first use
+_keys = None
+
+
+class AuthError(Exception):
+    """A request without a usable session token (401) or with the wrong role (403)"""
+    def __init__(self, status_code, message):
+        super().__init__(message)
+        self.status_code = status_code
+        self.message = message
+
+
+def _b64encode(raw):
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def _b64decode(text):
+    return base64.urlsafe_b64decode(text + '=' * (-len(text) % 4))
+
+
+def signing_keys():
+    """Cached signing keys for this container"""
+    global _keys
+    if _keys is None:
+        secret = os.environ.get('SESSION_TOKEN_SECRET')
+        if not secret and os.environ.get('SESSION_TOKEN_SECRET_ARN'):
+            response = aws.client('secretsmanager').get_secret_value(SecretId=os.environ['SESSION_TOKEN_SECRET_ARN'])
+            secret = response['SecretString']
+        keys = [key.strip().encode('utf-8') for key in (secret or '').split(',') if key.strip()]
+        if not keys:
+            raise RuntimeError('No session token key: set SESSION_TOKEN_SECRET or SESSION_TOKEN_SECRET_ARN')
+        _keys = keys
+    return _keys
+
+
+def reset():
+    """Forget the cached keys, e.g. after rotating the secret"""
+    global _keys
+    _keys = None
+
+
+def _sign(payload, key):
+    return hmac.new(key, payload.encode('ascii'), hashlib.sha256).digest()
+
+
+def issue_token(user, ttl=None, now=None):
+    """Return (token, expires_at) for a user item"""
+    issued_at = int(now if now is not None else time.time())
+    expires_at = issued_at + (ttl or TOKEN_TTL)
+    claims = {
+        'sub': user['user_id'],
+        'username': user['username'],
+        'name': user.get('full_name') or user['username'],
+        'role': user['role'],
+        'iat': issued_at,
+        'exp': expires_at
+    }
+    payload = _b64encode(json.dumps(claims, separators=(',', ':')).encode('utf-8'))
+    return f'{payload}.{_b64encode(_sign(payload, signing_keys()[0]))}', expires_at
+
+
+def verify_token(token, now=None):
+    """Claims of a valid, unexpired token; raises AuthError otherwise"""
+    payload, _, signature = (token or '').partition('.')
+    if not payload or not signature:
+        raise AuthError(401, 'Invalid session token')
+    try:
+        signature = _b64decode(signature)
+    except ValueError:
+        raise AuthError(401, 'Invalid session token')
+    if not any(hmac.compare_digest(_sign(payload, key), signature) for key in signing_keys()):
+        raise AuthError(401, 'Invalid session token')
+
+    try:
+        claims = json.loads(_b64decode(payload))
+    except ValueError:
+        raise AuthError(401, 'Invalid session token')
+    if not isinstance(claims, dict) or not isinstance(claims.get('exp'), int):
+        raise AuthError(401, 'Invalid session token')
+    if claims['exp'] + CLOCK_SKEW < (now if now is not None else time.time()):
+        raise AuthError(401, 'Session expired, please log in again')
+    return claims
+
+
+def bearer_token(event):
+    """Token from the Authorization header of an API Gateway event, or None"""
+    for name, value in (event.get('headers') or {}).items():
+        if name.lower() == 'authorization' and value:
+            scheme, _, token = value.partition(' ')
+            if scheme.lower() == 'bearer' and token.strip():
+                return token.strip()
+    return None
+
+
+def display_name(claims):
+    """Name results are filed under; tokens issued before the name claim carry only the username"""
+    return claims.get('name') or claims.get('username')
+
+
+def authenticate(event, roles=None):
+    """Claims of the request's session token, optionally requiring one of ``roles``"""
+    token = bearer_token(event)
+    if not token:
+        raise AuthError(401, 'Authentication required')
+    claims = verify_token(token)
+    if roles and claims.get('role') not in roles:
+        raise AuthError(403, 'Forbidden: insufficient role')
+    return claims
@@ -0,0 +1,217 @@
+"""
+Per-container AWS clients and DynamoDB tables.
+
+Everything is created on first use and cached for the lifetime of the Lambda
+container, so only the cold invocation pays for building clients and tables.
+Table and function names are resolved from environment variables, falling back
+to the ``msc-evaluate-*-<ENVIRONMENT>`` names created by the CloudFormation stack.
+DynamoDB objects are wrapped in ``metrics.Metered`` so instrumented handlers
+record consumed capacity and call time.
+"""
+import os
+import time
+
+from shared import metrics
+
+ENVIRONMENT = os.environ.get('ENVIRONMENT', 'dev')
+
+# Logical name -> (environment variable, default physical name)
+TABLES = {
+    'users': ('USERS_TABLE', 'msc-evaluate-users-{env}'),
+    'templates': ('TEMPLATES_TABLE', 'msc-evaluate-templates-{env}'),
+    'results': ('RESULTS_TABLE', 'msc-evaluate-quiz-results-{env}'),
+    'sessions': ('SESSIONS_TABLE', 'msc-evaluate-quiz-sessions-{env}'),
+    'questions': ('QUESTION_BANK_TABLE', 'msc-evaluate-question-bank-{env}'),
+    'versions': ('TEMPLATE_VERSIONS_TABLE', 'msc-evaluate-template-versions-{env}'),
+    'question_content': ('QUESTION_CONTENT_TABLE', 'msc-evaluate-question-content-{env}'),
+    'usernames': ('USERNAMES_TABLE', 'msc-evaluate-usernames-{env}'),
+    'similarity': ('SIMILARITY_TABLE', 'msc-evaluate-answer-similarity-{env}'),
+}
+
+FUNCTIONS = {
+    'evaluate': ('EVALUATE_FUNCTION', 'msc-evaluate-function-{env}'),
+}
+
+# Connection pool and keep-alive settings applied to every client
+MAX_POOL_CONNECTIONS = int(os.environ.get('AWS_MAX_POOL_CONNECTIONS', '50'))
+CONNECT_TIMEOUT = int(os.environ.get('AWS_CONNECT_TIMEOUT', '5'))
+READ_TIMEOUT = int(os.environ.get('AWS_READ_TIMEOUT', '30'))
+MAX_ATTEMPTS = int(os.environ.get('AWS_MAX_ATTEMPTS', '3'))
+
+_resources = {}
+_clients = {}
+_tables = {}
+
+# Local stand-ins keyed by service name, see install()
+_stand_ins = {}
+
+# Initialization timing: name -> {'init_ms': float, 'warm_hits': int}
+_timings = {}
+_container_started = time.time()
+
+
+def _record(name, started=None):
+    """Record a cold creation (when started is given) or a warm cache hit"""
+    entry = _timings.setdefault(name, {'init_ms': 0.0, 'warm_hits': 0})
+    metrics.cache('aws_cache', started is None)
+    if started is None:
+        entry['warm_hits'] += 1
+    else:
+        entry['init_ms'] = round((time.perf_counter() - started) * 1000, 3)
+
+
+def _config(**overrides):
+    from botocore.config import Config
+    settings = {
+        'max_pool_connections': MAX_POOL_CONNECTIONS,
+        'tcp_keepalive': True,
+        'connect_timeout': CONNECT_TIMEOUT,
+        'read_timeout': READ_TIMEOUT,
+        'retries': {'max_attempts': MAX_ATTEMPTS, 'mode': 'standard'},
+    }
+    settings.update(overrides)
+    return Config(**settings)
+
+
+def table_name(name):
+    """Physical DynamoDB table name for a logical table name"""
+    env_var, default = TABLES[name]
+    return os.environ.get(env_var) or default.format(env=ENVIRONMENT)
+
+
+def function_name(name):
+    """Physical Lambda function name for a logical function name"""
+    env_var, default = FUNCTIONS[name]
+    return os.environ.get(env_var) or default.format(env=ENVIRONMENT)
+
+
+def resource(service='dynamodb'):
+    """Cached boto3 resource"""
+    key = f'resource:{service}'
+    if service in _resources:
+        _record(key)
+        return _resources[service]
+    started = time.perf_counter()
+    if service in _stand_ins:
+        _resources[service] = _stand_ins[service]
+    else:
+        import boto3
+        _resources[service] = boto3.resource(service, config=_config())
+    if service == 'dynamodb':
+        _resources[service] = metrics.Metered(_resources[service])
+    _record(key, started)
+    return _resources[service]
+
+
+def client(service, region_name=None, **config):
+    """Cached boto3 client; extra keyword arguments override the botocore Config"""
+    key = f'client:{service}:{region_name or ""}'
+    if key in _clients:
+        _record(key)
+        return _clients[key]
+    started = time.perf_counter()
+    if service in _stand_ins:
+        _clients[key] = _stand_ins[service]
+    else:
+        import boto3
+        _clients[key] = boto3.client(service, region_name=region_name, config=_config(**config))
+    _record(key, started)
+    return _clients[key]
+
+
+def table(name):
+    """Cached DynamoDB Table for a logical table name (see TABLES)"""
+    key = f'table:{name}'
+    if name in _tables:
+        _record(key)
+        return _tables[name]
+    dynamodb = resource('dynamodb')
+    started = time.perf_counter()
+    _tables[name] = metrics.Metered(dynamodb.Table(table_name(name)))
+    _record(key, started)
+    return _tables[name]
+
+
+def transact_write(operations):
+    """Run (operation, logical table, params) writes as one DynamoDB transaction
+
+    ``params`` are written as for the Table resource: plain Python values in
+    ``Item``, ``Key`` and ``ExpressionAttributeValues``. They are converted to
+    typed attribute values here, because transactions only exist on the
+    low-level client. Stand-ins installed with install() take plain values.
+    """
+    dynamodb = resource('dynamodb')
+    if 'dynamodb' in _stand_ins:
+        serialize = None
+    else:
+        from boto3.dynamodb.types import TypeSerializer
+        serialize = TypeSerializer().serialize
+
+    items = []
+    for operation, name, params in operations:
+        params = dict(params, TableName=table_name(name))
+        if serialize:
+            for field in ('Item', 'Key', 'ExpressionAttributeValues'):
+                if field in params:
+                    params[field] = {k: serialize(v) for k, v in params[field].items()}
+        items.append({operation: params})
+    return metrics.Metered(dynamodb.meta.client).transact_write_items(TransactItems=items)
+
+
+def error_code(exc):
+    """AWS error code of a botocore ClientError (or compatible stand-in), else None"""
+    response = getattr(exc, 'response', None)
+    if isinstance(response, dict):
+        return response.get('Error', {}).get('Code')
+    return None
+
+
+# DynamoDB rejects items larger than this, attribute names included
+ITEM_MAX_BYTES = 400 * 1024
+
+
+def item_size(item):
+    """Size of an item as DynamoDB counts it against ITEM_MAX_BYTES, to within a few bytes per attribute"""
+    def size(value):
+        if isinstance(value, str):
+            return len(value.encode('utf-8'))
+        if isinstance(value, (bytes, bytearray)):
+            return len(value)
+        if isinstance(value, bool) or value is None:
+            return 1
+        if isinstance(value, dict):
+            return 3 + sum(len(str(k).encode('utf-8')) + size(v) + 1 for k, v in value.items())
+        if isinstance(value, (list, tuple, set, frozenset)):
+            return 3 + sum(size(v) + 1 for v in value)
+        # Numbers are stored as up to 38 significant digits, two per byte
+        return len(str(value)) // 2 + 1
+    return sum(len(name.encode('utf-8')) + size(value) for name, value in item.items())
+
+
+def install(**stand_ins):
+    """Serve local stand-ins instead of boto3 objects, e.g. install(dynamodb=fake, lambda_=fake)
+
+    Used by benchmarks and local servers; a trailing underscore is stripped so
+    reserved words can be passed as service names.
+    """
+    reset()
+    _stand_ins.clear()
+    for service, obj in stand_ins.items():
+        _stand_ins[service.rstrip('_').replace('_', '-')] = obj
+
+
+def reset():
+    """Drop every cached object so the next call behaves like a cold start"""
+    _resources.clear()
+    _clients.clear()
+    _tables.clear()
+    _timings.clear()
+
+
+def init_report():
+    """Cold initialization cost and warm reuse counts for this container"""
+    return {
+        'container_age_s': round(time.time() - _container_started, 3),
+        'cold_init_ms': round(sum(entry['init_ms'] for entry in _timings.values()), 3),
+        'resources': {name: dict(entry) for name, entry in _timings.items()},
+    }
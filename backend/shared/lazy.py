@@ -0,0 +1,39 @@
+"""
+Deferred imports for heavy or optional dependencies.
+
+A handler that only needs a library on some code paths binds it with
+``LazyModule`` at module level; the real import happens on first attribute
+access, so cold starts that never take that path do not pay for it.
+"""
+import importlib
+
+
+class LazyModule:
+    def __init__(self, name, install_hint=None):
+        self._name = name
+        self._install_hint = install_hint
+        self._module = None
+
+    def _load(self):
+        if self._module is None:
+            try:
+                self._module = importlib.import_module(self._name)
+            except ImportError as e:
+                hint = self._install_hint or f'pip install {self._name}'
+                raise ImportError(f"Optional dependency '{self._name}' is not installed ({hint})") from e
+        return self._module
+
+    @property
+    def loaded(self):
+        return self._module is not None
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+
+def optional_import(name):
+    """Import a module if it is installed, otherwise return None"""
+    try:
+        return importlib.import_module(name)
+    except ImportError:
+        return None
@@ -0,0 +1,246 @@
+"""
+Per-request performance metrics, written as CloudWatch Embedded Metric Format.
+
+Wrap a handler with ``@metrics.instrument('submit_quiz')``. While it runs:
+
+- ``with metrics.phase('evaluation'):`` adds the block's wall time to
+  ``evaluation_ms``;
+- ``count``/``record`` add to or set a metric, ``cache`` counts hits and
+  misses, and ``set_property`` attaches a value that is logged but not a
+  metric;
+- DynamoDB tables and the resource from ``shared.aws`` ask for
+  ``ReturnConsumedCapacity='TOTAL'`` and add the units, the number of calls
+  and their wall time.
+
+When the handler returns, one EMF JSON line is printed. CloudWatch Logs turns
+it into metrics in ``METRICS_NAMESPACE`` with Environment and Function
+dimensions, so dashboards and alarms need no code changes. Handlers invoked
+in-process by another one (the evaluator in local runs) get their own record.
+Outside an instrumented handler every call here does nothing.
+
+``capture()`` collects the records in a list instead of printing them, for
+tests, benchmarks and local servers. ``METRICS_ENABLED=0`` turns everything off.
+"""
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+NAMESPACE = os.environ.get('METRICS_NAMESPACE', 'MSCEvaluate')
+ENVIRONMENT = os.environ.get('ENVIRONMENT', 'dev')
+ENABLED = os.environ.get('METRICS_ENABLED', '1') != '0'
+
+# DynamoDB calls that accept ReturnConsumedCapacity
+METERED_CALLS = frozenset(('get_item', 'put_item', 'update_item', 'delete_item', 'query', 'scan',
+                           'batch_get_item', 'batch_write_item', 'transact_write_items'))
+WRITE_CALLS = frozenset(('put_item', 'update_item', 'delete_item', 'batch_write_item', 'transact_write_items'))
+
+_local = threading.local()
+_sink = None
+_cold_start = True
+
+
+class _Request:
+    def __init__(self, function):
+        self.function = function
+        self.values = {}
+        self.units = {}
+        self.properties = {}
+        self.caches = {}
+
+    def add(self, name, value, unit):
+        self.values[name] = self.values.get(name, 0) + value
+        self.units[name] = unit
+
+    def set(self, name, value, unit):
+        self.values[name] = value
+        self.units[name] = unit
+
+
+def _current():
+    stack = getattr(_local, 'stack', None)
+    return stack[-1] if stack else None
+
+
+def count(name, value=1, unit='Count'):
+    """Add ``value`` to a metric of the current request"""
+    request = _current()
+    if request is not None:
+        request.add(name, value, unit)
+
+
+def record(name, value, unit='Milliseconds'):
+    """Set a metric of the current request, replacing any earlier value"""
+    request = _current()
+    if request is not None:
+        request.set(name, value, unit)
+
+
+def set_property(name, value):
+    """Log ``value`` with the current request's record without making it a metric"""
+    request = _current()
+    if request is not None:
+        request.properties[name] = value
+
+
+def cache(name, hit):
+    """Count a cache lookup; the record carries ``<name>_hit_rate`` for the request"""
+    request = _current()
+    if request is not None:
+        hits, lookups = request.caches.get(name, (0, 0))
+        request.caches[name] = (hits + (1 if hit else 0), lookups + 1)
+
+
+@contextmanager
+def phase(name):
+    """Add the wall time of the block to ``<name>_ms``"""
+    request = _current()
+    if request is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        request.add(f'{name}_ms', (time.perf_counter() - started) * 1000, 'Milliseconds')
+
+
+def consumed_capacity(capacity, operation=None):
+    """Add a ConsumedCapacity entry (or list of entries) from an ``operation`` call to the request's DynamoDB totals"""
+    request = _current()
+    if request is None or not capacity:
+        return
+    for entry in capacity if isinstance(capacity, list) else [capacity]:
+        read = float(entry.get('ReadCapacityUnits', 0) or 0)
+        write = float(entry.get('WriteCapacityUnits', 0) or 0)
+        if not read and not write:
+            # ReturnConsumedCapacity=TOTAL reports only CapacityUnits; the operation says which kind they are
+            units = float(entry.get('CapacityUnits', 0) or 0)
+            if operation in WRITE_CALLS:
+                write = units
+            else:
+                read = units
+        request.add('dynamodb_rcu', read, 'Count')
+        request.add('dynamodb_wcu', write, 'Count')
+        tables = request.properties.setdefault('dynamodb_capacity', {})
+        name = entry.get('TableName', 'unknown')
+        tables[name] = round(tables.get(name, 0) + read + write, 2)
+
+
+def _metered_call(operation, method, **kwargs):
+    if _current() is None:
+        return method(**kwargs)
+    kwargs.setdefault('ReturnConsumedCapacity', 'TOTAL')
+    started = time.perf_counter()
+    try:
+        response = method(**kwargs)
+    finally:
+        count('dynamodb_calls')
+        count('dynamodb_ms', (time.perf_counter() - started) * 1000, 'Milliseconds')
+    consumed_capacity(response.get('ConsumedCapacity'), operation)
+    return response
+
+
+class Metered:
+    """A DynamoDB resource, Table or client whose calls report to the current request"""
+
+    def __init__(self, target):
+        self._target = target
+
+    def __getattr__(self, name):
+        attr = getattr(self._target, name)
+        if name in METERED_CALLS:
+            return functools.partial(_metered_call, name, attr)
+        return attr
+
+
+def _emit(record):
+    if _sink is not None:
+        _sink(record)
+    else:
+        print(json.dumps(record, separators=(',', ':')))
+
+
+def set_sink(sink):
+    """Send records to ``sink(record)`` instead of stdout (None restores stdout); returns the old sink"""
+    global _sink
+    previous, _sink = _sink, sink
+    return previous
+
+
+@contextmanager
+def capture():
+    """Collect the records written inside the block in a list"""
+    records = []
+    previous = set_sink(records.append)
+    try:
+        yield records
+    finally:
+        set_sink(previous)
+
+
+def _record(request, event, context):
+    metrics = dict(request.values)
+    units = dict(request.units)
+    for name, (hits, lookups) in request.caches.items():
+        metrics[f'{name}_hit_rate'] = round(100.0 * hits / lookups, 2)
+        units[f'{name}_hit_rate'] = 'Percent'
+        metrics[f'{name}_lookups'] = lookups
+        units[f'{name}_lookups'] = 'Count'
+
+    record = {
+        '_aws': {
+            'Timestamp': int(time.time() * 1000),
+            'CloudWatchMetrics': [{
+                'Namespace': NAMESPACE,
+                'Dimensions': [['Environment', 'Function']],
+                'Metrics': [{'Name': name, 'Unit': units[name]} for name in metrics]
+            }]
+        },
+        'Environment': ENVIRONMENT,
+        'Function': request.function,
+    }
+    if isinstance(event, dict) and event.get('httpMethod'):
+        record['Route'] = f"{event['httpMethod']} {event.get('resource') or event.get('path') or ''}"
+    request_id = getattr(context, 'aws_request_id', None)
+    if request_id:
+        record['RequestId'] = request_id
+    record.update(request.properties)
+    record.update({name: round(value, 3) if isinstance(value, float) else value for name, value in metrics.items()})
+    return record
+
+
+def instrument(function):
+    """Decorator for a lambda_handler: time it and write one EMF record per invocation"""
+    def decorator(handler):
+        @functools.wraps(handler)
+        def wrapper(event, context):
+            global _cold_start
+            if not ENABLED:
+                return handler(event, context)
+            request = _Request(function)
+            request.properties['ColdStart'] = _cold_start
+            _cold_start = False
+            stack = getattr(_local, 'stack', None)
+            if stack is None:
+                stack = _local.stack = []
+            stack.append(request)
+            started = time.perf_counter()
+            response = None
+            try:
+                response = handler(event, context)
+                return response
+            finally:
+                stack.pop()
+                request.set('duration_ms', (time.perf_counter() - started) * 1000, 'Milliseconds')
+                status = response.get('statusCode') if isinstance(response, dict) else None
+                request.properties['StatusCode'] = status
+                request.set('errors', 1 if status is None or status >= 500 else 0, 'Count')
+                try:
+                    _emit(_record(request, event, context))
+                except Exception as e:
+                    print(f"Metrics error: {e}")
+        return wrapper
+    return decorator
@@ -0,0 +1,60 @@
+"""
+Opaque page tokens for list endpoints.
+
+A token is the DynamoDB ``LastEvaluatedKey`` of the previous page encoded as
+URL-safe base64 JSON, so clients pass it back unchanged as ``next_token``.
+"""
+import base64
+import json
+
+from shared import serialization
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+class PageTokenError(ValueError):
+    """A page token or page size that cannot be used"""
+
+
+def encode_token(last_evaluated_key):
+    if not last_evaluated_key:
+        return None
+    raw = serialization.dumps(last_evaluated_key, compact=True, sort_keys=True)
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_token(token):
+    """ExclusiveStartKey for a token, or None for the first page"""
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        key = json.loads(raw)
+    except (ValueError, TypeError):
+        raise PageTokenError('next_token is not valid')
+    if not isinstance(key, dict) or not key:
+        raise PageTokenError('next_token is not valid')
+    return key
+
+
+def page_size(value, default=DEFAULT_PAGE_SIZE, maximum=MAX_PAGE_SIZE):
+    """Validate a ``limit`` query parameter"""
+    if value in (None, ''):
+        return default
+    try:
+        size = int(value)
+    except (TypeError, ValueError):
+        raise PageTokenError('limit must be an integer')
+    if size < 1:
+        raise PageTokenError('limit must be positive')
+    return min(size, maximum)
+
+
+def page_kwargs(query_params, **kwargs):
+    """Add Limit and ExclusiveStartKey from ``limit`` and ``next_token`` query parameters"""
+    kwargs['Limit'] = page_size(query_params.get('limit'))
+    start_key = decode_token(query_params.get('next_token'))
+    if start_key:
+        kwargs['ExclusiveStartKey'] = start_key
+    return kwargs
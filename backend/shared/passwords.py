@@ -0,0 +1,84 @@
+"""
+Salted, memory-hard password hashing with the standard library's scrypt.
+
+Stored values look like ``scrypt$<n>$<r>$<p>$<salt>$<hash>`` (URL-safe base64
+salt and hash). ``pbkdf2_sha256$<iterations>$<salt>$<hash>`` is verified as
+well, and any other value is a legacy plaintext password. ``needs_rehash``
+tells login to replace plaintext, PBKDF2 and scrypt hashes at another cost
+with one at the current cost once the user has proven the password.
+
+The cost comes from ``PASSWORD_SCRYPT_N``/``_R``/``_P``; choose it with
+``users/calibrate_passwords.py`` for the function's memory size. Every hash,
+roster imports included, is made at that cost.
+"""
+import base64
+import hashlib
+import hmac
+import os
+
+SCRYPT_N = int(os.environ.get('PASSWORD_SCRYPT_N', str(2 ** 14)))
+SCRYPT_R = int(os.environ.get('PASSWORD_SCRYPT_R', '8'))
+SCRYPT_P = int(os.environ.get('PASSWORD_SCRYPT_P', '1'))
+SALT_BYTES = 16
+HASH_BYTES = 32
+
+
+def _b64encode(raw):
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def _b64decode(text):
+    return base64.urlsafe_b64decode(text + '=' * (-len(text) % 4))
+
+
+def scrypt_memory(n, r):
+    """Bytes of memory one scrypt hash needs"""
+    return 128 * n * r
+
+
+def _scrypt(password, salt, n, r, p):
+    return hashlib.scrypt(password.encode('utf-8'), salt=salt, n=n, r=r, p=p,
+                          maxmem=2 * scrypt_memory(n, r) + 1024 * 1024, dklen=HASH_BYTES)
+
+
+def hash_password(password, n=None, r=None, p=None):
+    """Stored form of a password, salted and hashed at the current (or given) cost"""
+    n, r, p = n or SCRYPT_N, r or SCRYPT_R, p or SCRYPT_P
+    salt = os.urandom(SALT_BYTES)
+    return f'scrypt${n}${r}${p}${_b64encode(salt)}${_b64encode(_scrypt(password, salt, n, r, p))}'
+
+
+def _parse(stored):
+    """(algorithm, params, salt, hash) of a stored hash, or None for plaintext"""
+    parts = (stored or '').split('$')
+    try:
+        if parts[0] == 'scrypt' and len(parts) == 6:
+            return 'scrypt', tuple(int(value) for value in parts[1:4]), _b64decode(parts[4]), _b64decode(parts[5])
+        if parts[0] == 'pbkdf2_sha256' and len(parts) == 4:
+            return 'pbkdf2_sha256', (int(parts[1]),), _b64decode(parts[2]), _b64decode(parts[3])
+    except ValueError:
+        return None
+    return None
+
+
+def verify_password(password, stored):
+    """True if ``password`` matches a stored hash or legacy plaintext value"""
+    if not password or not stored:
+        return False
+    parsed = _parse(stored)
+    if parsed is None:
+        return hmac.compare_digest(password.encode('utf-8'), stored.encode('utf-8'))
+    algorithm, params, salt, expected = parsed
+    if algorithm == 'scrypt':
+        actual = _scrypt(password, salt, *params)
+    else:
+        actual = hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'), salt, params[0], dklen=len(expected))
+    return hmac.compare_digest(actual, expected)
+
+
+def needs_rehash(stored):
+    """True for plaintext, PBKDF2 and scrypt hashes at another cost than the current one"""
+    parsed = _parse(stored)
+    if parsed is None or parsed[0] != 'scrypt':
+        return True
+    return parsed[1] != (SCRYPT_N, SCRYPT_R, SCRYPT_P)
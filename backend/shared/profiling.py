@@ -0,0 +1,266 @@
+"""
+Opt-in profiling of single handler invocations.
+
+Decorate a handler with ``@profiling.profiled('get_results')``, inside
+``metrics.instrument``. An invocation is profiled when one of these is true:
+
+- it is picked at random with probability ``PROFILE_SAMPLE_RATE`` (0 to 1);
+- it carries an ``X-Profile`` header and ``PROFILE_ALLOW_HEADER=1`` is set.
+  The header value chooses the modes, for example ``X-Profile: cpu,memory``.
+
+At most one invocation per ``PROFILE_MIN_INTERVAL_S`` seconds is profiled in
+each container, which bounds the cost when the sample rate or the header is
+abused. Modes (``PROFILE_MODES`` is the default):
+
+- ``cpu``: cProfile; the top ``PROFILE_TOP`` functions by cumulative time;
+- ``stacks``: a background thread samples the handler's stack every
+  ``PROFILE_INTERVAL_MS`` and reports collapsed stacks (``a;b;c count``,
+  the input of flamegraph.pl and speedscope);
+- ``memory``: tracemalloc; the peak and the top allocation sites.
+
+Results go to the log as one ``{"profile": ...}`` JSON line. If
+``PROFILE_OUTPUT`` names a directory, they go to files there instead (on
+Lambda only ``/tmp`` is writable), with a ``.pstats`` dump for cpu mode.
+Profiled invocations carry a ``profiled`` property in their metrics record,
+so their durations can be told apart. When an invocation is not profiled, the
+wrapper costs one flag check, plus one random number when sampling is on.
+benchmarks/profiling_overhead.py measures it.
+"""
+import functools
+import json
+import os
+import random
+import sys
+import threading
+import time
+
+from shared import metrics
+from shared.lazy import LazyModule
+
+# Only loaded when an invocation is profiled, so cold starts do not pay for them
+cProfile = LazyModule('cProfile')
+pstats = LazyModule('pstats')
+tracemalloc = LazyModule('tracemalloc')
+
+SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', '0'))
+ALLOW_HEADER = os.environ.get('PROFILE_ALLOW_HEADER', '0') == '1'
+MIN_INTERVAL_S = float(os.environ.get('PROFILE_MIN_INTERVAL_S', '10'))
+DEFAULT_MODES = os.environ.get('PROFILE_MODES', 'cpu')
+TOP = int(os.environ.get('PROFILE_TOP', '25'))
+INTERVAL_MS = float(os.environ.get('PROFILE_INTERVAL_MS', '5'))
+MAX_STACKS = int(os.environ.get('PROFILE_MAX_STACKS', '200'))
+OUTPUT = os.environ.get('PROFILE_OUTPUT', '')
+
+HEADER = 'x-profile'
+MODES = ('cpu', 'stacks', 'memory')
+
+_lock = threading.Lock()
+_active = False
+_last_profiled = float('-inf')
+
+
+def _header(event):
+    headers = event.get('headers') if isinstance(event, dict) else None
+    if not headers:
+        return None
+    for key, value in headers.items():
+        if key.lower() == HEADER:
+            return value
+    return None
+
+
+def parse_modes(value):
+    """Modes named in a header or PROFILE_MODES value; '1', 'true' or '' mean the defaults"""
+    value = (value or '').strip().lower()
+    if value in ('', '1', 'true', 'yes', 'on'):
+        value = DEFAULT_MODES
+    return tuple(mode for mode in MODES if mode in {part.strip() for part in value.split(',')})
+
+
+def requested_modes(event):
+    """Modes to profile this invocation with, or () when it is not profiled"""
+    modes = ()
+    if ALLOW_HEADER:
+        value = _header(event)
+        if value is not None:
+            modes = parse_modes(value)
+    if not modes and SAMPLE_RATE and random.random() < SAMPLE_RATE:
+        modes = parse_modes(DEFAULT_MODES)
+    return modes
+
+
+def _claim():
+    """Take the single profiling slot if the interval has passed"""
+    global _active, _last_profiled
+    with _lock:
+        now = time.monotonic()
+        if _active or now - _last_profiled < MIN_INTERVAL_S:
+            return False
+        _active = True
+        _last_profiled = now
+        return True
+
+
+def _release():
+    global _active
+    with _lock:
+        _active = False
+
+
+class StackSampler(threading.Thread):
+    """Samples one thread's Python stack at a fixed interval into collapsed-stack counts"""
+
+    def __init__(self, thread_id, interval_s):
+        super().__init__(name='profiling-sampler', daemon=True)
+        self.thread_id = thread_id
+        self.interval_s = interval_s
+        self.counts = {}
+        self.samples = 0
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval_s):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f'{os.path.basename(code.co_filename)}:{code.co_name}')
+                frame = frame.f_back
+            stack = ';'.join(reversed(names))
+            self.counts[stack] = self.counts.get(stack, 0) + 1
+            self.samples += 1
+
+    def stop(self):
+        """Stop sampling; safe to call more than once, or before start()"""
+        self._stop_event.set()
+        if self.is_alive():
+            self.join()
+
+    def collapsed(self, limit=MAX_STACKS):
+        ordered = sorted(self.counts.items(), key=lambda item: -item[1])
+        return [f'{stack} {count}' for stack, count in ordered[:limit]]
+
+
+def _top_functions(profiler, limit):
+    stats = pstats.Stats(profiler)
+    rows = []
+    for (filename, line, name), (calls, _, total, cumulative, _) in stats.stats.items():
+        rows.append({
+            'function': f'{os.path.basename(filename)}:{line}:{name}' if line else name,
+            'calls': calls,
+            'total_ms': round(total * 1000, 3),
+            'cumulative_ms': round(cumulative * 1000, 3),
+        })
+    rows.sort(key=lambda row: -row['cumulative_ms'])
+    return rows[:limit]
+
+
+def _top_allocations(snapshot, limit):
+    snapshot = snapshot.filter_traces((tracemalloc.Filter(False, tracemalloc.__file__),
+                                       tracemalloc.Filter(False, __file__)))
+    return [{
+        'site': f'{os.path.basename(stat.traceback[0].filename)}:{stat.traceback[0].lineno}',
+        'size_kb': round(stat.size / 1024, 1),
+        'count': stat.count,
+    } for stat in snapshot.statistics('lineno')[:limit]]
+
+
+def _write(report, profiler, sampler):
+    if not OUTPUT:
+        print(json.dumps({'profile': report}, separators=(',', ':')))
+        return
+    os.makedirs(OUTPUT, exist_ok=True)
+    base = os.path.join(OUTPUT, f"{report['function']}-{int(time.time() * 1000)}-{report['request_id'] or 'local'}")
+    with open(base + '.json', 'w') as f:
+        json.dump(report, f, indent=2)
+    if profiler is not None:
+        profiler.dump_stats(base + '.pstats')
+    if sampler is not None:
+        with open(base + '.collapsed', 'w') as f:
+            f.write('\n'.join(sampler.collapsed(limit=None)) + '\n')
+    print(json.dumps({'profile_written': base}))
+
+
+def _report(function, modes, context, started, profiler, sampler, tracing):
+    if profiler is not None:
+        profiler.disable()
+    duration_ms = (time.perf_counter() - started) * 1000
+    if sampler is not None:
+        sampler.stop()
+    report = {
+        'function': function,
+        'request_id': getattr(context, 'aws_request_id', None),
+        'modes': list(modes),
+        'duration_ms': round(duration_ms, 3),
+    }
+    if profiler is not None:
+        report['top'] = _top_functions(profiler, TOP)
+    if sampler is not None:
+        report['samples'] = sampler.samples
+        report['collapsed'] = sampler.collapsed()
+    if tracing:
+        snapshot = tracemalloc.take_snapshot()
+        report['peak_kb'] = round(tracemalloc.get_traced_memory()[1] / 1024, 1)
+        tracemalloc.stop()
+        report['allocations'] = _top_allocations(snapshot, TOP)
+    _write(report, profiler, sampler)
+
+
+def run_profiled(handler, function, modes, event, context):
+    """Call ``handler`` under the given modes and write the report"""
+    profiler = cProfile.Profile() if 'cpu' in modes else None
+    sampler = StackSampler(threading.get_ident(), INTERVAL_MS / 1000) if 'stacks' in modes else None
+    tracing = 'memory' in modes and not tracemalloc.is_tracing()
+
+    def stop():
+        if profiler is not None:
+            profiler.disable()
+        if sampler is not None:
+            sampler.stop()
+        if tracing and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    try:
+        if tracing:
+            tracemalloc.start()
+        if sampler is not None:
+            sampler.start()
+        started = time.perf_counter()
+        if profiler is not None:
+            profiler.enable()
+    except Exception as e:
+        print(f"Profiling error: {e}")
+        stop()
+        return handler(event, context)
+    try:
+        return handler(event, context)
+    finally:
+        # A profiling failure is logged and never replaces the handler's response or exception
+        try:
+            _report(function, modes, context, started, profiler, sampler, tracing)
+        except Exception as e:
+            print(f"Profiling error: {e}")
+        finally:
+            # Whatever _report got through, nothing keeps sampling or tracing after the request
+            stop()
+
+
+def profiled(function):
+    """Decorator for a lambda_handler that profiles invocations picked by header or sampling"""
+    def decorator(handler):
+        @functools.wraps(handler)
+        def wrapper(event, context):
+            if not (SAMPLE_RATE or ALLOW_HEADER):
+                return handler(event, context)
+            modes = requested_modes(event)
+            if not modes or not _claim():
+                return handler(event, context)
+            metrics.set_property('profiled', ','.join(modes))
+            try:
+                return run_profiled(handler, function, modes, event, context)
+            finally:
+                _release()
+        return wrapper
+    return decorator
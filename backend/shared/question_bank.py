@@ -0,0 +1,161 @@
+"""
+Question banks and sampled templates.
+
+Bank questions are stored one item per question in the question bank table and
+indexed by ``bank_key`` (``course#topic#difficulty``) through the
+``bank-index`` GSI, which only projects keys. A template can carry a
+``sampling`` spec instead of a fixed question list, e.g.::
+
+    [{'topic': 'Recursion', 'difficulty': 'easy', 'count': 5},
+     {'topic': 'Recursion', 'difficulty': 'hard', 'count': 3}]
+
+Each quiz session resolves the spec once with an RNG seeded by the session id
+and stores the sampled ``question_ids`` on the session, so the quiz view and
+the evaluation only ever load those questions. Pools and questions are cached
+per container.
+"""
+import hashlib
+import os
+import random
+import time
+from collections import OrderedDict
+
+from shared import aws
+
+BANK_INDEX = 'bank-index'
+POOL_TTL_SECONDS = float(os.environ.get('QUESTION_POOL_TTL', '60'))
+QUESTION_TTL_SECONDS = float(os.environ.get('QUESTION_CACHE_TTL', '300'))
+MAX_CACHED_QUESTIONS = int(os.environ.get('QUESTION_CACHE_SIZE', '2000'))
+BATCH_GET_LIMIT = 100
+
+# bank_key -> (sorted question ids, monotonic fetch time)
+_pools = {}
+# question_id -> (question, monotonic fetch time)
+_questions = OrderedDict()
+
+
+class SamplingError(Exception):
+    """A sampling spec cannot be satisfied by the bank"""
+
+
+def bank_key(course, topic, difficulty):
+    return f'{course}#{topic}#{difficulty}'
+
+
+def validate_sampling(sampling):
+    """Return an error message for an invalid sampling spec, or None"""
+    if not isinstance(sampling, list) or not sampling:
+        return 'sampling must be a non-empty list'
+    for i, rule in enumerate(sampling):
+        if not isinstance(rule, dict):
+            return f'Sampling rule {i+1} must be an object'
+        if not str(rule.get('topic', '')).strip() or not str(rule.get('difficulty', '')).strip():
+            return f'Sampling rule {i+1} must have topic and difficulty'
+        count = rule.get('count')
+        if not isinstance(count, int) or isinstance(count, bool) or count < 1:
+            return f'Sampling rule {i+1} must have a positive integer count'
+    return None
+
+
+def sampled_question_count(sampling):
+    return sum(int(rule['count']) for rule in sampling)
+
+
+def pool_ids(course, topic, difficulty):
+    """Sorted ids of the bank questions for one course/topic/difficulty"""
+    key = bank_key(course, topic, difficulty)
+    cached = _pools.get(key)
+    now = time.monotonic()
+    if cached and now - cached[1] < POOL_TTL_SECONDS:
+        return cached[0]
+
+    ids = []
+    kwargs = {
+        'IndexName': BANK_INDEX,
+        'KeyConditionExpression': 'bank_key = :bank_key',
+        'ExpressionAttributeValues': {':bank_key': key},
+        'ProjectionExpression': 'question_id'
+    }
+    table = aws.table('questions')
+    while True:
+        response = table.query(**kwargs)
+        ids.extend(item['question_id'] for item in response.get('Items', []))
+        if 'LastEvaluatedKey' not in response:
+            break
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+    ids.sort()
+    _pools[key] = (ids, now)
+    return ids
+
+
+def invalidate_pool(key=None):
+    """Forget one cached pool (by bank_key), or all of them"""
+    if key is None:
+        _pools.clear()
+    else:
+        _pools.pop(key, None)
+
+
+def sample_question_ids(template, seed):
+    """Resolve a template's sampling spec into an ordered list of question ids"""
+    rng = random.Random(f"{template['template_id']}:{seed}")
+    sampled = []
+    for rule in template['sampling']:
+        pool = [question_id for question_id in pool_ids(template['course'], rule['topic'], rule['difficulty'])
+                if question_id not in sampled]
+        count = int(rule['count'])
+        if len(pool) < count:
+            raise SamplingError(
+                f"Only {len(pool)} questions available for {rule['topic']} / {rule['difficulty']}, {count} requested"
+            )
+        sampled.extend(rng.sample(pool, count))
+    return sampled
+
+
+def get_questions(question_ids, skip_missing=False):
+    """Fetch bank questions by id, in the given order, through the per-container cache
+
+    Raises SamplingError for an id that is not in the bank, unless skip_missing leaves it out.
+    """
+    now = time.monotonic()
+    missing = []
+    for question_id in question_ids:
+        cached = _questions.get(question_id)
+        if not cached or now - cached[1] >= QUESTION_TTL_SECONDS:
+            missing.append(question_id)
+
+    table_name = aws.table_name('questions')
+    for start in range(0, len(missing), BATCH_GET_LIMIT):
+        request = {table_name: {'Keys': [{'question_id': question_id} for question_id in missing[start:start + BATCH_GET_LIMIT]]}}
+        while request:
+            response = aws.resource('dynamodb').batch_get_item(RequestItems=request)
+            for question in response.get('Responses', {}).get(table_name, []):
+                _questions[question['question_id']] = (question, now)
+                _questions.move_to_end(question['question_id'])
+            request = response.get('UnprocessedKeys') or None
+    while len(_questions) > MAX_CACHED_QUESTIONS:
+        _questions.popitem(last=False)
+
+    questions = []
+    for question_id in question_ids:
+        cached = _questions.get(question_id)
+        if cached is None:
+            if skip_missing:
+                continue
+            raise SamplingError(f'Question {question_id} no longer exists in the bank')
+        questions.append(cached[0])
+    return questions
+
+
+def session_questions(template, session=None):
+    """Questions a session is answering, indexed the same way as its question_order"""
+    if session and session.get('question_ids'):
+        return get_questions(list(session['question_ids']))
+    return template.get('questions', [])
+
+
+def stable_id(question):
+    """Id of a question that does not depend on its position: the bank question_id, or a hash of its text"""
+    if question.get('question_id'):
+        return question['question_id']
+    return hashlib.sha256((question.get('question_text') or '').strip().encode('utf-8')).hexdigest()[:16]
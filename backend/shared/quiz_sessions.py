@@ -0,0 +1,232 @@
+"""
+Quiz sessions for paged quiz delivery.
+
+A session fixes the order in which a student sees a template's questions (so
+every page request is a slice of a precomputed list) and collects answers one
+question at a time, so the final submit does not have to carry all of them.
+
+A session belongs to the user whose token created it (``user_id``, the
+token's ``sub``). Pages, answers and the submit of a session are refused with
+403 for anyone else.
+
+Session items live in the sessions table and expire through the DynamoDB TTL
+attribute ``expires_at``. Answers are stored in the ``answers`` map keyed by
+question index. PDF answers are too large for a DynamoDB item and are still
+sent with the final submit.
+"""
+import os
+import random
+import time
+import uuid
+from datetime import datetime
+
+from shared import aws
+from shared import question_bank
+
+SESSION_TTL_SECONDS = int(os.environ.get('QUIZ_SESSION_TTL', str(24 * 3600)))
+DEFAULT_PAGE_SIZE = 10
+MAX_PAGE_SIZE = 50
+
+# Text answers are capped so a session stays well below the 400 KB item limit
+MAX_ANSWER_CHARS = int(os.environ.get('MAX_ANSWER_CHARS', '20000'))
+
+# A submit claims its session while it grades; a claim older than this (well past the
+# submit function's timeout) belongs to an invocation that died and may be taken over
+SUBMIT_CLAIM_SECONDS = int(os.environ.get('SUBMIT_CLAIM_SECONDS', '300'))
+
+
+class SessionError(Exception):
+    """Invalid session request; carries the HTTP status to return"""
+    def __init__(self, status_code, message):
+        super().__init__(message)
+        self.status_code = status_code
+        self.message = message
+
+
+def question_order(session_id, total_questions, shuffle=False):
+    """Question indices in delivery order; shuffling is seeded by the session id"""
+    order = list(range(total_questions))
+    if shuffle:
+        random.Random(session_id).shuffle(order)
+    return order
+
+
+def create_session(template, user_id, student_name=None, session_id=None):
+    """Create and store a session for a template, owned by user_id"""
+    session_id = session_id or str(uuid.uuid4())
+    question_ids = None
+    if template.get('sampling'):
+        # Sampled templates draw this session's questions from the bank
+        try:
+            question_ids = question_bank.sample_question_ids(template, session_id)
+        except question_bank.SamplingError as e:
+            raise SessionError(409, str(e))
+        total_questions = len(question_ids)
+    else:
+        total_questions = len(template.get('questions', []))
+    timestamp = datetime.utcnow().isoformat()
+    session = {
+        'session_id': session_id,
+        'template_id': template['template_id'],
+        'template_version': template.get('version', 0),
+        'user_id': user_id,
+        'question_order': question_order(session_id, total_questions, bool(template.get('shuffle_questions'))),
+        'answers': {},
+        'created_at': timestamp,
+        'updated_at': timestamp,
+        'expires_at': int(time.time()) + SESSION_TTL_SECONDS
+    }
+    if question_ids is not None:
+        session['question_ids'] = question_ids
+    if student_name:
+        session['student_name'] = student_name
+    aws.table('sessions').put_item(
+        Item=session,
+        ConditionExpression='attribute_not_exists(session_id)'
+    )
+    return session
+
+
+def get_session(session_id, consistent=False):
+    response = aws.table('sessions').get_item(Key={'session_id': session_id}, ConsistentRead=consistent)
+    return response.get('Item')
+
+
+def check_owner(session, user_id):
+    """Raise SessionError(403) unless the session was created by user_id"""
+    if session.get('user_id') != user_id:
+        raise SessionError(403, 'Session belongs to another user')
+
+
+def page_bounds(page, page_size, total_questions):
+    """Validate paging parameters and return (page, page_size, total_pages, start, end)"""
+    try:
+        page = int(page) if page not in (None, '') else 1
+        page_size = int(page_size) if page_size not in (None, '') else DEFAULT_PAGE_SIZE
+    except (TypeError, ValueError):
+        raise SessionError(400, 'page and page_size must be integers')
+    if page < 1 or page_size < 1:
+        raise SessionError(400, 'page and page_size must be positive')
+    page_size = min(page_size, MAX_PAGE_SIZE)
+    total_pages = max(1, -(-total_questions // page_size))
+    if page > total_pages:
+        raise SessionError(404, f'Page {page} does not exist (total_pages: {total_pages})')
+    start = (page - 1) * page_size
+    return page, page_size, total_pages, start, min(start + page_size, total_questions)
+
+
+def save_answer(session_id, user_id, question_index, answer_text):
+    """Store one answer on an open session of user_id in a single conditional write"""
+    if len(answer_text) > MAX_ANSWER_CHARS:
+        raise SessionError(413, f'Answer exceeds {MAX_ANSWER_CHARS} characters')
+    try:
+        aws.table('sessions').update_item(
+            Key={'session_id': session_id},
+            UpdateExpression='SET answers.#q = :answer, updated_at = :updated_at',
+            ConditionExpression=(
+                'attribute_exists(session_id) AND user_id = :user_id AND attribute_not_exists(submitted_at) '
+                'AND contains(question_order, :question_index)'
+            ),
+            ExpressionAttributeNames={'#q': str(question_index)},
+            ExpressionAttributeValues={
+                ':answer': {'question_index': question_index, 'answer_text': answer_text},
+                ':question_index': question_index,
+                ':user_id': user_id,
+                ':updated_at': datetime.utcnow().isoformat()
+            }
+        )
+    except Exception as e:
+        if aws.error_code(e) != 'ConditionalCheckFailedException':
+            raise
+        # Only read the session to explain why the write was rejected
+        session = get_session(session_id)
+        if not session:
+            raise SessionError(404, 'Session not found')
+        check_owner(session, user_id)
+        if session.get('submitted_at'):
+            raise SessionError(409, 'Session has already been submitted')
+        raise SessionError(400, f'Invalid question_index: {question_index}')
+
+
+def session_answers(session):
+    """Answers stored on a session as a list of {question_index, answer_text}"""
+    answers = []
+    for answer in (session.get('answers') or {}).values():
+        answers.append({
+            'question_index': int(answer['question_index']),
+            'answer_text': answer.get('answer_text', '')
+        })
+    return answers
+
+
+def submission_open(session):
+    """Whether a session can still be submitted: never claimed, or its grading claim went stale"""
+    if not session.get('submitted_at'):
+        return True
+    return session.get('submission_status') == 'grading' and session.get('claim_expires_at', 0) < time.time()
+
+
+def claim_submission(session_id):
+    """Claim a session for grading before any evaluator call; returns the claim id.
+
+    Sets ``submitted_at``, so answers can no longer be saved and a concurrent
+    submit gets a 409 instead of grading the same answers again.
+    """
+    claim_id = str(uuid.uuid4())
+    now = int(time.time())
+    try:
+        aws.table('sessions').update_item(
+            Key={'session_id': session_id},
+            UpdateExpression=('SET submitted_at = :submitted_at, submission_status = :grading, '
+                              'claim_id = :claim_id, claim_expires_at = :claim_expires_at'),
+            ConditionExpression=(
+                'attribute_exists(session_id) AND (attribute_not_exists(submitted_at) '
+                'OR (submission_status = :grading AND claim_expires_at < :now))'
+            ),
+            ExpressionAttributeValues={
+                ':submitted_at': datetime.utcnow().isoformat(),
+                ':grading': 'grading',
+                ':claim_id': claim_id,
+                ':claim_expires_at': now + SUBMIT_CLAIM_SECONDS,
+                ':now': now
+            }
+        )
+    except Exception as e:
+        if aws.error_code(e) == 'ConditionalCheckFailedException':
+            raise SessionError(409, 'Session has already been submitted')
+        raise
+    return claim_id
+
+
+def release_submission(session_id, claim_id):
+    """Reopen a session whose grading or save failed, so the student can submit again"""
+    try:
+        aws.table('sessions').update_item(
+            Key={'session_id': session_id},
+            UpdateExpression='REMOVE submitted_at, submission_status, claim_id, claim_expires_at',
+            ConditionExpression='claim_id = :claim_id',
+            ExpressionAttributeValues={':claim_id': claim_id}
+        )
+    except Exception as e:
+        # A stale claim taken over by another submit is no longer ours to release
+        if aws.error_code(e) != 'ConditionalCheckFailedException':
+            raise
+
+
+def mark_submitted(session_id, claim_id, result_id):
+    """Close a claimed session with its result; raises SessionError if the claim was lost"""
+    try:
+        aws.table('sessions').update_item(
+            Key={'session_id': session_id},
+            UpdateExpression='SET submission_status = :submitted, result_id = :result_id REMOVE claim_expires_at',
+            ConditionExpression='claim_id = :claim_id',
+            ExpressionAttributeValues={
+                ':submitted': 'submitted',
+                ':claim_id': claim_id,
+                ':result_id': result_id
+            }
+        )
+    except Exception as e:
+        if aws.error_code(e) == 'ConditionalCheckFailedException':
+            raise SessionError(409, 'Session has already been submitted')
+        raise
@@ -0,0 +1,66 @@
+"""
+Student-facing quiz view of a template.
+
+The view is the exact JSON body returned by GET /templates/{template_id}/quiz:
+the template metadata plus its questions with every answer-bearing field
+removed. template_api precomputes it on every write and stores it on the
+template item as ``quiz_view`` together with a strong ``quiz_etag``, so
+take_quiz can serve it without rebuilding it and answer conditional requests
+with 304.
+"""
+import hashlib
+
+from shared import serialization
+
+# Only these question fields are ever sent to students
+STUDENT_QUESTION_FIELDS = ('question_text', 'question_type', 'options')
+
+DEFAULT_TIME_LIMIT = 3600
+DEFAULT_INSTRUCTIONS = 'Answer all questions to the best of your ability.'
+
+
+def sanitize_question(question):
+    """Copy of a question without correct answers, example answers or rubrics"""
+    return {field: question[field] for field in STUDENT_QUESTION_FIELDS if field in question}
+
+
+def build_quiz_view(template):
+    """Return (body, etag) for the student-facing quiz of a template"""
+    quiz_data = {
+        'template_id': template['template_id'],
+        'title': template['title'],
+        'subject': template['subject'],
+        'course': template['course'],
+        'questions': [sanitize_question(question) for question in template.get('questions', [])],
+        'time_limit': template.get('time_limit', DEFAULT_TIME_LIMIT),
+        'instructions': template.get('instructions', DEFAULT_INSTRUCTIONS)
+    }
+    body = serialization.dumps({'quiz': quiz_data}, compact=True)
+    return body, etag_for(body)
+
+
+def etag_for(body):
+    """Strong entity tag for a response body"""
+    return '"' + hashlib.sha256(body.encode('utf-8')).hexdigest()[:32] + '"'
+
+
+def attach_quiz_view(template):
+    """Store the precomputed view and its ETag on a template item before it is written"""
+    template['quiz_view'], template['quiz_etag'] = build_quiz_view(template)
+    return template
+
+
+def etag_matches(if_none_match, etag):
+    """True if an If-None-Match header value matches the given entity tag"""
+    if not if_none_match or not etag:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    # Weak comparison, as required for If-None-Match
+    for candidate in if_none_match.split(','):
+        candidate = candidate.strip()
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
@@ -0,0 +1,108 @@
+"""
+Key-point rubrics condensed from example answers.
+
+template_api builds a rubric for every question with an example answer when
+the question is written, and stores it with ``rubric_hash``, the content hash
+of the example answer it came from. Rubric fields in request bodies are
+ignored; an unchanged example answer reuses the rubric already stored. submit_quiz and regrade.py grade against
+the stored rubric only while that hash still matches the example answer, so
+an example answer edited outside the API falls back to grading against the
+full text.
+
+A rubric keeps at most ``RUBRIC_MAX_POINTS`` key points of at most
+``RUBRIC_MAX_WORDS`` words each. When an example answer does not fit, the
+question is stored with ``rubric_truncated`` set and the template API returns
+a warning so the editor can shorten the example answer.
+"""
+import hashlib
+import re
+
+RUBRIC_MAX_POINTS = 12
+RUBRIC_MAX_WORDS = 40
+RUBRIC_FILLER = re.compile(
+    r'^(in conclusion|in summary|to summarise|to summarize|overall|basically|essentially|'
+    r'firstly|secondly|thirdly|finally|also|additionally|furthermore|moreover|however)[,:]?\s+',
+    re.IGNORECASE
+)
+RUBRIC_BULLET = re.compile(r'^\s*(?:[-*\u2022]|\d+[.)])\s*')
+RUBRIC_SPLIT = re.compile(r'(?<=[.!?;])\s+|\n+')
+# Derived on write; never taken from a request body
+RUBRIC_FIELDS = ('rubric', 'rubric_hash', 'rubric_truncated')
+
+
+def example_answer_hash(example_answer):
+    """Content hash of an example answer, used to tell whether its rubric is current"""
+    return hashlib.sha256((example_answer or '').strip().encode('utf-8')).hexdigest()
+
+
+def build_rubric(example_answer):
+    """Condense an example answer into (key points to grade against, whether any were cut)"""
+    key_points = []
+    seen = set()
+    truncated = False
+    for fragment in RUBRIC_SPLIT.split(example_answer or ''):
+        point = RUBRIC_BULLET.sub('', fragment).strip()
+        point = RUBRIC_FILLER.sub('', point).strip().rstrip('.;')
+        words = point.split()
+        if len(words) < 2:
+            continue
+        if len(words) > RUBRIC_MAX_WORDS:
+            words = words[:RUBRIC_MAX_WORDS]
+            truncated = True
+        point = ' '.join(words)
+        normalized = point.lower()
+        if normalized in seen:
+            continue
+        if len(key_points) >= RUBRIC_MAX_POINTS:
+            truncated = True
+            break
+        seen.add(normalized)
+        key_points.append(point[0].upper() + point[1:])
+    return key_points, truncated
+
+
+def attach_rubrics(questions, stored_questions=()):
+    """Store a key-point rubric and its content hash on every question with an example answer
+
+    Rubric fields sent by a client are always dropped. A rubric is reused only
+    from ``stored_questions``, the questions already stored on the item, when it
+    was built from the same example answer; every other rubric is rebuilt.
+    """
+    stored = {}
+    for question in stored_questions:
+        if current_rubric(question) is not None:
+            stored[question['rubric_hash']] = question
+    for question in questions:
+        for field in RUBRIC_FIELDS:
+            question.pop(field, None)
+        example_answer = (question.get('example_answer') or '').strip()
+        if not example_answer:
+            continue
+        content_hash = example_answer_hash(example_answer)
+        existing = stored.get(content_hash)
+        if existing:
+            question['rubric'] = list(existing['rubric'])
+            truncated = bool(existing.get('rubric_truncated'))
+        else:
+            question['rubric'], truncated = build_rubric(example_answer)
+        question['rubric_hash'] = content_hash
+        if truncated:
+            question['rubric_truncated'] = True
+    return questions
+
+
+def truncation_warnings(questions):
+    """Messages for the editor about questions whose example answer did not fit in the rubric"""
+    return [
+        f'Question {i + 1}: the rubric keeps only the first {RUBRIC_MAX_POINTS} key points of up to '
+        f'{RUBRIC_MAX_WORDS} words each; shorten the example answer to grade against all of it'
+        for i, question in enumerate(questions) if question.get('rubric_truncated')
+    ]
+
+
+def current_rubric(question):
+    """Return the precomputed rubric if it was built from the current example answer"""
+    rubric = question.get('rubric')
+    if rubric and question.get('rubric_hash') == example_answer_hash(question.get('example_answer', '')):
+        return list(rubric)
+    return None
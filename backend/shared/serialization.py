@@ -0,0 +1,43 @@
+"""
+JSON encoding and decoding for DynamoDB items.
+
+DynamoDB returns every number as ``Decimal`` and rejects ``float`` on write.
+``dumps`` turns ``Decimal`` into ``int`` or ``float`` inside the encoder, in
+the same pass that writes the JSON, so items are never copied first.
+``loads`` parses with ``parse_float=Decimal``, so request bodies and
+evaluator responses can be stored as they are.
+"""
+import json
+from decimal import Decimal
+
+
+def json_default(obj):
+    """``default=`` hook for json.dumps: whole Decimals become int, others float"""
+    if isinstance(obj, Decimal):
+        return int(obj) if obj == obj.to_integral_value() else float(obj)
+    if isinstance(obj, (set, frozenset)):
+        return sorted(obj)
+    raise TypeError(f'Object of type {type(obj).__name__} is not JSON serializable')
+
+
+class DecimalEncoder(json.JSONEncoder):
+    """JSONEncoder for DynamoDB items; Decimal and set values are encoded directly"""
+    def default(self, obj):
+        return json_default(obj)
+
+
+# Reused across calls; json.dumps(default=...) would build a new encoder every time
+_encoder = DecimalEncoder()
+_compact_encoder = DecimalEncoder(separators=(',', ':'))
+
+
+def dumps(obj, compact=False, **kwargs):
+    """Encode an item (or anything holding Decimals) as JSON"""
+    if kwargs:
+        return json.dumps(obj, cls=DecimalEncoder, separators=(',', ':') if compact else None, **kwargs)
+    return (_compact_encoder if compact else _encoder).encode(obj)
+
+
+def loads(text):
+    """Decode JSON with non-integer numbers as Decimal, ready for put_item"""
+    return json.loads(text, parse_float=Decimal)
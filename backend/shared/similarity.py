@@ -0,0 +1,299 @@
+"""
+Near-duplicate answer detection with MinHash and locality-sensitive hashing.
+
+Each text answer becomes a set of word shingles (``SHINGLE_WORDS`` words
+long) and a MinHash signature of ``NUM_PERM`` values. Two signatures agree in
+each position with probability equal to the Jaccard similarity of the two
+shingle sets. The signature is split into ``BANDS`` bands of ``ROWS`` values.
+Answers that agree on a whole band share a bucket. Two answers of
+similarity s share at least one with probability ``1 - (1 - s**ROWS)**BANDS``.
+With 16 bands of 4 that is about 0.99 at ``DEFAULT_THRESHOLD`` (0.7), 0.64
+at 0.5 and 0.12 at 0.3. Candidates are then checked against the threshold with
+their full signatures. ``benchmarks/similarity_recall.py`` checks that pairs
+at the default threshold are found.
+
+The similarity table has three kinds of items, keyed by (``bucket_key``,
+``member``). All are per template and question, where the question is the
+``question_id`` submit_quiz stores on each answer (see
+``question_bank.stable_id``), so sampled quizzes, which put different
+questions at the same position, and reordered templates still compare
+answers to the same question:
+
+- ``sig#<template>#<question>`` / result_id: the signature, student name and
+  a preview of the answer;
+- ``band#<template>#<question>#<band>#<hash>`` / result_id: bucket members;
+- the same bucket / ``#``: a marker naming the bucket's first member. Once a
+  second answer arrives, the marker gets a ``question_key``. That puts it in
+  the sparse ``question_key-index``, which lists only buckets that collide.
+
+Finding clusters for a question reads only the colliding buckets and their
+members' signatures, so the cost follows the number of near-duplicates rather
+than the number of answers. Indexing is idempotent, and
+``quiz/similarity_backfill.py`` indexes results stored before it existed. It
+also repairs a collision missed when two first members were written at the
+same moment.
+
+NumPy computes the signatures when it is installed. Otherwise a pure-Python
+path gives identical signatures.
+"""
+import base64
+import hashlib
+import random
+import re
+import struct
+import zlib
+
+from shared import aws
+from shared import question_bank
+from shared import template_cache
+from shared import template_versions
+from shared.lazy import LazyModule
+
+numpy = LazyModule('numpy')
+
+SHINGLE_WORDS = 3
+MIN_SHINGLES = 5
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+DEFAULT_THRESHOLD = 0.7
+PREVIEW_CHARS = 200
+COLLISION_INDEX = 'question_key-index'
+BATCH_GET_LIMIT = 100
+# Buckets are verified pairwise; a bucket this large is a common stock answer, not copying
+MAX_BUCKET_MEMBERS = 200
+
+# Permutations h(x) = (a*x + b) mod p; with p < 2**31 products stay inside uint64
+_PRIME = (1 << 31) - 1
+_rng = random.Random(20240501)
+_A = [_rng.randrange(1, _PRIME) for _ in range(NUM_PERM)]
+_B = [_rng.randrange(0, _PRIME) for _ in range(NUM_PERM)]
+_numpy_available = None
+
+
+def shingles(text):
+    """Hashed word shingles of an answer, ignoring case and punctuation"""
+    words = re.findall(r'[a-z0-9]+', (text or '').lower())
+    grams = {' '.join(words[i:i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1)}
+    return sorted(zlib.crc32(gram.encode('utf-8')) % _PRIME for gram in grams)
+
+
+def _use_numpy():
+    global _numpy_available
+    if _numpy_available is None:
+        try:
+            numpy.ndarray
+            _numpy_available = True
+        except ImportError:
+            _numpy_available = False
+    return _numpy_available
+
+
+def signature(text):
+    """MinHash signature (NUM_PERM ints) of an answer, or None when it is too short to compare"""
+    values = shingles(text)
+    if len(values) < MIN_SHINGLES:
+        return None
+    if _use_numpy():
+        x = numpy.array(values, dtype=numpy.uint64)
+        a = numpy.array(_A, dtype=numpy.uint64)[:, None]
+        b = numpy.array(_B, dtype=numpy.uint64)[:, None]
+        return ((a * x + b) % _PRIME).min(axis=1).tolist()
+    return [min((a * x + b) % _PRIME for x in values) for a, b in zip(_A, _B)]
+
+
+def encode_signature(values):
+    return base64.b64encode(struct.pack(f'<{NUM_PERM}I', *values)).decode('ascii')
+
+
+def decode_signature(text):
+    return list(struct.unpack(f'<{NUM_PERM}I', base64.b64decode(text)))
+
+
+def estimated_similarity(first, second):
+    """Estimated Jaccard similarity of the answers behind two signatures"""
+    return sum(x == y for x, y in zip(first, second)) / NUM_PERM
+
+
+def band_keys(template_id, question_id, values):
+    keys = []
+    for band in range(BANDS):
+        chunk = struct.pack(f'<{ROWS}I', *values[band * ROWS:(band + 1) * ROWS])
+        digest = hashlib.blake2b(chunk, digest_size=8).hexdigest()
+        keys.append(f'band#{template_id}#{question_id}#{band}#{digest}')
+    return keys
+
+
+def question_key(template_id, question_id):
+    return f'{template_id}#{question_id}'
+
+
+def signature_key(template_id, question_id):
+    return f'sig#{template_id}#{question_id}'
+
+
+def _batch_get(keys):
+    """Items of the similarity table for (bucket_key, member) keys, by key"""
+    table_name = aws.table_name('similarity')
+    found = {}
+    for start in range(0, len(keys), BATCH_GET_LIMIT):
+        request = {table_name: {'Keys': [{'bucket_key': bucket_key, 'member': member}
+                                         for bucket_key, member in keys[start:start + BATCH_GET_LIMIT]]}}
+        while request:
+            response = aws.resource('dynamodb').batch_get_item(RequestItems=request)
+            for item in response.get('Responses', {}).get(table_name, []):
+                found[(item['bucket_key'], item['member'])] = item
+            request = response.get('UnprocessedKeys') or None
+    return found
+
+
+def answer_question_ids(result, live_template=True):
+    """{question_index: question_id} for a result's answers
+
+    Answers saved before submit_quiz stored ``question_id`` are resolved
+    against the bank questions or the template version the result was graded
+    against. Results from before versioning are resolved by position in the
+    live template, unless live_template is False; a result whose version
+    cannot be rebuilt leaves them out.
+    """
+    answers = result.get('answers', [])
+    ids = {int(answer['question_index']): answer['question_id'] for answer in answers if answer.get('question_id')}
+    if len(ids) == len(answers):
+        return ids
+    if result.get('question_ids'):
+        questions = [{'question_id': question_id} for question_id in result['question_ids']]
+    else:
+        template = None
+        if result.get('template_version') is not None:
+            try:
+                template = template_versions.get_version(result['template_id'], result['template_version'])
+            except template_versions.MissingContent as e:
+                print(f"Error loading template {result['template_id']} version {result['template_version']}: {e}")
+        elif live_template:
+            template = template_cache.get_template(result['template_id'])
+        template = template or {}
+        questions = template.get('questions', [])
+    for answer in answers:
+        index = int(answer.get('question_index', 0))
+        if index not in ids and 0 <= index < len(questions):
+            ids[index] = question_bank.stable_id(questions[index])
+    return ids
+
+
+def index_answers(template_id, result_id, answers, student_name=''):
+    """Store signatures and bucket entries for a result's text answers; returns how many were indexed"""
+    entries = []
+    seen = set()
+    for answer in answers:
+        text = answer.get('answer_text', '')
+        if answer.get('pdf_data') or not text:
+            # PDF text is only extracted by the evaluator, so PDF answers are not compared
+            continue
+        if not answer.get('question_id') or answer['question_id'] in seen:
+            # Saved before answers carried question ids (similarity_backfill.py resolves them), or a
+            # second question with the same text, whose keys would repeat in one batch write
+            continue
+        values = signature(text)
+        if values is not None:
+            question_id = answer['question_id']
+            seen.add(question_id)
+            entries.append((question_id, text, values, band_keys(template_id, question_id, values)))
+    if not entries:
+        return 0
+
+    markers = _batch_get([(key, '#') for _, _, _, keys in entries for key in keys])
+    with aws.table('similarity').batch_writer() as batch:
+        for question_id, text, values, keys in entries:
+            batch.put_item(Item={
+                'bucket_key': signature_key(template_id, question_id), 'member': result_id,
+                'signature': encode_signature(values), 'student_name': student_name,
+                'preview': text[:PREVIEW_CHARS],
+            })
+            for key in keys:
+                batch.put_item(Item={'bucket_key': key, 'member': result_id})
+                marker = markers.get((key, '#'))
+                if marker is None:
+                    batch.put_item(Item={'bucket_key': key, 'member': '#', 'first': result_id})
+                elif marker['first'] != result_id and 'question_key' not in marker:
+                    batch.put_item(Item={'bucket_key': key, 'member': '#', 'first': marker['first'],
+                                         'question_key': question_key(template_id, question_id)})
+    return len(entries)
+
+
+def remove_answers(template_id, result_id, question_ids):
+    """Drop a deleted result's signatures; its bucket entries are ignored once the signature is gone"""
+    with aws.table('similarity').batch_writer() as batch:
+        for question_id in set(question_ids):
+            batch.delete_item(Key={'bucket_key': signature_key(template_id, question_id), 'member': result_id})
+
+
+def _query_all(**kwargs):
+    table = aws.table('similarity')
+    while True:
+        response = table.query(**kwargs)
+        yield from response.get('Items', [])
+        if 'LastEvaluatedKey' not in response:
+            return
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def find_clusters(template_id, question_id, threshold=DEFAULT_THRESHOLD):
+    """Groups of answers to one question whose estimated similarity is at least threshold"""
+    buckets = {item['bucket_key'] for item in _query_all(
+        IndexName=COLLISION_INDEX, KeyConditionExpression='question_key = :key',
+        ExpressionAttributeValues={':key': question_key(template_id, question_id)})}
+
+    bucket_members = []
+    for bucket_key in sorted(buckets):
+        members = [item['member'] for item in _query_all(
+            KeyConditionExpression='bucket_key = :key', ExpressionAttributeValues={':key': bucket_key},
+            ProjectionExpression='#member', ExpressionAttributeNames={'#member': 'member'})
+            if item['member'] != '#']
+        bucket_members.append(sorted(members)[:MAX_BUCKET_MEMBERS])
+
+    candidates = sorted({member for members in bucket_members for member in members})
+    sig_key = signature_key(template_id, question_id)
+    stored = {member: item for (_, member), item in _batch_get([(sig_key, member) for member in candidates]).items()}
+    signatures = {member: decode_signature(item['signature']) for member, item in stored.items()}
+
+    parent = {member: member for member in signatures}
+
+    def root(member):
+        while parent[member] != member:
+            parent[member] = parent[parent[member]]
+            member = parent[member]
+        return member
+
+    pairs = {}
+    for members in bucket_members:
+        members = [member for member in members if member in signatures]
+        for i, first in enumerate(members):
+            for second in members[i + 1:]:
+                if (first, second) in pairs:
+                    continue
+                score = estimated_similarity(signatures[first], signatures[second])
+                if score >= threshold:
+                    pairs[(first, second)] = score
+                    parent[root(first)] = root(second)
+
+    groups = {}
+    for member in signatures:
+        groups.setdefault(root(member), []).append(member)
+    clusters = []
+    for members in groups.values():
+        if len(members) < 2:
+            continue
+        member_set = set(members)
+        cluster_pairs = sorted(((score, first, second) for (first, second), score in pairs.items()
+                                if first in member_set), reverse=True)
+        clusters.append({
+            'size': len(members),
+            'max_similarity': round(cluster_pairs[0][0], 3),
+            'members': [{'result_id': member, 'student_name': stored[member].get('student_name'),
+                         'preview': stored[member].get('preview')} for member in sorted(members)],
+            'pairs': [{'result_ids': [first, second], 'similarity': round(score, 3)}
+                      for score, first, second in cluster_pairs],
+        })
+    clusters.sort(key=lambda cluster: (-cluster['size'], -cluster['max_similarity']))
+    return {'question_id': question_id, 'colliding_buckets': len(buckets),
+            'candidates': len(candidates), 'clusters': clusters}
@@ -0,0 +1,128 @@
+"""
+Read-through, per-container cache of template items.
+
+Templates rarely change during an exam, so every handler that needs one reads
+it through ``get_template``. Entries are kept for ``TEMPLATE_CACHE_TTL``
+seconds; once that expires the entry is revalidated with a projected read of
+only ``version`` and ``updated_at`` and the full item is fetched again only if
+either changed. At most ``TEMPLATE_CACHE_SIZE`` templates are kept, evicting
+the least recently used one.
+
+Cached items are shared between invocations and must be treated as read-only.
+"""
+import json
+import os
+import time
+from collections import OrderedDict
+
+from shared import aws
+from shared import metrics
+
+TTL_SECONDS = float(os.environ.get('TEMPLATE_CACHE_TTL', '30'))
+MAX_ENTRIES = int(os.environ.get('TEMPLATE_CACHE_SIZE', '128'))
+STATS_LOG_EVERY = int(os.environ.get('TEMPLATE_CACHE_STATS_EVERY', '100'))
+
+# template_id -> (template, version token, monotonic time of the last check)
+_entries = OrderedDict()
+
+_stats = {
+    'hits': 0,
+    'misses': 0,
+    'revalidated': 0,
+    'reloaded': 0,
+    'evictions': 0,
+}
+
+
+def _version_token(item):
+    return (str(item.get('version', '')), item.get('updated_at', ''))
+
+
+def _store(template_id, template, now):
+    _entries[template_id] = (template, _version_token(template), now)
+    _entries.move_to_end(template_id)
+    while len(_entries) > MAX_ENTRIES:
+        _entries.popitem(last=False)
+        _stats['evictions'] += 1
+
+
+def _fetch(template_id):
+    response = aws.table('templates').get_item(Key={'template_id': template_id})
+    return response.get('Item')
+
+
+def _fetch_version(template_id):
+    response = aws.table('templates').get_item(
+        Key={'template_id': template_id},
+        ProjectionExpression='#version, updated_at',
+        ExpressionAttributeNames={'#version': 'version'}
+    )
+    return response.get('Item')
+
+
+def get_template(template_id):
+    """Return the template item, or None if it does not exist"""
+    now = time.monotonic()
+    entry = _entries.get(template_id)
+
+    if entry is not None:
+        template, token, checked_at = entry
+        if now - checked_at < TTL_SECONDS:
+            _entries.move_to_end(template_id)
+            _count('hits')
+            return template
+
+        # Expired: a projected read tells us whether the cached copy is still current
+        current = _fetch_version(template_id)
+        if current is None:
+            invalidate(template_id)
+            _count('misses')
+            return None
+        if _version_token(current) == token:
+            _entries[template_id] = (template, token, now)
+            _entries.move_to_end(template_id)
+            _stats['revalidated'] += 1
+            _count('hits')
+            return template
+        _stats['reloaded'] += 1
+
+    _count('misses')
+    template = _fetch(template_id)
+    if template is None:
+        _entries.pop(template_id, None)
+        return None
+    _store(template_id, template, now)
+    return template
+
+
+def put(template):
+    """Prime the cache with a template that was just written"""
+    _store(template['template_id'], template, time.monotonic())
+
+
+def invalidate(template_id=None):
+    """Drop one template, or the whole cache when no id is given"""
+    if template_id is None:
+        _entries.clear()
+    else:
+        _entries.pop(template_id, None)
+
+
+def stats():
+    """Hit/miss counters and hit rate for this container"""
+    lookups = _stats['hits'] + _stats['misses']
+    return dict(
+        _stats,
+        size=len(_entries),
+        lookups=lookups,
+        hit_rate=round(_stats['hits'] / lookups, 4) if lookups else 0.0
+    )
+
+
+def _count(outcome):
+    _stats[outcome] += 1
+    if outcome in ('hits', 'misses'):
+        metrics.cache('template_cache', outcome == 'hits')
+    lookups = _stats['hits'] + _stats['misses']
+    if STATS_LOG_EVERY and lookups % STATS_LOG_EVERY == 0:
+        print(json.dumps({'template_cache': stats()}))
@@ -0,0 +1,218 @@
+"""
+Readers and writers for bulk template import and export.
+
+Three formats are supported:
+
+- ``csv``: one row per question with the columns in ``CSV_FIELDS``.
+  Consecutive rows with the same course, subject and title form one template.
+  ``options`` are separated by ``|``. A sampled template is a single row with
+  its ``sampling`` spec as JSON and no question columns.
+- ``ndjson``: one template object per line.
+- ``json``: an array of template objects, or ``{"templates": [...]}``.
+
+Readers are generators over lines, so files are processed in one pass and
+problems are reported per row instead of aborting the whole import.
+"""
+import csv
+import io
+import json
+
+from shared import serialization
+
+FORMATS = ('csv', 'ndjson', 'json')
+CONTENT_TYPES = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+    'json': 'application/json',
+}
+CSV_FIELDS = ('course', 'subject', 'title', 'question_text', 'question_type',
+              'example_answer', 'options', 'correct_answer', 'sampling')
+OPTION_SEPARATOR = '|'
+
+# Fields a template or question keeps when exported; everything else is derived on write
+TEMPLATE_FIELDS = ('title', 'subject', 'course', 'questions', 'sampling')
+QUESTION_FIELDS = ('question_text', 'question_type', 'example_answer', 'options', 'correct_answer')
+
+
+class RecordError(ValueError):
+    """A row that cannot be turned into a template"""
+
+
+def detect_format(name):
+    """Format from a file name, content type or explicit format name"""
+    name = (name or '').lower()
+    for fmt in FORMATS:
+        if name == fmt or name.endswith('.' + fmt) or name == CONTENT_TYPES[fmt]:
+            return fmt
+    if name.endswith('.jsonl') or name.endswith('jsonlines'):
+        return 'ndjson'
+    return None
+
+
+def read_templates(lines, fmt):
+    """Yield (source, template or RecordError) for every template in the input
+
+    ``source`` says where the record came from (``row 4`` or ``rows 2-5``) so
+    errors can be reported against the input file.
+    """
+    if fmt == 'csv':
+        yield from _read_csv(lines)
+    elif fmt == 'ndjson':
+        yield from _read_ndjson(lines)
+    elif fmt == 'json':
+        yield from _read_json(lines)
+    else:
+        raise ValueError(f'Unsupported format: {fmt}')
+
+
+def _read_ndjson(lines):
+    for line_number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        source = f'line {line_number}'
+        try:
+            record = serialization.loads(line)
+        except json.JSONDecodeError as e:
+            yield source, RecordError(f'Invalid JSON: {e.msg}')
+            continue
+        if not isinstance(record, dict):
+            yield source, RecordError('Each line must be a template object')
+            continue
+        yield source, record
+
+
+def _read_json(lines):
+    text = lines if isinstance(lines, str) else ''.join(lines)
+    try:
+        document = serialization.loads(text)
+    except json.JSONDecodeError as e:
+        yield 'document', RecordError(f'Invalid JSON: {e.msg}')
+        return
+    records = document.get('templates') if isinstance(document, dict) else document
+    if not isinstance(records, list):
+        yield 'document', RecordError('Expected an array of templates or {"templates": [...]}')
+        return
+    for index, record in enumerate(records):
+        source = f'item {index + 1}'
+        if isinstance(record, dict):
+            yield source, record
+        else:
+            yield source, RecordError('Each item must be a template object')
+
+
+def _read_csv(lines):
+    if isinstance(lines, str):
+        lines = io.StringIO(lines)
+    reader = csv.DictReader(lines)
+    missing = [field for field in ('course', 'subject', 'title') if field not in (reader.fieldnames or [])]
+    if missing:
+        yield 'header', RecordError(f"Missing column(s): {', '.join(missing)}")
+        return
+
+    group_key = None
+    template = None
+    first_row = last_row = 0
+    error = None
+    for row_number, row in enumerate(reader, start=2):
+        row = {field: (value or '').strip() for field, value in row.items() if field}
+        key = (row.get('course', ''), row.get('subject', ''), row.get('title', ''))
+        if key != group_key:
+            if template is not None:
+                yield _csv_source(first_row, last_row), error or template
+            group_key = key
+            template = {'course': key[0], 'subject': key[1], 'title': key[2], 'questions': []}
+            first_row = row_number
+            error = None
+        last_row = row_number
+        if error:
+            continue
+        try:
+            _add_csv_row(template, row)
+        except RecordError as e:
+            error = RecordError(f'row {row_number}: {e}')
+    if template is not None:
+        yield _csv_source(first_row, last_row), error or template
+
+
+def _csv_source(first_row, last_row):
+    return f'row {first_row}' if first_row == last_row else f'rows {first_row}-{last_row}'
+
+
+def _add_csv_row(template, row):
+    if row.get('sampling'):
+        try:
+            template['sampling'] = serialization.loads(row['sampling'])
+        except json.JSONDecodeError:
+            raise RecordError('sampling must be JSON')
+    if not row.get('question_text'):
+        if row.get('sampling'):
+            return
+        raise RecordError('question_text is required')
+    question = {'question_text': row['question_text']}
+    for field in ('question_type', 'example_answer'):
+        if row.get(field):
+            question[field] = row[field]
+    if row.get('options'):
+        question['options'] = [option.strip() for option in row['options'].split(OPTION_SEPARATOR)]
+    if row.get('correct_answer'):
+        try:
+            question['correct_answer'] = int(row['correct_answer'])
+        except ValueError:
+            raise RecordError('correct_answer must be the index of an option')
+    template['questions'].append(question)
+
+
+def export_record(template):
+    """Portable copy of a stored template, without ids and derived fields"""
+    record = {field: template[field] for field in TEMPLATE_FIELDS if template.get(field) is not None}
+    if 'questions' in record:
+        record['questions'] = [
+            {field: question[field] for field in QUESTION_FIELDS if question.get(field) not in (None, '')}
+            for question in record['questions']
+        ]
+    if record.get('sampling'):
+        record.pop('questions', None)
+    return record
+
+
+def write_templates(templates, fmt):
+    """Yield text chunks for stored templates; nothing is buffered beyond one template"""
+    if fmt == 'csv':
+        yield from _write_csv(templates)
+    elif fmt == 'ndjson':
+        for template in templates:
+            yield serialization.dumps(export_record(template)) + '\n'
+    elif fmt == 'json':
+        yield '{"templates": ['
+        separator = '\n'
+        for template in templates:
+            yield separator + serialization.dumps(export_record(template))
+            separator = ',\n'
+        yield '\n]}\n'
+    else:
+        raise ValueError(f'Unsupported format: {fmt}')
+
+
+def _write_csv(templates):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=CSV_FIELDS, lineterminator='\n')
+    writer.writeheader()
+    yield buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+    for template in templates:
+        record = export_record(template)
+        base = {'course': record.get('course', ''), 'subject': record.get('subject', ''), 'title': record.get('title', '')}
+        if record.get('sampling'):
+            writer.writerow(dict(base, sampling=serialization.dumps(record['sampling'])))
+        for question in record.get('questions', []):
+            row = dict(base)
+            row.update({field: question.get(field, '') for field in ('question_text', 'question_type', 'example_answer')})
+            if question.get('options'):
+                row['options'] = OPTION_SEPARATOR.join(str(option) for option in question['options'])
+            if question.get('correct_answer') is not None:
+                row['correct_answer'] = question['correct_answer']
+            writer.writerow(row)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
@@ -0,0 +1,159 @@
+"""
+Immutable, content-addressed template versions.
+
+Every template write records a snapshot of that version in the template
+versions table (key ``template_id`` + ``version``), in the same transaction as
+the template write, or before it for new templates, so no template version
+exists without its snapshot. A snapshot holds the
+template metadata and the list of its questions' content hashes. The questions
+themselves are stored once per distinct content in the question content table,
+keyed by ``content_hash``. Editing one question of a 50-question template
+therefore stores one new question and a small snapshot.
+
+Results record the ``template_version`` they were graded against, and
+``get_version`` rebuilds exactly that version. A snapshot whose question
+content is missing raises ``MissingContent`` rather than returning a shorter
+question list, which would no longer line up with answers by index. Snapshots never change once
+written, so the per-container cache needs no invalidation; it is only bounded.
+"""
+import hashlib
+import os
+from collections import OrderedDict
+from datetime import datetime
+
+from shared import aws
+from shared import serialization
+
+SNAPSHOT_FIELDS = ('title', 'subject', 'course', 'sampling')
+BATCH_GET_LIMIT = 100
+MAX_CACHED_VERSIONS = int(os.environ.get('TEMPLATE_VERSION_CACHE_SIZE', '256'))
+
+# (template_id, version) -> rebuilt template
+_versions = OrderedDict()
+
+
+class MissingContent(Exception):
+    """A snapshot names question content that is not in the question content table"""
+
+
+def question_hash(question):
+    """Content hash of a stored question, including its rubric"""
+    canonical = serialization.dumps(question, compact=True, sort_keys=True)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def _missing_hashes(hashes):
+    """Content hashes that are not stored yet"""
+    table_name = aws.table_name('question_content')
+    found = set()
+    hashes = list(hashes)
+    for start in range(0, len(hashes), BATCH_GET_LIMIT):
+        request = {table_name: {
+            'Keys': [{'content_hash': content_hash} for content_hash in hashes[start:start + BATCH_GET_LIMIT]],
+            'ProjectionExpression': 'content_hash'
+        }}
+        while request:
+            response = aws.resource('dynamodb').batch_get_item(RequestItems=request)
+            found.update(item['content_hash'] for item in response.get('Responses', {}).get(table_name, []))
+            request = response.get('UnprocessedKeys') or None
+    return [content_hash for content_hash in hashes if content_hash not in found]
+
+
+def snapshot(template):
+    """Snapshot item and {content_hash: question} for a template as it was just written"""
+    contents = {}
+    question_hashes = []
+    for question in template.get('questions', []):
+        content_hash = question_hash(question)
+        contents[content_hash] = question
+        question_hashes.append(content_hash)
+    item = {
+        'template_id': template['template_id'],
+        'version': int(template.get('version', 0)),
+        'question_hashes': question_hashes,
+        'created_at': template.get('updated_at') or datetime.utcnow().isoformat()
+    }
+    item.update({field: template[field] for field in SNAPSHOT_FIELDS if template.get(field) is not None})
+    return item, contents
+
+
+def store_contents(templates):
+    """Snapshot items for templates about to be written; stores question content they need that is missing
+
+    Question content is immutable and keyed by its hash, so writing it ahead
+    of the template is safe even if the template write then fails.
+    """
+    snapshots = []
+    contents = {}
+    for template in templates:
+        item, template_contents = snapshot(template)
+        snapshots.append(item)
+        contents.update(template_contents)
+
+    missing = _missing_hashes(contents) if contents else []
+    if missing:
+        with aws.table('question_content').batch_writer() as batch:
+            for content_hash in missing:
+                batch.put_item(Item={'content_hash': content_hash, 'question': contents[content_hash]})
+    return snapshots
+
+
+def snapshot_operation(item):
+    """aws.transact_write operation that records a snapshot, failing if that version is already recorded"""
+    return ('Put', 'versions', {'Item': item, 'ConditionExpression': 'attribute_not_exists(template_id)'})
+
+
+def record_new_versions(templates):
+    """Store snapshots of new templates before the templates themselves are written
+
+    For batch writes, which cannot share a transaction with the snapshots.
+    Template ids are fresh, so there is no earlier snapshot to protect.
+    """
+    snapshots = store_contents(templates)
+    with aws.table('versions').batch_writer() as batch:
+        for item in snapshots:
+            batch.put_item(Item=item)
+    return snapshots
+
+
+def _load_questions(question_hashes):
+    table_name = aws.table_name('question_content')
+    unique = list(dict.fromkeys(question_hashes))
+    questions = {}
+    for start in range(0, len(unique), BATCH_GET_LIMIT):
+        request = {table_name: {'Keys': [{'content_hash': content_hash} for content_hash in unique[start:start + BATCH_GET_LIMIT]]}}
+        while request:
+            response = aws.resource('dynamodb').batch_get_item(RequestItems=request)
+            for item in response.get('Responses', {}).get(table_name, []):
+                questions[item['content_hash']] = item['question']
+            request = response.get('UnprocessedKeys') or None
+    missing = [content_hash for content_hash in unique if content_hash not in questions]
+    if missing:
+        raise MissingContent(f"Question content {', '.join(missing)} is not stored")
+    return [questions[content_hash] for content_hash in question_hashes]
+
+
+def get_version(template_id, version):
+    """The template exactly as it was at a version, or None if no snapshot exists
+
+    Raises MissingContent when the snapshot exists but some of its questions do not.
+    """
+    key = (template_id, int(version))
+    cached = _versions.get(key)
+    if cached is not None:
+        _versions.move_to_end(key)
+        return cached
+
+    response = aws.table('versions').get_item(Key={'template_id': template_id, 'version': key[1]})
+    item = response.get('Item')
+    if not item:
+        return None
+    template = {field: item[field] for field in SNAPSHOT_FIELDS if field in item}
+    template['template_id'] = template_id
+    template['version'] = key[1]
+    template['questions'] = _load_questions(list(item.get('question_hashes', [])))
+
+    _versions[key] = template
+    while len(_versions) > MAX_CACHED_VERSIONS:
+        _versions.popitem(last=False)
+    return template
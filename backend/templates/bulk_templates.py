@@ -0,0 +1,74 @@
+"""
+Bulk import and export of quiz templates
+
+Usage:
+    python bulk_templates.py import questions.csv [--format csv] [--dry-run]
+    python bulk_templates.py export [--format ndjson] [--course C] [--subject S] [-o templates.ndjson]
+
+Import streams the file once, validates every template and writes the valid
+ones in batches; invalid rows are reported with their line or row numbers and
+do not stop the import. Export writes one template at a time, so it works for
+exports too large for GET /templates/export. See shared/template_io.py for the
+file formats.
+"""
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from shared import template_io
+import template_api
+
+def import_file(path, fmt=None, dry_run=False):
+    fmt = fmt or template_io.detect_format(path)
+    if not fmt:
+        sys.exit(f"Cannot tell the format of {path}; pass --format {'/'.join(template_io.FORMATS)}")
+
+    with open(path, encoding='utf-8-sig', newline='') as f:
+        records = template_io.read_templates(f, fmt)
+        summary = template_api.import_records(records, template_api.Template(), dry_run=dry_run)
+
+    for error in summary['errors']:
+        title = f" ({error['title']})" if error.get('title') else ''
+        print(f"✗ {error['source']}{title}: {error['message']}", file=sys.stderr)
+    action = 'Validated' if dry_run else 'Imported'
+    print(f"{action} {summary['imported']} template(s), {summary['failed']} failed")
+    return summary
+
+def export_file(output=None, fmt=None, course=None, subject=None):
+    fmt = fmt or template_io.detect_format(output or '') or 'ndjson'
+    templates = template_api.Template().scan_templates(course=course, subject=subject)
+
+    out = open(output, 'w', encoding='utf-8', newline='') if output else sys.stdout
+    try:
+        for chunk in template_io.write_templates(templates, fmt):
+            out.write(chunk)
+    finally:
+        if output:
+            out.close()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Bulk import and export of quiz templates')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    import_parser = commands.add_parser('import', help='Create templates from a CSV, JSON or NDJSON file')
+    import_parser.add_argument('path')
+    import_parser.add_argument('--format', choices=template_io.FORMATS)
+    import_parser.add_argument('--dry-run', action='store_true', help='Validate only, write nothing')
+    import_parser.add_argument('--json', action='store_true', help='Print the import summary as JSON')
+
+    export_parser = commands.add_parser('export', help='Write templates in an importable format')
+    export_parser.add_argument('-o', '--output', help='Output file (default: stdout)')
+    export_parser.add_argument('--format', choices=template_io.FORMATS)
+    export_parser.add_argument('--course')
+    export_parser.add_argument('--subject')
+
+    args = parser.parse_args()
+    if args.command == 'import':
+        summary = import_file(args.path, args.format, args.dry_run)
+        if args.json:
+            print(json.dumps(summary, indent=2))
+        sys.exit(1 if summary['failed'] else 0)
+    else:
+        export_file(args.output, args.format, args.course, args.subject)
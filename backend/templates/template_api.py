@@ -1,77 +1,441 @@
+import base64
 import json
-import boto3
 import uuid
 from datetime import datetime
-from decimal import Decimal
-
-# DynamoDB setup
-dynamodb = boto3.resource('dynamodb')
-
-# Helper function to convert Decimal to int/float for JSON serialization
-def decimal_to_number(obj):
-    if isinstance(obj, list):
-        return [decimal_to_number(i) for i in obj]
-    elif isinstance(obj, dict):
-        return {k: decimal_to_number(v) for k, v in obj.items()}
-    elif isinstance(obj, Decimal):
-        return int(obj) if obj % 1 == 0 else float(obj)
+from shared import auth
+from shared import aws
+from shared import metrics
+from shared import pagination
+from shared import profiling
+from shared import question_bank
+from shared import quiz_view
+from shared import rubrics
+from shared import serialization
+from shared import template_cache
+from shared import template_io
+from shared import template_versions
+
+# Listing fields stored on every write so GET /templates never reads questions
+SUMMARY_MAX_CHARS = 160
+LISTING_FIELDS = ('template_id', 'title', 'subject', 'course', 'question_count', 'summary',
+                  'created_at', 'updated_at', 'version', 'is_active')
+COURSE_INDEX = 'course-index'
+SUBJECT_INDEX = 'subject-index'
+
+def template_summary(template):
+    """Short description for the template list: the sampling spec or the first question"""
+    if template.get('sampling'):
+        summary = ', '.join(f"{rule['count']} {rule['difficulty']} {rule['topic']}" for rule in template['sampling'])
     else:
-        return obj
+        questions = template.get('questions') or [{}]
+        summary = ' '.join(str(questions[0].get('question_text', '')).split())
+    if len(summary) > SUMMARY_MAX_CHARS:
+        summary = summary[:SUMMARY_MAX_CHARS - 1].rstrip() + '\u2026'
+    return summary
+
+def attach_listing_fields(template):
+    """Store question_count and summary on a template item before it is written"""
+    if template.get('sampling'):
+        template['question_count'] = question_bank.sampled_question_count(template['sampling'])
+    else:
+        template['question_count'] = len(template.get('questions', []))
+    template['summary'] = template_summary(template)
+    return template
+
+# Diff-based updates
+PATCHABLE_FIELDS = ('title', 'subject', 'course', 'sampling')
+# Past this many changed questions a single SET of the whole list is the smaller update
+MAX_QUESTION_EDITS = 100
+
+class VersionConflict(Exception):
+    """The template changed since the client read it"""
+    def __init__(self, current_version):
+        super().__init__(f'Template is at version {current_version}')
+        self.current_version = current_version
+
+def diff_template(existing, changes):
+    """Return (sets, removes, merged) turning the existing template into the changed one
+
+    sets maps document paths to new values and removes lists paths to delete;
+    merged is the full template as it will be stored.
+    """
+    sets = {}
+    removes = []
+    merged = dict(existing)
+
+    for field in PATCHABLE_FIELDS:
+        if field not in changes or changes[field] == existing.get(field):
+            continue
+        if changes[field] is None:
+            if field in existing:
+                removes.append(field)
+            merged.pop(field, None)
+        else:
+            sets[field] = changes[field]
+            merged[field] = changes[field]
+
+    if 'questions' in changes:
+        old = existing.get('questions', [])
+        new = rubrics.attach_rubrics([dict(q) for q in changes['questions']], old)
+        changed = [i for i in range(min(len(old), len(new))) if old[i] != new[i]]
+        if not old or not new or len(changed) > MAX_QUESTION_EDITS:
+            if old != new:
+                sets['questions'] = new
+        else:
+            for i in changed:
+                sets[f'questions[{i}]'] = new[i]
+            # Setting an index past the end of a list appends to it
+            for i in range(len(old), len(new)):
+                sets[f'questions[{i}]'] = new[i]
+            removes.extend(f'questions[{i}]' for i in range(len(new), len(old)))
+        merged['questions'] = new
+
+    return sets, removes, merged
+
+def build_update_expression(sets, removes):
+    """UpdateExpression, names and values for document paths like 'questions[3]'"""
+    names = {}
+    values = {}
+    def placeholder(path):
+        attribute, _, index = path.partition('[')
+        name = '#' + attribute
+        names[name] = attribute
+        return name + ('[' + index if index else '')
+    set_clauses = []
+    for i, (path, value) in enumerate(sets.items()):
+        values[f':v{i}'] = value
+        set_clauses.append(f'{placeholder(path)} = :v{i}')
+    expression = 'SET ' + ', '.join(set_clauses)
+    if removes:
+        expression += ' REMOVE ' + ', '.join(placeholder(path) for path in removes)
+    return expression, names, values
 
 # Database Model
 class Template:
     def __init__(self):
-        table_name = 'msc-evaluate-templates-dev'
-        self.table = dynamodb.Table(table_name)
+        self.table = aws.table('templates')
     
-    def create_item(self, item):
+    def prepare_item(self, item):
+        """Add timestamps, version and every derived field to a new template item"""
         item['created_at'] = datetime.utcnow().isoformat()
         item['updated_at'] = datetime.utcnow().isoformat()
+        item['version'] = 1
+        attach_listing_fields(item)
+        # Sampled templates have no fixed question list, so their view is built per session
+        if not item.get('sampling'):
+            quiz_view.attach_quiz_view(item)
+        return item
+    
+    def create_item(self, item):
+        self.prepare_item(item)
+        template_versions.record_new_versions([item])
         self.table.put_item(Item=item)
+        template_cache.put(item)
         return item
     
+    def write_version(self, operation, params, template):
+        """Write a template and the snapshot of its new version in one transaction
+
+        Returns False when the template changed since it was read. Raises when
+        the template did not change but its new version already has a snapshot.
+        """
+        snapshot, = template_versions.store_contents([template])
+        try:
+            aws.transact_write([(operation, 'templates', params), template_versions.snapshot_operation(snapshot)])
+        except Exception as e:
+            if aws.error_code(e) != 'TransactionCanceledException':
+                raise
+            current = self.table.get_item(Key={'template_id': template['template_id']}, ConsistentRead=True).get('Item') or {}
+            if int(current.get('version', 0)) == template['version'] - 1:
+                raise RuntimeError(f"Template {template['template_id']} version {template['version']} is already recorded")
+            return False
+        return True
+    
+    def build_item(self, template):
+        """The new template item create_templates writes for a validated template, derived fields included"""
+        item = {
+            'template_id': str(uuid.uuid4()),
+            'title': template['title'],
+            'subject': template['subject'],
+            'course': template['course'],
+            'questions': rubrics.attach_rubrics(template.get('questions', [])),
+            'is_active': True
+        }
+        if template.get('sampling'):
+            item['sampling'] = template['sampling']
+        return self.prepare_item(item)
+    
+    def create_templates(self, items):
+        """Write many items from build_item through one batch writer; returns them"""
+        # Batch writes cannot be transactional, so the snapshots go first
+        template_versions.record_new_versions(items)
+        with self.table.batch_writer() as batch:
+            for item in items:
+                batch.put_item(Item=item)
+        return items
+    
+    def scan_templates(self, course=None, subject=None, page_size=100):
+        """Yield full templates page by page, optionally for one course and/or subject"""
+        kwargs = {'Limit': page_size}
+        filters = []
+        values = {}
+        if course:
+            filters.append('course = :course')
+            values[':course'] = course
+        if subject:
+            filters.append('subject = :subject')
+            values[':subject'] = subject
+        if filters:
+            kwargs['FilterExpression'] = ' AND '.join(filters)
+            kwargs['ExpressionAttributeValues'] = values
+        while True:
+            response = self.table.scan(**kwargs)
+            yield from response.get('Items', [])
+            if 'LastEvaluatedKey' not in response:
+                return
+            kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+    
     def get_item(self, key):
         response = self.table.get_item(Key=key)
         return response.get('Item')
     
-    def create_template(self, title, subject, course, questions):
+    def create_template(self, title, subject, course, questions, sampling=None):
         template_id = str(uuid.uuid4())
         template = {
             'template_id': template_id,
             'title': title,
             'subject': subject,
             'course': course,
-            'questions': questions,
+            'questions': rubrics.attach_rubrics(questions),
             'is_active': True
         }
+        if sampling:
+            template['sampling'] = sampling
         return self.create_item(template)
     
-    def update_template(self, template_id, title, subject, course, questions):
+    def update_template(self, template_id, title, subject, course, questions, sampling=None):
+        # Get existing created_at and rubrics, and bump the version so cached copies are revalidated
+        existing = self.get_item({'template_id': template_id})
         template = {
             'template_id': template_id,
             'title': title,
             'subject': subject,
             'course': course,
-            'questions': questions,
+            'questions': rubrics.attach_rubrics(questions, (existing or {}).get('questions', [])),
             'is_active': True,
             'updated_at': datetime.utcnow().isoformat()
         }
-        # Get existing created_at
-        existing = self.get_item({'template_id': template_id})
+        if sampling:
+            template['sampling'] = sampling
+        template['version'] = 1
+        condition = {'ConditionExpression': 'attribute_not_exists(template_id)'}
         if existing:
             template['created_at'] = existing.get('created_at')
-        self.table.put_item(Item=template)
+            template['version'] = int(existing.get('version', 0)) + 1
+            # Two writers must not both produce the same version
+            if 'version' in existing:
+                condition = {
+                    'ConditionExpression': '#version = :version',
+                    'ExpressionAttributeNames': {'#version': 'version'},
+                    'ExpressionAttributeValues': {':version': existing['version']}
+                }
+            else:
+                condition = {
+                    'ConditionExpression': 'attribute_not_exists(#version)',
+                    'ExpressionAttributeNames': {'#version': 'version'}
+                }
+        attach_listing_fields(template)
+        if not sampling:
+            quiz_view.attach_quiz_view(template)
+        if not self.write_version('Put', dict(condition, Item=template), template):
+            template_cache.invalidate(template_id)
+            current = self.get_item({'template_id': template_id}) or {}
+            raise VersionConflict(int(current.get('version', 0)))
+        template_cache.put(template)
         return template
     
+    def patch_template(self, template_id, changes, expected_version):
+        """Apply only the changed metadata and questions with one conditional update_item"""
+        existing = template_cache.get_template(template_id)
+        if existing and int(existing.get('version', 0)) != expected_version:
+            # The cached copy may be stale; only a consistent read can decide
+            existing = self.table.get_item(Key={'template_id': template_id}, ConsistentRead=True).get('Item')
+        if not existing:
+            return None
+        if int(existing.get('version', 0)) != expected_version:
+            raise VersionConflict(int(existing.get('version', 0)))
+
+        sets, removes, merged = diff_template(existing, changes)
+        if not sets and not removes:
+            return existing
+        error = validate_question_source(merged.get('questions'), merged.get('sampling'))
+        if error:
+            raise ValueError(error)
+
+        merged['version'] = expected_version + 1
+        merged['updated_at'] = datetime.utcnow().isoformat()
+        sets['version'] = merged['version']
+        sets['updated_at'] = merged['updated_at']
+        attach_listing_fields(merged)
+        for field in ('question_count', 'summary'):
+            if merged[field] != existing.get(field):
+                sets[field] = merged[field]
+        if merged.get('sampling'):
+            for field in ('quiz_view', 'quiz_etag'):
+                merged.pop(field, None)
+                if field in existing:
+                    removes.append(field)
+        else:
+            quiz_view.attach_quiz_view(merged)
+            sets['quiz_view'] = merged['quiz_view']
+            sets['quiz_etag'] = merged['quiz_etag']
+
+        expression, names, values = build_update_expression(sets, removes)
+        if expected_version:
+            condition = '#version = :expected_version'
+            values[':expected_version'] = expected_version
+        else:
+            # Templates written before versioning have no version attribute
+            condition = 'attribute_not_exists(#version)'
+        update = {
+            'Key': {'template_id': template_id},
+            'UpdateExpression': expression,
+            'ConditionExpression': condition,
+            'ExpressionAttributeNames': names,
+            'ExpressionAttributeValues': values
+        }
+        if not self.write_version('Update', update, merged):
+            template_cache.invalidate(template_id)
+            current = self.get_item({'template_id': template_id})
+            if not current:
+                return None
+            raise VersionConflict(int(current.get('version', 0)))
+        template_cache.put(merged)
+        return merged
+    
     def delete_template(self, template_id):
         self.table.delete_item(Key={'template_id': template_id})
+        template_cache.invalidate(template_id)
+
+class QuestionBank:
+    def __init__(self):
+        self.table = aws.table('questions')
+    
+    def create_questions(self, questions):
+        timestamp = datetime.utcnow().isoformat()
+        items = []
+        with self.table.batch_writer() as batch:
+            for question in rubrics.attach_rubrics(questions):
+                item = dict(question)
+                item['question_id'] = str(uuid.uuid4())
+                item['bank_key'] = question_bank.bank_key(item['course'], item['topic'], item['difficulty'])
+                item['created_at'] = timestamp
+                item['updated_at'] = timestamp
+                batch.put_item(Item=item)
+                items.append(item)
+        for key in {item['bank_key'] for item in items}:
+            question_bank.invalidate_pool(key)
+        return items
+    
+    def list_questions(self, course, topic, difficulty):
+        question_ids = question_bank.pool_ids(course, topic, difficulty)
+        return question_bank.get_questions(question_ids)
+    
+    def delete_question(self, question_id):
+        response = self.table.delete_item(Key={'question_id': question_id}, ReturnValues='ALL_OLD')
+        deleted = response.get('Attributes')
+        if deleted:
+            question_bank.invalidate_pool(deleted.get('bank_key'))
+        return deleted
+
+def validate_question_source(questions, sampling):
+    """A template needs either a fixed question list or a sampling spec"""
+    if sampling is not None:
+        if questions:
+            return 'A template cannot have both questions and sampling'
+        return question_bank.validate_sampling(sampling)
+    if not questions:
+        return 'At least one question is required'
+    return None
+
+# Bulk import and export
+IMPORT_CHUNK_SIZE = 100
+# Lambda proxy responses are limited to 6 MB; bigger exports go through bulk_templates.py
+EXPORT_MAX_BYTES = 5 * 1024 * 1024
+
+def validate_template_record(record):
+    """Return (template, None) for a valid import record, or (None, error message)"""
+    template = {}
+    for field in ('title', 'subject', 'course'):
+        value = record.get(field)
+        if not isinstance(value, str) or not value.strip():
+            return None, f'{field} is required'
+        template[field] = value.strip()
+    questions = record.get('questions') or []
+    sampling = record.get('sampling')
+    if not isinstance(questions, list):
+        return None, 'questions must be a list'
+    for i, question in enumerate(questions):
+        if not isinstance(question, dict) or not str(question.get('question_text', '')).strip():
+            return None, f'Question {i+1} must have question_text'
+    error = validate_question_source(questions, sampling)
+    if error:
+        return None, error
+    template['questions'] = [dict(question) for question in questions]
+    if sampling is not None:
+        template['sampling'] = sampling
+    return template, None
+
+def prepare_import_item(template, template_model):
+    """Return (item, None) with the item exactly as it will be written, or (None, error message)
+
+    The size is measured after rubrics and the quiz view are attached, so a
+    template that only outgrows the DynamoDB item limit once they are added is
+    reported on its own row instead of failing the batch it would be written in.
+    """
+    item = template_model.build_item(template)
+    size = aws.item_size(item)
+    if size > aws.ITEM_MAX_BYTES:
+        return None, (f'Template is {size // 1024} KB once rubrics and the quiz view are added; '
+                      f'the limit is {aws.ITEM_MAX_BYTES // 1024} KB')
+    return item, None
+
+def import_records(records, template_model, dry_run=False, chunk_size=IMPORT_CHUNK_SIZE):
+    """Validate and prepare (source, record) pairs in one pass and write valid ones in batches"""
+    summary = {'imported': 0, 'failed': 0, 'template_ids': [], 'errors': []}
+    pending = []
+    
+    def flush():
+        if not dry_run:
+            summary['template_ids'].extend(item['template_id'] for item in template_model.create_templates(pending))
+        summary['imported'] += len(pending)
+        pending.clear()
+    
+    for source, record in records:
+        if isinstance(record, template_io.RecordError):
+            template, error = None, str(record)
+        else:
+            template, error = validate_template_record(record)
+            if not error:
+                template, error = prepare_import_item(template, template_model)
+        if error:
+            summary['failed'] += 1
+            title = record.get('title') if isinstance(record, dict) else None
+            summary['errors'].append({'source': source, 'title': title, 'message': error})
+            continue
+        pending.append(template)
+        if len(pending) >= chunk_size:
+            flush()
+    if pending:
+        flush()
+    return summary
 
 def get_cors_headers():
     return {
         'Content-Type': 'application/json',
         'Access-Control-Allow-Origin': '*',
         'Access-Control-Allow-Headers': 'Content-Type,X-Amz-Date,Authorization,X-Api-Key,X-Amz-Security-Token',
-        'Access-Control-Allow-Methods': 'GET,POST,PUT,DELETE,OPTIONS'
+        'Access-Control-Allow-Methods': 'GET,POST,PUT,PATCH,DELETE,OPTIONS'
     }
 
 def handle_options(event, context):
@@ -85,11 +449,12 @@ def handle_options(event, context):
 def create_template(event, context):
     """POST /templates - Create a new template"""
     try:
-        body = json.loads(event['body'])
+        body = serialization.loads(event['body'])
         title = body.get('title', '').strip()
         subject = body.get('subject', '').strip()
         course = body.get('course', '').strip()
         questions = body.get('questions', [])
+        sampling = body.get('sampling')
         
         # Validate required fields
         if not title:
@@ -113,11 +478,12 @@ def create_template(event, context):
                 'body': json.dumps({'error': 'Validation Error', 'message': 'Course is required and cannot be empty'})
             }
         
-        if not questions:
+        error = validate_question_source(questions, sampling)
+        if error:
             return {
                 'statusCode': 400,
                 'headers': get_cors_headers(),
-                'body': json.dumps({'error': 'Validation Error', 'message': 'At least one question is required'})
+                'body': json.dumps({'error': 'Validation Error', 'message': error})
             }
         
         # Validate questions format
@@ -136,7 +502,8 @@ def create_template(event, context):
             title=title,
             subject=subject,
             course=course,
-            questions=questions
+            questions=questions,
+            sampling=sampling
         )
         
         return {
@@ -144,7 +511,8 @@ def create_template(event, context):
             'headers': get_cors_headers(),
             'body': json.dumps({
                 'template_id': template['template_id'],
-                'message': 'Template created successfully'
+                'message': 'Template created successfully',
+                'warnings': rubrics.truncation_warnings(template['questions'])
             })
         }
         
@@ -162,55 +530,66 @@ def create_template(event, context):
         }
 
 def get_templates(event, context):
-    """GET /templates - Get all templates with optional filtering"""
+    """GET /templates - List templates (listing fields only), optionally by subject and/or course"""
     try:
         query_params = event.get('queryStringParameters') or {}
         subject = query_params.get('subject')
         course = query_params.get('course')
         
-        table_name = 'msc-evaluate-templates-dev'
-        table = dynamodb.Table(table_name)
-        
-        # Build filter expression - only filter by is_active if it exists
-        filter_parts = []
-        expression_values = {}
+        table = aws.table('templates')
+        kwargs = pagination.page_kwargs(
+            query_params,
+            ProjectionExpression=', '.join('#' + field for field in LISTING_FIELDS),
+            ExpressionAttributeNames={'#' + field: field for field in LISTING_FIELDS}
+        )
         
-        if subject:
-            filter_parts.append('subject = :subject')
-            expression_values[':subject'] = subject
-            
+        # Filters are key conditions on the course/subject indexes, so no item is read and discarded
         if course:
-            filter_parts.append('course = :course')
-            expression_values[':course'] = course
-        
-        # Scan with optional filters
-        if filter_parts:
-            filter_expression = ' AND '.join(filter_parts)
-            response = table.scan(
-                FilterExpression=filter_expression,
-                ExpressionAttributeValues=expression_values
-            )
+            kwargs['IndexName'] = COURSE_INDEX
+            kwargs['KeyConditionExpression'] = '#course = :course'
+            kwargs['ExpressionAttributeValues'] = {':course': course}
+            if subject:
+                kwargs['KeyConditionExpression'] += ' AND #subject = :subject'
+                kwargs['ExpressionAttributeValues'][':subject'] = subject
+            response = table.query(**kwargs)
+        elif subject:
+            kwargs['IndexName'] = SUBJECT_INDEX
+            kwargs['KeyConditionExpression'] = '#subject = :subject'
+            kwargs['ExpressionAttributeValues'] = {':subject': subject}
+            response = table.query(**kwargs)
         else:
-            response = table.scan()
+            response = table.scan(**kwargs)
         
         templates = response.get('Items', [])
         
-        # Convert Decimal types to int/float for JSON serialization
-        templates = decimal_to_number(templates)
+        # Templates written before question_count was stored are read once in full
+        for i, template in enumerate(templates):
+            if 'question_count' not in template:
+                full = template_cache.get_template(template['template_id'])
+                if full:
+                    templates[i] = {field: value for field, value in attach_listing_fields(dict(full)).items()
+                                    if field in LISTING_FIELDS}
         
-        # Add question count to each template
-        for template in templates:
-            template['question_count'] = len(template.get('questions', []))
+        result = {
+            'templates': templates,
+            'count': len(templates)
+        }
+        next_token = pagination.encode_token(response.get('LastEvaluatedKey'))
+        if next_token:
+            result['next_token'] = next_token
         
         return {
             'statusCode': 200,
             'headers': get_cors_headers(),
-            'body': json.dumps({
-                'templates': templates,
-                'count': len(templates)
-            })
+            'body': serialization.dumps(result)
         }
         
+    except pagination.PageTokenError as e:
+        return {
+            'statusCode': 400,
+            'headers': get_cors_headers(),
+            'body': json.dumps({'error': 'Bad Request', 'message': str(e)})
+        }
     except Exception as e:
         print(f"Get templates error: {e}")
         return {
@@ -222,8 +601,42 @@ def get_templates(event, context):
             })
         }
 
-def get_template_by_id(event, context):
-    """GET /templates/{template_id} - Get a specific template by ID"""
+def get_template_filters(event, context):
+    """GET /templates/filters - Every course and subject that has a template, for the list filters"""
+    try:
+        table = aws.table('templates')
+        # The course index holds only listing fields, so this reads far less than a table scan
+        kwargs = {
+            'IndexName': COURSE_INDEX,
+            'ProjectionExpression': '#course, #subject',
+            'ExpressionAttributeNames': {'#course': 'course', '#subject': 'subject'}
+        }
+        courses, subjects = set(), set()
+        while True:
+            response = table.scan(**kwargs)
+            for item in response.get('Items', []):
+                courses.add(item['course'])
+                subjects.add(item['subject'])
+            if 'LastEvaluatedKey' not in response:
+                break
+            kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+        
+        return {
+            'statusCode': 200,
+            'headers': get_cors_headers(),
+            'body': json.dumps({'courses': sorted(courses), 'subjects': sorted(subjects)})
+        }
+        
+    except Exception as e:
+        print(f"Get template filters error: {e}")
+        return {
+            'statusCode': 500,
+            'headers': get_cors_headers(),
+            'body': json.dumps({'error': 'Internal Server Error', 'message': 'Unable to process request'})
+        }
+
+def get_template_by_id(event, context, staff=True):
+    """GET /templates/{template_id} - Get a specific template by ID; students get questions without answer keys"""
     try:
         template_id = event.get('pathParameters', {}).get('template_id')
         
@@ -234,8 +647,7 @@ def get_template_by_id(event, context):
                 'body': json.dumps({'error': 'Bad Request', 'message': 'template_id is required'})
             }
         
-        template_model = Template()
-        template = template_model.get_item({'template_id': template_id})
+        template = template_cache.get_template(template_id)
         
         if not template:
             return {
@@ -244,20 +656,20 @@ def get_template_by_id(event, context):
                 'body': json.dumps({'error': 'Not Found', 'message': 'Template not found'})
             }
         
-        # Convert Decimal types to int/float for JSON serialization
-        template = decimal_to_number(template)
-        
         return {
             'statusCode': 200,
             'headers': get_cors_headers(),
-            'body': json.dumps({
+            'body': serialization.dumps({
                 'template_id': template['template_id'],
                 'title': template['title'],
                 'subject': template['subject'],
                 'course': template['course'],
-                'questions': template['questions'],
+                'questions': template['questions'] if staff else [
+                    quiz_view.sanitize_question(question) for question in template['questions']
+                ],
                 'created_at': template.get('created_at'),
-                'updated_at': template.get('updated_at')
+                'updated_at': template.get('updated_at'),
+                'version': template.get('version')
             })
         }
         
@@ -280,35 +692,57 @@ def update_template(event, context):
                 'body': json.dumps({'error': 'Bad Request', 'message': 'template_id is required'})
             }
         
-        body = json.loads(event['body'])
+        body = serialization.loads(event['body'])
         title = body.get('title', '').strip()
         subject = body.get('subject', '').strip()
         course = body.get('course', '').strip()
         questions = body.get('questions', [])
+        sampling = body.get('sampling')
         
         # Validate required fields (same as create)
-        if not title or not subject or not course or not questions:
+        if not title or not subject or not course:
             return {
                 'statusCode': 400,
                 'headers': get_cors_headers(),
                 'body': json.dumps({'error': 'Validation Error', 'message': 'All fields are required'})
             }
         
+        error = validate_question_source(questions, sampling)
+        if error:
+            return {
+                'statusCode': 400,
+                'headers': get_cors_headers(),
+                'body': json.dumps({'error': 'Validation Error', 'message': error})
+            }
+        
         template_model = Template()
-        template = template_model.update_template(
-            template_id=template_id,
-            title=title,
-            subject=subject,
-            course=course,
-            questions=questions
-        )
+        try:
+            template = template_model.update_template(
+                template_id=template_id,
+                title=title,
+                subject=subject,
+                course=course,
+                questions=questions,
+                sampling=sampling
+            )
+        except VersionConflict as e:
+            return {
+                'statusCode': 409,
+                'headers': get_cors_headers(),
+                'body': json.dumps({
+                    'error': 'Conflict',
+                    'message': 'Template was modified while it was being saved; try again',
+                    'current_version': e.current_version
+                })
+            }
         
         return {
             'statusCode': 200,
             'headers': get_cors_headers(),
             'body': json.dumps({
                 'template_id': template['template_id'],
-                'message': 'Template updated successfully'
+                'message': 'Template updated successfully',
+                'warnings': rubrics.truncation_warnings(template['questions'])
             })
         }
         
@@ -326,6 +760,201 @@ def update_template(event, context):
             'body': json.dumps({'error': 'Internal Server Error', 'message': 'Unable to process request'})
         }
 
+def patch_template(event, context):
+    """PATCH /templates/{template_id} - Apply changed fields only, guarded by the template version"""
+    try:
+        template_id = event.get('pathParameters', {}).get('template_id')
+        
+        if not template_id:
+            return {
+                'statusCode': 400,
+                'headers': get_cors_headers(),
+                'body': json.dumps({'error': 'Bad Request', 'message': 'template_id is required'})
+            }
+        
+        body = serialization.loads(event['body'])
+        expected_version = body.get('version')
+        if not isinstance(expected_version, int) or isinstance(expected_version, bool):
+            return {
+                'statusCode': 400,
+                'headers': get_cors_headers(),
+                'body': json.dumps({'error': 'Validation Error', 'message': 'version of the template being edited is required'})
+            }
+        
+        changes = {}
+        for field in ('title', 'subject', 'course'):
+            if field in body:
+                value = body[field].strip() if isinstance(body[field], str) else ''
+                if not value:
+                    return {
+                        'statusCode': 400,
+                        'headers': get_cors_headers(),
+                        'body': json.dumps({'error': 'Validation Error', 'message': f'{field.capitalize()} cannot be empty'})
+                    }
+                changes[field] = value
+        for field in ('questions', 'sampling'):
+            if field in body:
+                changes[field] = body[field]
+        if changes.get('questions') is None and 'questions' in changes:
+            changes['questions'] = []
+        
+        for i, question in enumerate(changes.get('questions', [])):
+            if not isinstance(question, dict) or not str(question.get('question_text', '')).strip():
+                return {
+                    'statusCode': 400,
+                    'headers': get_cors_headers(),
+                    'body': json.dumps({'error': 'Validation Error', 'message': f'Question {i+1} must have question_text'})
+                }
+        
+        if changes.get('sampling') is not None:
+            error = question_bank.validate_sampling(changes['sampling'])
+            if error:
+                return {
+                    'statusCode': 400,
+                    'headers': get_cors_headers(),
+                    'body': json.dumps({'error': 'Validation Error', 'message': error})
+                }
+        
+        template_model = Template()
+        try:
+            template = template_model.patch_template(template_id, changes, expected_version)
+        except ValueError as e:
+            return {
+                'statusCode': 400,
+                'headers': get_cors_headers(),
+                'body': json.dumps({'error': 'Validation Error', 'message': str(e)})
+            }
+        except VersionConflict as e:
+            return {
+                'statusCode': 409,
+                'headers': get_cors_headers(),
+                'body': json.dumps({
+                    'error': 'Conflict',
+                    'message': 'Template was modified by someone else; reload it and try again',
+                    'current_version': e.current_version
+                })
+            }
+        
+        if not template:
+            return {
+                'statusCode': 404,
+                'headers': get_cors_headers(),
+                'body': json.dumps({'error': 'Not Found', 'message': 'Template not found'})
+            }
+        
+        return {
+            'statusCode': 200,
+            'headers': get_cors_headers(),
+            'body': json.dumps({
+                'template_id': template['template_id'],
+                'version': int(template.get('version', 0)),
+                'message': 'Template updated successfully',
+                'warnings': rubrics.truncation_warnings(template.get('questions', []))
+            })
+        }
+        
+    except json.JSONDecodeError:
+        return {
+            'statusCode': 400,
+            'headers': get_cors_headers(),
+            'body': json.dumps({'error': 'Invalid JSON', 'message': 'Request body must be valid JSON'})
+        }
+    except Exception as e:
+        print(f"Patch template error: {e}")
+        return {
+            'statusCode': 500,
+            'headers': get_cors_headers(),
+            'body': json.dumps({'error': 'Internal Server Error', 'message': 'Unable to process request'})
+        }
+
+def import_templates(event, context):
+    """POST /templates/import?format=csv|json|ndjson - Create many templates from one file"""
+    try:
+        query_params = event.get('queryStringParameters') or {}
+        headers = {name.lower(): value for name, value in (event.get('headers') or {}).items()}
+        fmt = template_io.detect_format(query_params.get('format') or headers.get('content-type', '').split(';')[0])
+        
+        if not fmt:
+            return {
+                'statusCode': 400,
+                'headers': get_cors_headers(),
+                'body': json.dumps({'error': 'Bad Request', 'message': f"format must be one of: {', '.join(template_io.FORMATS)}"})
+            }
+        
+        body = event.get('body') or ''
+        if event.get('isBase64Encoded'):
+            body = base64.b64decode(body).decode('utf-8-sig')
+        dry_run = query_params.get('dry_run', '').lower() in ('1', 'true', 'yes')
+        
+        records = template_io.read_templates(body.splitlines(keepends=True), fmt)
+        summary = import_records(records, Template(), dry_run=dry_run)
+        summary['dry_run'] = dry_run
+        
+        if summary['imported']:
+            status_code = 200 if dry_run else 201
+        else:
+            status_code = 400 if summary['failed'] else 200
+        
+        return {
+            'statusCode': status_code,
+            'headers': get_cors_headers(),
+            'body': json.dumps(summary)
+        }
+        
+    except Exception as e:
+        print(f"Import templates error: {e}")
+        return {
+            'statusCode': 500,
+            'headers': get_cors_headers(),
+            'body': json.dumps({'error': 'Internal Server Error', 'message': 'Unable to process request'})
+        }
+
+def export_templates(event, context):
+    """GET /templates/export?format=csv|json|ndjson - Download templates in an importable format"""
+    try:
+        query_params = event.get('queryStringParameters') or {}
+        fmt = template_io.detect_format(query_params.get('format') or 'ndjson')
+        
+        if not fmt:
+            return {
+                'statusCode': 400,
+                'headers': get_cors_headers(),
+                'body': json.dumps({'error': 'Bad Request', 'message': f"format must be one of: {', '.join(template_io.FORMATS)}"})
+            }
+        
+        templates = Template().scan_templates(course=query_params.get('course'), subject=query_params.get('subject'))
+        chunks = []
+        size = 0
+        for chunk in template_io.write_templates(templates, fmt):
+            size += len(chunk)
+            if size > EXPORT_MAX_BYTES:
+                return {
+                    'statusCode': 413,
+                    'headers': get_cors_headers(),
+                    'body': json.dumps({
+                        'error': 'Payload Too Large',
+                        'message': 'Export is too large for one response; filter by course or use bulk_templates.py export'
+                    })
+                }
+            chunks.append(chunk)
+        
+        headers = get_cors_headers()
+        headers['Content-Type'] = template_io.CONTENT_TYPES[fmt]
+        headers['Content-Disposition'] = f'attachment; filename="templates.{fmt}"'
+        return {
+            'statusCode': 200,
+            'headers': headers,
+            'body': ''.join(chunks)
+        }
+        
+    except Exception as e:
+        print(f"Export templates error: {e}")
+        return {
+            'statusCode': 500,
+            'headers': get_cors_headers(),
+            'body': json.dumps({'error': 'Internal Server Error', 'message': 'Unable to process request'})
+        }
+
 def delete_template(event, context):
     """DELETE /templates/{template_id} - Delete a template"""
     try:
@@ -357,6 +986,124 @@ def delete_template(event, context):
             'body': json.dumps({'error': 'Internal Server Error', 'message': 'Unable to process request'})
         }
 
+def create_bank_questions(event, context):
+    """POST /questions - Add one or more questions to the question bank"""
+    try:
+        body = serialization.loads(event['body'])
+        questions = body['questions'] if isinstance(body.get('questions'), list) else [body]
+        
+        if not questions:
+            return {
+                'statusCode': 400,
+                'headers': get_cors_headers(),
+                'body': json.dumps({'error': 'Validation Error', 'message': 'At least one question is required'})
+            }
+        
+        for i, question in enumerate(questions):
+            for field in ('course', 'topic', 'difficulty', 'question_text'):
+                value = question.get(field) if isinstance(question, dict) else None
+                if not isinstance(value, str) or not value.strip():
+                    return {
+                        'statusCode': 400,
+                        'headers': get_cors_headers(),
+                        'body': json.dumps({'error': 'Validation Error', 'message': f'Question {i+1} must have {field}'})
+                    }
+        
+        items = QuestionBank().create_questions(questions)
+        
+        return {
+            'statusCode': 201,
+            'headers': get_cors_headers(),
+            'body': json.dumps({
+                'question_ids': [item['question_id'] for item in items],
+                'message': f'{len(items)} question(s) added to the bank',
+                'warnings': rubrics.truncation_warnings(items)
+            })
+        }
+        
+    except json.JSONDecodeError:
+        return {
+            'statusCode': 400,
+            'headers': get_cors_headers(),
+            'body': json.dumps({'error': 'Invalid JSON', 'message': 'Request body must be valid JSON'})
+        }
+    except Exception as e:
+        print(f"Create bank questions error: {e}")
+        return {
+            'statusCode': 500,
+            'headers': get_cors_headers(),
+            'body': json.dumps({'error': 'Internal Server Error', 'message': 'Unable to process request'})
+        }
+
+def list_bank_questions(event, context):
+    """GET /questions?course=&topic=&difficulty= - List one pool of the question bank"""
+    try:
+        query_params = event.get('queryStringParameters') or {}
+        course = query_params.get('course')
+        topic = query_params.get('topic')
+        difficulty = query_params.get('difficulty')
+        
+        if not course or not topic or not difficulty:
+            return {
+                'statusCode': 400,
+                'headers': get_cors_headers(),
+                'body': json.dumps({'error': 'Bad Request', 'message': 'course, topic and difficulty are required'})
+            }
+        
+        questions = QuestionBank().list_questions(course, topic, difficulty)
+        
+        return {
+            'statusCode': 200,
+            'headers': get_cors_headers(),
+            'body': serialization.dumps({
+                'questions': questions,
+                'count': len(questions)
+            })
+        }
+        
+    except Exception as e:
+        print(f"List bank questions error: {e}")
+        return {
+            'statusCode': 500,
+            'headers': get_cors_headers(),
+            'body': json.dumps({'error': 'Internal Server Error', 'message': 'Unable to process request'})
+        }
+
+def delete_bank_question(event, context):
+    """DELETE /questions/{question_id} - Remove a question from the bank"""
+    try:
+        question_id = (event.get('pathParameters') or {}).get('question_id')
+        
+        if not question_id:
+            return {
+                'statusCode': 400,
+                'headers': get_cors_headers(),
+                'body': json.dumps({'error': 'Bad Request', 'message': 'question_id is required'})
+            }
+        
+        if not QuestionBank().delete_question(question_id):
+            return {
+                'statusCode': 404,
+                'headers': get_cors_headers(),
+                'body': json.dumps({'error': 'Not Found', 'message': 'Question not found'})
+            }
+        
+        return {
+            'statusCode': 200,
+            'headers': get_cors_headers(),
+            'body': json.dumps({'message': 'Question deleted successfully'})
+        }
+        
+    except Exception as e:
+        print(f"Delete bank question error: {e}")
+        return {
+            'statusCode': 500,
+            'headers': get_cors_headers(),
+            'body': json.dumps({'error': 'Internal Server Error', 'message': 'Unable to process request'})
+        }
+
+@metrics.instrument('template_api')
+@profiling.profiled('template_api')
 def lambda_handler(event, context):
     """Main Lambda handler - routes requests based on HTTP method and path"""
     http_method = event.get('httpMethod', '')
@@ -366,19 +1113,51 @@ def lambda_handler(event, context):
     if http_method == 'OPTIONS':
         return handle_options(event, context)
 
+    # Any signed-in user can read templates; writes, bulk transfer and the question bank need staff
+    reading = http_method == 'GET' and path.startswith('/templates') and not path.endswith('/templates/export')
+    try:
+        claims = auth.authenticate(event, roles=None if reading else auth.STAFF_ROLES)
+    except auth.AuthError as e:
+        return {
+            'statusCode': e.status_code,
+            'headers': get_cors_headers(),
+            'body': json.dumps({'error': 'Unauthorized' if e.status_code == 401 else 'Forbidden', 'message': e.message})
+        }
+
     # Route based on method and path
-    if http_method == 'POST' and path == '/templates':
+    if http_method == 'POST' and path == '/questions':
+        return create_bank_questions(event, context)
+
+    elif http_method == 'GET' and path == '/questions':
+        return list_bank_questions(event, context)
+
+    elif http_method == 'DELETE' and '/questions/' in path:
+        return delete_bank_question(event, context)
+
+    elif http_method == 'POST' and path == '/templates':
         return create_template(event, context)
 
+    elif http_method == 'POST' and path.endswith('/templates/import'):
+        return import_templates(event, context)
+
+    elif http_method == 'GET' and path.endswith('/templates/export'):
+        return export_templates(event, context)
+
     elif http_method == 'GET' and path == '/templates':
         return get_templates(event, context)
 
+    elif http_method == 'GET' and path.endswith('/templates/filters'):
+        return get_template_filters(event, context)
+
     elif http_method == 'GET' and '/templates/' in path:
-        return get_template_by_id(event, context)
+        return get_template_by_id(event, context, staff=claims.get('role') in auth.STAFF_ROLES)
 
     elif http_method == 'PUT' and '/templates/' in path:
         return update_template(event, context)
 
+    elif http_method == 'PATCH' and '/templates/' in path:
+        return patch_template(event, context)
+
     elif http_method == 'DELETE' and '/templates/' in path:
         return delete_template(event, context)
 
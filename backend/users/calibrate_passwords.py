@@ -0,0 +1,85 @@
+"""
+Choose the scrypt cost for password hashing
+
+Usage:
+    python calibrate_passwords.py                          # 60 ms target, 1024 MB function
+    python calibrate_passwords.py --target-ms 80 --memory-mb 2048
+    python calibrate_passwords.py --cpu-share 1            # running inside the function itself
+
+Times one password verification for increasing scrypt N and picks the largest
+N whose median stays within the target on the function's memory size. Lambda
+gives a function CPU in proportion to its memory (one full vCPU at 1,769 MB),
+so local timings are scaled by that share unless --cpu-share is given. N is
+also capped so one hash uses at most a quarter of the function's memory.
+Print the result as the PASSWORD_SCRYPT_N/_R/_P environment variables for the
+users function; existing hashes move to the new cost on each user's next login.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from shared import passwords
+
+LAMBDA_MB_PER_VCPU = 1769
+MIN_LOG2_N = 10
+MAX_LOG2_N = 20
+
+def time_verify(n, r, p, samples):
+    """Median milliseconds to verify one password at this cost"""
+    stored = passwords.hash_password('calibration-password', n=n, r=r, p=p)
+    timings = []
+    for _ in range(samples):
+        start = time.perf_counter()
+        passwords.verify_password('calibration-password', stored)
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+def calibrate(target_ms, memory_mb, r=8, p=1, samples=5, cpu_share=None):
+    """Return (chosen n, rows) where rows hold the timing of every N tried"""
+    cpu_share = cpu_share or min(1.0, memory_mb / LAMBDA_MB_PER_VCPU)
+    memory_limit = memory_mb * 1024 * 1024 // 4
+    chosen = None
+    rows = []
+    for log2_n in range(MIN_LOG2_N, MAX_LOG2_N + 1):
+        n = 2 ** log2_n
+        memory = passwords.scrypt_memory(n, r)
+        if memory > memory_limit:
+            rows.append({'n': n, 'memory_mb': memory / 2 ** 20, 'local_ms': None, 'lambda_ms': None, 'fits': False})
+            break
+        local_ms = time_verify(n, r, p, samples)
+        lambda_ms = local_ms / cpu_share
+        fits = lambda_ms <= target_ms
+        rows.append({'n': n, 'memory_mb': memory / 2 ** 20, 'local_ms': local_ms, 'lambda_ms': lambda_ms, 'fits': fits})
+        if fits:
+            chosen = n
+        elif lambda_ms > 2 * target_ms:
+            break
+    return chosen, rows
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Choose the scrypt cost for password hashing')
+    parser.add_argument('--target-ms', type=float, default=60, help='Verify time budget per login')
+    parser.add_argument('--memory-mb', type=int, default=1024, help='Memory size of the users function')
+    parser.add_argument('--cpu-share', type=float, help='CPU share to scale local timings by (default: from --memory-mb)')
+    parser.add_argument('-r', type=int, default=passwords.SCRYPT_R, help='scrypt block size')
+    parser.add_argument('-p', type=int, default=passwords.SCRYPT_P, help='scrypt parallelism')
+    parser.add_argument('--samples', type=int, default=5)
+    args = parser.parse_args()
+
+    chosen, rows = calibrate(args.target_ms, args.memory_mb, args.r, args.p, args.samples, args.cpu_share)
+    print(f"{'N':>9} {'memory MB':>10} {'local ms':>9} {'lambda ms':>10}")
+    for row in rows:
+        if row['local_ms'] is None:
+            print(f"{row['n']:>9} {row['memory_mb']:>10.1f} {'over the memory cap':>20}")
+        else:
+            mark = '  within target' if row['fits'] else ''
+            print(f"{row['n']:>9} {row['memory_mb']:>10.1f} {row['local_ms']:>9.1f} {row['lambda_ms']:>10.1f}{mark}")
+
+    if chosen is None:
+        sys.exit(f"No scrypt cost verifies within {args.target_ms} ms; raise --target-ms or the memory size")
+    print(f"\nPASSWORD_SCRYPT_N={chosen}")
+    print(f"PASSWORD_SCRYPT_R={args.r}")
+    print(f"PASSWORD_SCRYPT_P={args.p}")
@@ -1,15 +1,28 @@
 """
 Script to initialize the users table with default users
 Run this after deploying the infrastructure
+
+    python init_users.py [users-table]
+    python init_users.py --claim-usernames    # claim usernames of existing users
+    python init_users.py --roster students.csv [--dry-run] [--json]
 """
-import boto3
+import argparse
+import json
+import os
+import sys
 import uuid
 from datetime import datetime
 
-def init_users(table_name='msc-evaluate-users-dev'):
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from shared import aws
+from shared import passwords
+import user_crud
+
+def init_users(table_name=None):
     """Initialize users table with default users"""
-    dynamodb = boto3.resource('dynamodb')
-    table = dynamodb.Table(table_name)
+    if table_name:
+        os.environ['USERS_TABLE'] = table_name
+    table_name = aws.table_name('users')
     
     timestamp = datetime.utcnow().isoformat()
     
@@ -17,7 +30,7 @@ def init_users(table_name='msc-evaluate-users-dev'):
         {
             'user_id': str(uuid.uuid4()),
             'username': 'admin',
-            'password': 'admin123',  # In production, hash this!
+            'password': passwords.hash_password('admin123'),
             'email': 'admin@example.com',
             'role': 'admin',
             'full_name': 'System Administrator',
@@ -28,7 +41,7 @@ def init_users(table_name='msc-evaluate-users-dev'):
         {
             'user_id': str(uuid.uuid4()),
             'username': 'student',
-            'password': 'student123',
+            'password': passwords.hash_password('student123'),
             'email': 'student@example.com',
             'role': 'student',
             'full_name': 'Demo Student',
@@ -39,7 +52,7 @@ def init_users(table_name='msc-evaluate-users-dev'):
         {
             'user_id': str(uuid.uuid4()),
             'username': 'tutor',
-            'password': 'tutor123',
+            'password': passwords.hash_password('tutor123'),
             'email': 'tutor@example.com',
             'role': 'tutor',
             'full_name': 'Demo Tutor',
@@ -53,9 +66,12 @@ def init_users(table_name='msc-evaluate-users-dev'):
     
     for user in default_users:
         try:
-            table.put_item(Item=user)
+            aws.transact_write(user_crud.user_write_operations(user))
             print(f"✓ Created user: {user['username']} ({user['role']})")
         except Exception as e:
+            if aws.error_code(e) == 'TransactionCanceledException':
+                print(f"- Skipped user {user['username']}: username already exists")
+                continue
             print(f"✗ Failed to create user {user['username']}: {str(e)}")
     
     print("\nDefault users created successfully!")
@@ -64,7 +80,72 @@ def init_users(table_name='msc-evaluate-users-dev'):
     print("  Tutor:   tutor / tutor123")
     print("  Student: student / student123")
 
+def claim_usernames():
+    """Write username claims for users created before the usernames table existed"""
+    claimed = duplicates = 0
+    scan_kwargs = {'ProjectionExpression': 'user_id, username, created_at'}
+    while True:
+        response = aws.table('users').scan(**scan_kwargs)
+        for user in response.get('Items', []):
+            claim = {'username': user['username'], 'user_id': user['user_id'],
+                     'created_at': user.get('created_at') or datetime.utcnow().isoformat()}
+            try:
+                aws.table('usernames').put_item(
+                    Item=claim,
+                    ConditionExpression='attribute_not_exists(username) OR user_id = :user_id',
+                    ExpressionAttributeValues={':user_id': user['user_id']}
+                )
+                claimed += 1
+            except Exception as e:
+                if aws.error_code(e) != 'ConditionalCheckFailedException':
+                    raise
+                duplicates += 1
+                print(f"✗ Username {user['username']} of user {user['user_id']} is already claimed by another user")
+        if 'LastEvaluatedKey' not in response:
+            break
+        scan_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+    print(f"Claimed {claimed} username(s), {duplicates} duplicate(s)")
+    if duplicates:
+        print("Resolve the duplicates and run again; until then new usernames are also checked against existing users")
+    else:
+        # Lets user_crud stop checking new usernames against the username index
+        aws.table('usernames').put_item(Item={'username': user_crud.LEGACY_CLAIMS_DONE,
+                                              'created_at': datetime.utcnow().isoformat()})
+    return claimed, duplicates
+
+def import_roster_file(path, fmt=None, dry_run=False):
+    """Import users from a CSV or JSON roster file"""
+    fmt = fmt or ('csv' if path.lower().endswith('.csv') else 'json')
+    with open(path, encoding='utf-8-sig', newline='') as f:
+        rows = user_crud.read_roster(f.read(), fmt)
+    
+    summary = user_crud.import_roster(rows, dry_run=dry_run)
+    for entry in summary['rows']:
+        if entry['status'] == 'error':
+            username = f" ({entry['username']})" if entry.get('username') else ''
+            print(f"✗ {entry['source']}{username}: {entry['message']}", file=sys.stderr)
+    action = 'Validated' if dry_run else 'Imported'
+    print(f"{action} {summary['imported']} user(s), {summary['failed']} failed")
+    return summary
+
 if __name__ == '__main__':
-    import sys
-    table_name = sys.argv[1] if len(sys.argv) > 1 else 'msc-evaluate-users-dev'
-    init_users(table_name)
+    parser = argparse.ArgumentParser(description='Initialize the users table')
+    parser.add_argument('table_name', nargs='?', help='Users table (default: USERS_TABLE or the stack name)')
+    parser.add_argument('--claim-usernames', action='store_true',
+                        help='Claim the usernames of existing users instead of creating default users')
+    parser.add_argument('--roster', metavar='FILE', help='Import users from a CSV or JSON roster instead')
+    parser.add_argument('--format', choices=user_crud.ROSTER_FORMATS, help='Roster format (default: from the file name)')
+    parser.add_argument('--dry-run', action='store_true', help='Validate the roster only, write nothing')
+    parser.add_argument('--json', action='store_true', help='Print the roster import report as JSON')
+    args = parser.parse_args()
+    if args.table_name and (args.claim_usernames or args.roster):
+        os.environ['USERS_TABLE'] = args.table_name
+    if args.roster:
+        summary = import_roster_file(args.roster, args.format, args.dry_run)
+        if args.json:
+            print(json.dumps(summary, indent=2))
+        sys.exit(1 if summary['failed'] else 0)
+    elif args.claim_usernames:
+        claim_usernames()
+    else:
+        init_users(args.table_name)
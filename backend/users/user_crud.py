@@ -1,37 +1,54 @@
+import base64
+import csv
+import io
 import json
-import boto3
-import os
+import time
 import uuid
 from datetime import datetime
-from decimal import Decimal
+from shared import auth
+from shared import aws
+from shared import metrics
+from shared import pagination
+from shared import passwords
+from shared import profiling
+from shared import serialization
 
-dynamodb = boto3.resource('dynamodb')
-users_table = dynamodb.Table(os.environ.get('USERS_TABLE', 'msc-evaluate-users-dev'))
+USERNAME_INDEX = 'username-index'
+# Users by role, sorted by username; projects everything except credentials
+ROLE_INDEX = 'role-index'
+LISTING_FIELDS = ('user_id', 'username', 'email', 'role', 'full_name', 'is_active', 'created_at', 'updated_at')
+VALID_ROLES = ['admin', 'tutor', 'student']
 
-def decimal_default(obj):
-    """Helper to serialize Decimal objects"""
-    if isinstance(obj, Decimal):
-        return float(obj)
-    raise TypeError
+# Roster import
+ROSTER_FORMATS = ('csv', 'json')
+ROSTER_FIELDS = ('username', 'password', 'email', 'role', 'full_name', 'is_active')
+IMPORT_MAX_USERS = 5000
+BATCH_GET_LIMIT = 100
+# A user and its username claim are written in the same BatchWriteItem call (25 items at most)
+IMPORT_USERS_PER_BATCH = 12
+BATCH_WRITE_ATTEMPTS = 6
+BATCH_RETRY_DELAY = 0.05
+# Passwords are hashed at the full login cost, so a large roster takes several requests: each stops
+# within API Gateway's 29 s integration timeout and returns next_start for the next one
+IMPORT_TIME_BUDGET = 25
+# Time kept back for the last batch (12 hashes and one write) once the budget is spent
+IMPORT_TIME_MARGIN = 3
+
+# Written to the usernames table by init_users.py --claim-usernames once every user created before
+# claims existed has one; usernames are lowercased, so no claim can collide with it
+LEGACY_CLAIMS_DONE = 'MIGRATION#legacy-claims'
+_legacy_claims_done = False
 
 def verify_admin(event):
-    """Verify that the request is from an admin user"""
-    headers = event.get('headers', {})
-    # Check for user role in headers (set by frontend after login)
-    user_role = headers.get('X-User-Role', headers.get('x-user-role', ''))
-    
-    if user_role != 'admin':
-        return False, {
-            'statusCode': 403,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Headers': 'Content-Type,X-User-Role',
-                'Access-Control-Allow-Methods': 'GET,POST,PUT,DELETE,OPTIONS'
-            },
-            'body': json.dumps({'error': 'Forbidden: Admin access required'})
-        }
+    """Verify that the request carries a valid session token of an admin user"""
+    try:
+        auth.authenticate(event, roles=('admin',))
+    except auth.AuthError as e:
+        return False, error_response(e.status_code, e.message)
     return True, None
 
+@metrics.instrument('user_crud')
+@profiling.profiled('user_crud')
 def lambda_handler(event, context):
     """
     Handle user CRUD operations
@@ -41,6 +58,7 @@ def lambda_handler(event, context):
     - POST /users - Create new user (Admin only)
     - PUT /users/{user_id} - Update user (Admin only)
     - DELETE /users/{user_id} - Delete user (Admin only)
+    - POST /users/import - Import a roster from CSV or JSON (Admin only)
     - POST /users/login - Login (Public)
     """
     
@@ -53,9 +71,9 @@ def lambda_handler(event, context):
         return handle_login(event)
     
     # All other endpoints require admin access
-    is_admin, error_response = verify_admin(event)
+    is_admin, auth_error = verify_admin(event)
     if not is_admin:
-        return error_response
+        return auth_error
     
     try:
         if http_method == 'GET':
@@ -65,6 +83,8 @@ def lambda_handler(event, context):
                 return list_users(event)
         
         elif http_method == 'POST':
+            if path.rstrip('/').endswith('/users/import'):
+                return import_users(event, context)
             return create_user(event)
         
         elif http_method == 'PUT':
@@ -86,6 +106,59 @@ def lambda_handler(event, context):
         print(f"Error: {str(e)}")
         return error_response(500, f'Internal server error: {str(e)}')
 
+def find_user_by_username(username):
+    """Look up a user through the username index; reads one item however many users exist"""
+    response = aws.table('users').query(
+        IndexName=USERNAME_INDEX,
+        KeyConditionExpression='username = :username',
+        ExpressionAttributeValues={':username': username}
+    )
+    users = response.get('Items', [])
+    return users[0] if users else None
+
+def legacy_claims_done():
+    """Whether every existing user has a username claim; cached once it is true"""
+    global _legacy_claims_done
+    if not _legacy_claims_done:
+        response = aws.table('usernames').get_item(Key={'username': LEGACY_CLAIMS_DONE})
+        _legacy_claims_done = 'Item' in response
+    return _legacy_claims_done
+
+def legacy_usernames(usernames):
+    """Usernames held by users that have no claim yet, found through the username index
+
+    Until the claim backfill has run, a user created before the usernames table
+    existed is invisible to the claim condition, so its username is checked here.
+    """
+    if not usernames or legacy_claims_done():
+        return set()
+    return {username for username in usernames if find_user_by_username(username)}
+
+def user_write_operations(user):
+    """Transaction writes that create a user together with the claim on its username
+
+    The usernames table holds one item per username; ``attribute_not_exists``
+    on the claim makes a duplicate username cancel the transaction, so no
+    pre-read is needed and two concurrent creates cannot both succeed.
+    """
+    claim = {'username': user['username'], 'user_id': user['user_id'], 'created_at': user['created_at']}
+    return [
+        ('Put', 'users', {'Item': user, 'ConditionExpression': 'attribute_not_exists(user_id)'}),
+        ('Put', 'usernames', {'Item': claim, 'ConditionExpression': 'attribute_not_exists(username)'})
+    ]
+
+def user_delete_operations(user):
+    """Transaction writes that delete a user and release its username claim"""
+    return [
+        ('Delete', 'users', {'Key': {'user_id': user['user_id']}}),
+        # Users created before claims existed have none; never release a claim held by another user
+        ('Delete', 'usernames', {
+            'Key': {'username': user['username']},
+            'ConditionExpression': 'attribute_not_exists(username) OR user_id = :user_id',
+            'ExpressionAttributeValues': {':user_id': user['user_id']}
+        })
+    ]
+
 def handle_login(event):
     """Handle user login"""
     try:
@@ -96,27 +169,26 @@ def handle_login(event):
         if not username or not password:
             return error_response(400, 'Username and password required')
         
-        # Query user by username
-        response = users_table.scan(
-            FilterExpression='username = :username',
-            ExpressionAttributeValues={':username': username}
-        )
-        
-        users = response.get('Items', [])
+        user = find_user_by_username(username)
         
-        if not users:
+        if not user:
             return error_response(401, 'Invalid username or password')
         
-        user = users[0]
-        
         # Check if user is active
         if not user.get('is_active', True):
             return error_response(403, 'Account is disabled')
         
-        # Verify password (in production, use proper password hashing)
-        if user.get('password') != password:
+        # Verify password against its salted hash (or a legacy plaintext value)
+        with metrics.phase('password_verify'):
+            verified = passwords.verify_password(password, user.get('password'))
+        if not verified:
             return error_response(401, 'Invalid username or password')
         
+        # Upgrade plaintext and differently-costed hashes now that the password is known
+        if passwords.needs_rehash(user['password']):
+            with metrics.phase('password_rehash'):
+                rehash_password(user, password)
+        
         # Return user info (excluding password)
         user_info = {
             'user_id': user['user_id'],
@@ -127,57 +199,103 @@ def handle_login(event):
             'is_active': user.get('is_active', True)
         }
         
+        # Signed session token; handlers verify it without reading the users table
+        token, expires_at = auth.issue_token(user)
+        
         return {
             'statusCode': 200,
             'headers': cors_headers(),
-            'body': json.dumps({
+            'body': serialization.dumps({
                 'message': 'Login successful',
-                'user': user_info
-            }, default=decimal_default)
+                'user': user_info,
+                'token': token,
+                'expires_at': expires_at
+            })
         }
     
     except Exception as e:
         print(f"Login error: {str(e)}")
         return error_response(500, f'Login failed: {str(e)}')
 
+def rehash_password(user, password):
+    """Store the password at the current hashing cost, unless it changed since it was read"""
+    try:
+        aws.table('users').update_item(
+            Key={'user_id': user['user_id']},
+            UpdateExpression='SET #password = :new_password',
+            ConditionExpression='#password = :old_password',
+            ExpressionAttributeNames={'#password': 'password'},
+            ExpressionAttributeValues={':new_password': passwords.hash_password(password),
+                                       ':old_password': user['password']}
+        )
+    except Exception as e:
+        # The login itself succeeded; the next one will try again
+        print(f"Password rehash for user {user['user_id']} skipped: {str(e)}")
+
 def list_users(event):
-    """List all users with optional filtering"""
+    """List users a page at a time from the role index, optionally filtered by role and status
+    
+    Without a role filter the roles are listed one after another. The page
+    token records the role being read and its LastEvaluatedKey. Only the
+    index's projected fields are read, so password hashes are never read.
+    """
     try:
         query_params = event.get('queryStringParameters', {}) or {}
         role = query_params.get('role')
         is_active = query_params.get('is_active')
         
-        # Scan with optional filters
-        scan_kwargs = {}
-        filter_expressions = []
+        if role and role not in VALID_ROLES:
+            return error_response(400, f'Invalid role. Must be one of: {", ".join(VALID_ROLES)}')
+        try:
+            limit = pagination.page_size(query_params.get('limit'))
+            token = pagination.decode_token(query_params.get('next_token')) or {}
+        except pagination.PageTokenError as e:
+            return error_response(400, str(e))
+        
+        roles = [role] if role else list(VALID_ROLES)
+        if token and token.get('role') not in roles:
+            return error_response(400, 'next_token is not valid')
+        position = roles.index(token['role']) if token else 0
+        start_key = token.get('key')
+        
+        names = {f'#f{i}': field for i, field in enumerate(LISTING_FIELDS)}
+        query_kwargs = {
+            'IndexName': ROLE_INDEX,
+            'KeyConditionExpression': '#role = :role',
+            'ProjectionExpression': ', '.join(names),
+            'ExpressionAttributeNames': dict(names, **{'#role': 'role'})
+        }
         expression_values = {}
-        
-        if role:
-            filter_expressions.append('role = :role')
-            expression_values[':role'] = role
-        
         if is_active is not None:
-            filter_expressions.append('is_active = :is_active')
+            query_kwargs['FilterExpression'] = '#is_active = :is_active'
+            query_kwargs['ExpressionAttributeNames']['#is_active'] = 'is_active'
             expression_values[':is_active'] = is_active.lower() == 'true'
         
-        if filter_expressions:
-            scan_kwargs['FilterExpression'] = ' AND '.join(filter_expressions)
-            scan_kwargs['ExpressionAttributeValues'] = expression_values
-        
-        response = users_table.scan(**scan_kwargs)
-        users = response.get('Items', [])
-        
-        # Remove passwords from response
-        for user in users:
-            user.pop('password', None)
+        users = []
+        next_token = None
+        while position < len(roles):
+            kwargs = dict(query_kwargs, Limit=limit - len(users),
+                          ExpressionAttributeValues=dict(expression_values, **{':role': roles[position]}))
+            if start_key:
+                kwargs['ExclusiveStartKey'] = start_key
+            response = aws.table('users').query(**kwargs)
+            users.extend(response.get('Items', []))
+            start_key = response.get('LastEvaluatedKey')
+            if not start_key:
+                position += 1
+            if len(users) >= limit:
+                break
+        if position < len(roles):
+            next_token = pagination.encode_token(dict({'role': roles[position]}, **({'key': start_key} if start_key else {})))
         
         return {
             'statusCode': 200,
             'headers': cors_headers(),
-            'body': json.dumps({
+            'body': serialization.dumps({
                 'users': users,
-                'count': len(users)
-            }, default=decimal_default)
+                'count': len(users),
+                'next_token': next_token
+            })
         }
     
     except Exception as e:
@@ -187,7 +305,7 @@ def list_users(event):
 def get_user(user_id):
     """Get a specific user by ID"""
     try:
-        response = users_table.get_item(Key={'user_id': user_id})
+        response = aws.table('users').get_item(Key={'user_id': user_id})
         
         if 'Item' not in response:
             return error_response(404, 'User not found')
@@ -198,7 +316,7 @@ def get_user(user_id):
         return {
             'statusCode': 200,
             'headers': cors_headers(),
-            'body': json.dumps(user, default=decimal_default)
+            'body': serialization.dumps(user)
         }
     
     except Exception as e:
@@ -218,19 +336,9 @@ def create_user(event):
         
         username = body['username'].strip().lower()
         
-        # Check if username already exists
-        existing = users_table.scan(
-            FilterExpression='username = :username',
-            ExpressionAttributeValues={':username': username}
-        )
-        
-        if existing.get('Items'):
-            return error_response(409, 'Username already exists')
-        
         # Validate role
-        valid_roles = ['admin', 'tutor', 'student']
-        if body['role'] not in valid_roles:
-            return error_response(400, f'Invalid role. Must be one of: {", ".join(valid_roles)}')
+        if body['role'] not in VALID_ROLES:
+            return error_response(400, f'Invalid role. Must be one of: {", ".join(VALID_ROLES)}')
         
         # Create user
         user_id = str(uuid.uuid4())
@@ -239,7 +347,7 @@ def create_user(event):
         user = {
             'user_id': user_id,
             'username': username,
-            'password': body['password'],  # In production, hash this!
+            'password': passwords.hash_password(body['password']),
             'email': body['email'].strip().lower(),
             'role': body['role'],
             'full_name': body.get('full_name', ''),
@@ -248,7 +356,16 @@ def create_user(event):
             'updated_at': timestamp
         }
         
-        users_table.put_item(Item=user)
+        if legacy_usernames([username]):
+            return error_response(409, 'Username already exists')
+        
+        # The username claim and the user are written together, so a taken username fails the whole write
+        try:
+            aws.transact_write(user_write_operations(user))
+        except Exception as e:
+            if aws.error_code(e) == 'TransactionCanceledException':
+                return error_response(409, 'Username already exists')
+            raise
         
         # Remove password from response
         user.pop('password')
@@ -256,21 +373,223 @@ def create_user(event):
         return {
             'statusCode': 201,
             'headers': cors_headers(),
-            'body': json.dumps({
+            'body': serialization.dumps({
                 'message': 'User created successfully',
                 'user': user
-            }, default=decimal_default)
+            })
         }
     
     except Exception as e:
         print(f"Create user error: {str(e)}")
         return error_response(500, f'Failed to create user: {str(e)}')
 
+def read_roster(text, fmt):
+    """Return (source, row) pairs for a CSV or JSON roster; rows that cannot be read are strings"""
+    rows = []
+    if fmt == 'csv':
+        reader = csv.DictReader(io.StringIO(text))
+        missing = [field for field in ('username', 'password', 'email', 'role') if field not in (reader.fieldnames or [])]
+        if missing:
+            return [('header', f"Missing column(s): {', '.join(missing)}")]
+        for row_number, row in enumerate(reader, start=2):
+            rows.append((f'row {row_number}', {field: (value or '').strip() for field, value in row.items() if field}))
+        return rows
+    
+    try:
+        document = json.loads(text)
+    except json.JSONDecodeError as e:
+        return [('document', f'Invalid JSON: {e.msg}')]
+    records = document.get('users') if isinstance(document, dict) else document
+    if not isinstance(records, list):
+        return [('document', 'Expected an array of users or {"users": [...]}')]
+    for index, record in enumerate(records):
+        rows.append((f'item {index + 1}', record if isinstance(record, dict) else 'Each item must be a user object'))
+    return rows
+
+def roster_user(row, timestamp):
+    """Return (user item, error message) for one roster row"""
+    for field in ('username', 'password', 'email', 'role'):
+        if not str(row.get(field) or '').strip():
+            return None, f'Missing required field: {field}'
+    username = str(row['username']).strip().lower()
+    if any(char.isspace() for char in username):
+        return None, 'Username must not contain spaces'
+    if row['role'] not in VALID_ROLES:
+        return None, f'Invalid role. Must be one of: {", ".join(VALID_ROLES)}'
+    
+    is_active = row.get('is_active', True)
+    if isinstance(is_active, str):
+        value = is_active.strip().lower()
+        if value not in ('', 'true', 'false', 'yes', 'no', '1', '0'):
+            return None, 'is_active must be true or false'
+        is_active = value in ('', 'true', 'yes', '1')
+    
+    return {
+        'user_id': str(uuid.uuid4()),
+        'username': username,
+        'password': str(row['password']),  # Hashed by import_roster just before it is written
+        'email': str(row['email']).strip().lower(),
+        'role': row['role'],
+        'full_name': str(row.get('full_name') or ''),
+        'is_active': bool(is_active),
+        'created_at': timestamp,
+        'updated_at': timestamp
+    }, None
+
+def claimed_usernames(usernames):
+    """Usernames that already have a claim, read by key from the usernames table"""
+    table_name = aws.table_name('usernames')
+    usernames = list(usernames)
+    claimed = set()
+    for start in range(0, len(usernames), BATCH_GET_LIMIT):
+        request = {table_name: {
+            'Keys': [{'username': username} for username in usernames[start:start + BATCH_GET_LIMIT]],
+            'ProjectionExpression': 'username'
+        }}
+        while request:
+            response = aws.resource('dynamodb').batch_get_item(RequestItems=request)
+            claimed.update(item['username'] for item in response.get('Responses', {}).get(table_name, []))
+            request = response.get('UnprocessedKeys') or None
+    return claimed
+
+def write_users(users):
+    """Write users and their claims with BatchWriteItem; return usernames whose writes never went through
+
+    Unprocessed items are retried with exponential backoff. Batch writes
+    cannot be conditional, so uniqueness relies on the claimed_usernames
+    pre-read.
+    """
+    users_table, usernames_table = aws.table_name('users'), aws.table_name('usernames')
+    request = {
+        users_table: [{'PutRequest': {'Item': user}} for user in users],
+        usernames_table: [{'PutRequest': {'Item': {'username': user['username'], 'user_id': user['user_id'],
+                                                   'created_at': user['created_at']}}} for user in users]
+    }
+    for attempt in range(BATCH_WRITE_ATTEMPTS):
+        response = aws.resource('dynamodb').batch_write_item(RequestItems=request)
+        request = response.get('UnprocessedItems') or {}
+        if not request:
+            return set()
+        time.sleep(BATCH_RETRY_DELAY * 2 ** attempt)
+    return {put['PutRequest']['Item']['username'] for puts in request.values() for put in puts}
+
+def import_roster(rows, dry_run=False, deadline=None, start=0):
+    """Validate (source, row) pairs, check usernames with one batched key read and write valid users in batches
+
+    Rows before ``start`` were handled by an earlier request and are skipped.
+    Once ``deadline`` (a time.monotonic() value) has passed, no further batch
+    is hashed; the rows left are reported as pending and ``next_start`` is the
+    row to resume from.
+    """
+    timestamp = datetime.utcnow().isoformat()
+    report = []
+    valid = []
+    seen = set()
+    for position, (source, row) in enumerate(rows):
+        if position < start:
+            continue
+        if isinstance(row, str):
+            report.append({'source': source, 'status': 'error', 'message': row})
+            continue
+        user, error = roster_user(row, timestamp)
+        if not error and user['username'] in seen:
+            error = 'Username appears more than once in the roster'
+        entry = {'source': source, 'username': (user or {}).get('username') or row.get('username')}
+        if error:
+            entry.update(status='error', message=error)
+        else:
+            seen.add(user['username'])
+            valid.append((position, entry, user))
+        report.append(entry)
+    
+    taken = claimed_usernames(seen) if seen else set()
+    taken |= legacy_usernames(seen - taken)
+    pending = []
+    for position, entry, user in valid:
+        if user['username'] in taken:
+            entry.update(status='error', message='Username already exists')
+        elif dry_run:
+            entry['status'] = 'valid'
+        else:
+            pending.append((position, entry, user))
+    
+    next_start = None
+    for first in range(0, len(pending), IMPORT_USERS_PER_BATCH):
+        if deadline is not None and time.monotonic() >= deadline:
+            next_start = pending[first][0]
+            for _, entry, _ in pending[first:]:
+                entry.update(status='pending', message='Not imported yet, resume the import from next_start')
+            break
+        chunk = pending[first:first + IMPORT_USERS_PER_BATCH]
+        for _, _, user in chunk:
+            user['password'] = passwords.hash_password(user['password'])
+        unwritten = write_users([user for _, _, user in chunk])
+        for _, entry, user in chunk:
+            if user['username'] in unwritten:
+                entry.update(status='error', message='Write was throttled, import this row again')
+            else:
+                entry.update(status='created', user_id=user['user_id'])
+    
+    imported = sum(1 for entry in report if entry['status'] in ('created', 'valid'))
+    return {
+        'imported': imported,
+        'failed': sum(1 for entry in report if entry['status'] == 'error'),
+        'pending': sum(1 for entry in report if entry['status'] == 'pending'),
+        'next_start': next_start,
+        'dry_run': dry_run,
+        'rows': report
+    }
+
+def import_users(event, context=None):
+    """Import a roster of users from CSV or JSON, as much of it as fits in one request"""
+    try:
+        query_params = event.get('queryStringParameters', {}) or {}
+        headers = {name.lower(): value for name, value in (event.get('headers') or {}).items()}
+        fmt = (query_params.get('format') or headers.get('content-type', '').split(';')[0]).strip().lower()
+        fmt = {'text/csv': 'csv', 'application/json': 'json'}.get(fmt, fmt)
+        if fmt not in ROSTER_FORMATS:
+            return error_response(400, f"format must be one of: {', '.join(ROSTER_FORMATS)}")
+        
+        body = event.get('body') or ''
+        if event.get('isBase64Encoded'):
+            body = base64.b64decode(body).decode('utf-8-sig')
+        dry_run = query_params.get('dry_run', '').lower() in ('1', 'true', 'yes')
+        try:
+            start = int(query_params.get('start') or 0)
+        except ValueError:
+            return error_response(400, 'start must be a row number')
+        
+        rows = read_roster(body, fmt)
+        if len(rows) > IMPORT_MAX_USERS:
+            return error_response(413, f'A roster can have at most {IMPORT_MAX_USERS} users')
+        
+        budget = IMPORT_TIME_BUDGET
+        if context is not None:
+            budget = min(budget, context.get_remaining_time_in_millis() / 1000)
+        deadline = time.monotonic() + budget - IMPORT_TIME_MARGIN
+        summary = import_roster(rows, dry_run=dry_run, deadline=deadline, start=max(start, 0))
+        if summary['pending']:
+            status_code = 202
+        elif summary['imported']:
+            status_code = 200 if dry_run else 201
+        else:
+            status_code = 400 if summary['failed'] else 200
+        
+        return {
+            'statusCode': status_code,
+            'headers': cors_headers(),
+            'body': serialization.dumps(summary)
+        }
+    
+    except Exception as e:
+        print(f"Import users error: {str(e)}")
+        return error_response(500, f'Failed to import users: {str(e)}')
+
 def update_user(user_id, event):
     """Update an existing user"""
     try:
         # Check if user exists
-        response = users_table.get_item(Key={'user_id': user_id})
+        response = aws.table('users').get_item(Key={'user_id': user_id})
         if 'Item' not in response:
             return error_response(404, 'User not found')
         
@@ -289,13 +608,12 @@ def update_user(user_id, event):
         
         if 'password' in body:
             update_parts.append('#password = :password')
-            expression_values[':password'] = body['password']  # Hash in production!
+            expression_values[':password'] = passwords.hash_password(body['password'])
             expression_names['#password'] = 'password'
         
         if 'role' in body:
-            valid_roles = ['admin', 'tutor', 'student']
-            if body['role'] not in valid_roles:
-                return error_response(400, f'Invalid role. Must be one of: {", ".join(valid_roles)}')
+            if body['role'] not in VALID_ROLES:
+                return error_response(400, f'Invalid role. Must be one of: {", ".join(VALID_ROLES)}')
             update_parts.append('#role = :role')
             expression_values[':role'] = body['role']
             expression_names['#role'] = 'role'
@@ -328,7 +646,7 @@ def update_user(user_id, event):
         if expression_names:
             update_kwargs['ExpressionAttributeNames'] = expression_names
         
-        response = users_table.update_item(**update_kwargs)
+        response = aws.table('users').update_item(**update_kwargs)
         
         user = response['Attributes']
         user.pop('password', None)  # Remove password
@@ -336,10 +654,10 @@ def update_user(user_id, event):
         return {
             'statusCode': 200,
             'headers': cors_headers(),
-            'body': json.dumps({
+            'body': serialization.dumps({
                 'message': 'User updated successfully',
                 'user': user
-            }, default=decimal_default)
+            })
         }
     
     except Exception as e:
@@ -350,12 +668,12 @@ def delete_user(user_id):
     """Delete a user"""
     try:
         # Check if user exists
-        response = users_table.get_item(Key={'user_id': user_id})
+        response = aws.table('users').get_item(Key={'user_id': user_id})
         if 'Item' not in response:
             return error_response(404, 'User not found')
         
-        # Delete user
-        users_table.delete_item(Key={'user_id': user_id})
+        # Delete user and free the username
+        aws.transact_write(user_delete_operations(response['Item']))
         
         return {
             'statusCode': 200,
@@ -374,7 +692,7 @@ def cors_headers():
     """Return CORS headers"""
     return {
         'Access-Control-Allow-Origin': '*',
-        'Access-Control-Allow-Headers': 'Content-Type,X-User-Role',
+        'Access-Control-Allow-Headers': 'Content-Type,Authorization',
         'Access-Control-Allow-Methods': 'GET,POST,PUT,DELETE,OPTIONS'
     }
 
@@ -38,7 +38,7 @@ try {
     }
     
     # Create zip file
-    Compress-Archive -Path "user_crud.py" -DestinationPath $ZipFile -Force
+    Compress-Archive -Path "user_crud.py", "..\shared" -DestinationPath $ZipFile -Force
     
     Write-Host "   ✓ Package created: $ZipFile" -ForegroundColor Green
     
@@ -73,6 +73,8 @@ try {
         & $pythonCmd.Source init_users.py $TableName
         if ($LASTEXITCODE -eq 0) {
             Write-Host "   ✓ Default users initialized" -ForegroundColor Green
+            # Users created before the usernames table existed need claims before usernames are unique
+            & $pythonCmd.Source init_users.py $TableName --claim-usernames
         } else {
             Write-Host "   ⚠ Failed to initialize users (you can run init_users.py manually)" -ForegroundColor Yellow
         }
@@ -61,6 +61,7 @@ rm -f "$ZIP_FILE"
 
 # Create zip file
 zip "$ZIP_FILE" user_crud.py
+(cd .. && zip -r "users/$ZIP_FILE" shared -x "*__pycache__*")
 
 echo "   ✓ Package created: $ZIP_FILE"
 echo ""
@@ -93,6 +94,8 @@ fi
 if [ -n "$PYTHON_CMD" ]; then
     $PYTHON_CMD init_users.py "$TABLE_NAME"
     echo "   ✓ Default users initialized"
+    # Users created before the usernames table existed need claims before usernames are unique
+    $PYTHON_CMD init_users.py "$TABLE_NAME" --claim-usernames
 fi
 
 echo ""
@@ -26,12 +26,55 @@ Write-Host "==========================================" -ForegroundColor Cyan
 # Step 1: Create CloudFormation Stack
 Write-Host ""
 Write-Host "Step 1: Creating/Updating CloudFormation Stack..." -ForegroundColor Yellow
-aws cloudformation deploy `
-  --template-file "$PROJECT_ROOT\cloudformation\deploy-stack.yaml" `
-  --stack-name $STACK_NAME `
-  --parameter-overrides Environment=$ENVIRONMENT `
-  --capabilities CAPABILITY_NAMED_IAM `
-  --region $REGION
+function Deploy-Stack([string[]]$Overrides) {
+    aws cloudformation deploy `
+      --template-file "$PROJECT_ROOT\cloudformation\deploy-stack.yaml" `
+      --stack-name $STACK_NAME `
+      --parameter-overrides Environment=$ENVIRONMENT @Overrides `
+      --capabilities CAPABILITY_NAMED_IAM `
+      --region $REGION
+}
+
+function Get-IndexStatus([string]$Table, [string]$Index) {
+    aws dynamodb describe-table --table-name $Table --region $REGION `
+      --query "Table.GlobalSecondaryIndexes[?IndexName=='$Index'].IndexStatus" --output text
+}
+
+# A stack update can create only one GSI per table. When an existing table lacks its
+# first new index, that index is added on its own, and the parameter's index follows
+# in a second update once it is ACTIVE.
+$STAGED_INDEXES = @(
+    @{ Parameter = "TemplatesSubjectIndex"; Table = "msc-evaluate-templates-$ENVIRONMENT"; FirstIndex = "course-index" },
+    @{ Parameter = "UsersRoleIndex"; Table = "msc-evaluate-users-$ENVIRONMENT"; FirstIndex = "username-index" }
+)
+$deferred = @()
+$pending = @()
+foreach ($staged in $STAGED_INDEXES) {
+    aws dynamodb describe-table --table-name $staged.Table --region $REGION 2>$null | Out-Null
+    if ($LASTEXITCODE -eq 0) {
+        $status = Get-IndexStatus $staged.Table $staged.FirstIndex
+        if (-not $status -or $status -eq "None") {
+            $deferred += "$($staged.Parameter)=false"
+            $pending += $staged
+        }
+    }
+}
+
+if ($deferred.Count -gt 0) {
+    Write-Host "Adding new indexes in two updates: $($deferred -join ' ')"
+    Deploy-Stack $deferred
+    if ($LASTEXITCODE -ne 0) {
+        Write-Host "ERROR: CloudFormation stack deployment failed" -ForegroundColor Red
+        exit 1
+    }
+    foreach ($staged in $pending) {
+        while ((Get-IndexStatus $staged.Table $staged.FirstIndex) -ne "ACTIVE") {
+            Write-Host "Waiting for $($staged.FirstIndex) on $($staged.Table) to become ACTIVE..."
+            Start-Sleep -Seconds 15
+        }
+    }
+}
+Deploy-Stack @()
 
 if ($LASTEXITCODE -ne 0) {
     Write-Host "ERROR: CloudFormation stack deployment failed" -ForegroundColor Red
@@ -99,7 +142,7 @@ Write-Host "Using temporary directory: $TEMP_DIR"
 # Package Template API Lambda
 Write-Host "Packaging Template API Lambda..."
 Push-Location "$PROJECT_ROOT\backend\templates"
-Compress-Archive -Path "template_api.py" -DestinationPath "$TEMP_DIR\template-api.zip" -Force
+Compress-Archive -Path "template_api.py", "..\shared" -DestinationPath "$TEMP_DIR\template-api.zip" -Force
 aws lambda update-function-code `
   --function-name $TEMPLATE_FUNCTION `
   --zip-file "fileb://$TEMP_DIR\template-api.zip" `
@@ -110,7 +153,7 @@ Pop-Location
 # Package Take Quiz Lambda
 Write-Host "Packaging Take Quiz Lambda..."
 Push-Location "$PROJECT_ROOT\backend\quiz"
-Compress-Archive -Path "take_quiz.py" -DestinationPath "$TEMP_DIR\take-quiz.zip" -Force
+Compress-Archive -Path "take_quiz.py", "..\shared" -DestinationPath "$TEMP_DIR\take-quiz.zip" -Force
 aws lambda update-function-code `
   --function-name $TAKE_QUIZ_FUNCTION `
   --zip-file "fileb://$TEMP_DIR\take-quiz.zip" `
@@ -119,7 +162,7 @@ Write-Host "Take Quiz Lambda deployed" -ForegroundColor Green
 
 # Package Submit Quiz Lambda
 Write-Host "Packaging Submit Quiz Lambda..."
-Compress-Archive -Path "submit_quiz.py" -DestinationPath "$TEMP_DIR\submit-quiz.zip" -Force
+Compress-Archive -Path "submit_quiz.py", "..\shared" -DestinationPath "$TEMP_DIR\submit-quiz.zip" -Force
 aws lambda update-function-code `
   --function-name $SUBMIT_QUIZ_FUNCTION `
   --zip-file "fileb://$TEMP_DIR\submit-quiz.zip" `
@@ -139,6 +182,7 @@ pip install -r requirements.txt -t $MSC_PACKAGE_DIR --quiet
 
 # Copy Lambda function
 Copy-Item "lambda_function.py" -Destination $MSC_PACKAGE_DIR
+Copy-Item "..\shared" -Destination $MSC_PACKAGE_DIR -Recurse
 
 # Create zip
 Push-Location $MSC_PACKAGE_DIR
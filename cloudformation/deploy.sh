@@ -28,12 +28,52 @@ echo "=========================================="
 # Step 1: Create CloudFormation Stack
 echo ""
 echo "Step 1: Creating/Updating CloudFormation Stack..."
-aws cloudformation deploy \
-  --template-file "${PROJECT_ROOT}/cloudformation/deploy-stack.yaml" \
-  --stack-name "${STACK_NAME}" \
-  --parameter-overrides Environment="${ENVIRONMENT}" \
-  --capabilities CAPABILITY_NAMED_IAM \
-  --region "${REGION}"
+deploy_stack() {
+  aws cloudformation deploy \
+    --template-file "${PROJECT_ROOT}/cloudformation/deploy-stack.yaml" \
+    --stack-name "${STACK_NAME}" \
+    --parameter-overrides Environment="${ENVIRONMENT}" "$@" \
+    --capabilities CAPABILITY_NAMED_IAM \
+    --region "${REGION}"
+}
+
+index_status() {
+  aws dynamodb describe-table --table-name "$1" --region "${REGION}" \
+    --query "Table.GlobalSecondaryIndexes[?IndexName=='$2'].IndexStatus" --output text
+}
+
+# A stack update can create only one GSI per table. Each entry is "<parameter> <table>
+# <first index>": when an existing table lacks its first new index, that index is added
+# on its own, and the parameter's index follows in a second update once it is ACTIVE.
+STAGED_INDEXES=(
+  "TemplatesSubjectIndex msc-evaluate-templates-${ENVIRONMENT} course-index"
+  "UsersRoleIndex msc-evaluate-users-${ENVIRONMENT} username-index"
+)
+DEFERRED=()
+PENDING=()
+for staged in "${STAGED_INDEXES[@]}"; do
+  read -r parameter table first_index <<< "${staged}"
+  if aws dynamodb describe-table --table-name "${table}" --region "${REGION}" > /dev/null 2>&1; then
+    status=$(index_status "${table}" "${first_index}")
+    if [ -z "${status}" ] || [ "${status}" = "None" ]; then
+      DEFERRED+=("${parameter}=false")
+      PENDING+=("${table} ${first_index}")
+    fi
+  fi
+done
+
+if [ ${#DEFERRED[@]} -gt 0 ]; then
+  echo "Adding new indexes in two updates: ${DEFERRED[*]}"
+  deploy_stack "${DEFERRED[@]}"
+  for pending in "${PENDING[@]}"; do
+    read -r table index <<< "${pending}"
+    until [ "$(index_status "${table}" "${index}")" = "ACTIVE" ]; do
+      echo "Waiting for ${index} on ${table} to become ACTIVE..."
+      sleep 15
+    done
+  done
+fi
+deploy_stack
 
 if [ $? -ne 0 ]; then
   echo "ERROR: CloudFormation stack deployment failed"
@@ -97,6 +137,7 @@ echo "Using temporary directory: ${TEMP_DIR}"
 echo "Packaging Template API Lambda..."
 cd "${PROJECT_ROOT}/backend/templates"
 zip -q "${TEMP_DIR}/template-api.zip" template_api.py
+(cd .. && zip -qr "${TEMP_DIR}/template-api.zip" shared -x "*__pycache__*")
 aws lambda update-function-code \
   --function-name "${TEMPLATE_FUNCTION}" \
   --zip-file "fileb://${TEMP_DIR}/template-api.zip" \
@@ -107,6 +148,7 @@ echo "✓ Template API Lambda deployed"
 echo "Packaging Take Quiz Lambda..."
 cd "${PROJECT_ROOT}/backend/quiz"
 zip -q "${TEMP_DIR}/take-quiz.zip" take_quiz.py
+(cd .. && zip -qr "${TEMP_DIR}/take-quiz.zip" shared -x "*__pycache__*")
 aws lambda update-function-code \
   --function-name "${TAKE_QUIZ_FUNCTION}" \
   --zip-file "fileb://${TEMP_DIR}/take-quiz.zip" \
@@ -116,6 +158,7 @@ echo "✓ Take Quiz Lambda deployed"
 # Package Submit Quiz Lambda
 echo "Packaging Submit Quiz Lambda..."
 zip -q "${TEMP_DIR}/submit-quiz.zip" submit_quiz.py
+(cd .. && zip -qr "${TEMP_DIR}/submit-quiz.zip" shared -x "*__pycache__*")
 aws lambda update-function-code \
   --function-name "${SUBMIT_QUIZ_FUNCTION}" \
   --zip-file "fileb://${TEMP_DIR}/submit-quiz.zip" \
@@ -23,7 +23,12 @@ const Login = ({ onLogin }) => {
       const response = await authAPI.login(selectedUser, password);
       
       if (response.data && response.data.user) {
-        const userData = response.data.user;
+        // Keep the session token with the user; api.js sends it on every request
+        const userData = {
+          ...response.data.user,
+          token: response.data.token,
+          expires_at: response.data.expires_at,
+        };
         
         // Store user data in localStorage
         localStorage.setItem('user', JSON.stringify(userData));
@@ -41,6 +41,8 @@ import { isAdmin, logout, getUsername } from '../../utils/auth';
 
 const Dashboard = ({ onLogout }) => {
   const [templates, setTemplates] = useState([]);
+  const [nextToken, setNextToken] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState('');
   const [selectedSubject, setSelectedSubject] = useState('');
@@ -54,15 +56,33 @@ const Dashboard = ({ onLogout }) => {
   const userIsAdmin = isAdmin();
   const username = getUsername();
 
+  useEffect(() => {
+    loadFilters();
+  }, []);
+
   useEffect(() => {
     loadTemplates();
     // eslint-disable-next-line react-hooks/exhaustive-deps
   }, [selectedSubject, selectedCourse]);
 
-  const loadTemplates = async () => {
+  const loadFilters = async () => {
+    try {
+      const response = await templatesAPI.getTemplateFilters();
+      setAvailableSubjects(response.data?.subjects || []);
+      setAvailableCourses(response.data?.courses || []);
+    } catch (error) {
+      console.error('Template filters error:', error);
+    }
+  };
+
+  const loadTemplates = async (pageToken = null) => {
     try {
-      setLoading(true);
-      const response = await templatesAPI.getTemplates(selectedSubject, selectedCourse);
+      if (pageToken) {
+        setLoadingMore(true);
+      } else {
+        setLoading(true);
+      }
+      const response = await templatesAPI.getTemplates(selectedSubject, selectedCourse, pageToken);
       console.log('Templates response:', response);
       
       // Handle different response formats
@@ -80,21 +100,20 @@ const Dashboard = ({ onLogout }) => {
         }
       }
       
-      setTemplates(templatesData);
-      
-      // Extract unique subjects and courses from templates
-      const subjects = [...new Set(templatesData.map(t => t.subject).filter(Boolean))].sort();
-      const courses = [...new Set(templatesData.map(t => t.course).filter(Boolean))].sort();
-      
-      setAvailableSubjects(subjects);
-      setAvailableCourses(courses);
+      // Later pages are appended to the ones already shown
+      const allTemplates = pageToken ? [...templates, ...templatesData] : templatesData;
+      setTemplates(allTemplates);
+      setNextToken(response.data?.next_token || null);
       setError('');
     } catch (error) {
       console.error('Templates error:', error);
       setError('Failed to load templates');
-      setTemplates([]);
+      if (!pageToken) {
+        setTemplates([]);
+      }
     } finally {
       setLoading(false);
+      setLoadingMore(false);
     }
   };
 
@@ -129,8 +148,9 @@ const Dashboard = ({ onLogout }) => {
       });
       setDeleteDialogOpen(false);
       setTemplateToDelete(null);
-      // Reload templates
+      // Reload templates, and the filters in case this was the last template of a course or subject
       loadTemplates();
+      loadFilters();
     } catch (error) {
       console.error('Delete error:', error);
       setSnackbar({
@@ -371,6 +391,11 @@ const Dashboard = ({ onLogout }) => {
                                 variant="outlined"
                               />
                             </Box>
+                            {template.summary && (
+                              <Typography variant="body2" color="text.secondary" sx={{ mb: 1 }}>
+                                {template.summary}
+                              </Typography>
+                            )}
                             <Typography variant="body2" color="text.secondary">
                               Created: {(() => {
                                 const date = new Date(template.created_at);
@@ -400,6 +425,18 @@ const Dashboard = ({ onLogout }) => {
                 </Box>
               ))
             )}
+            {nextToken && (
+              <Box display="flex" justifyContent="center" mt={2}>
+                <Button
+                  variant="outlined"
+                  onClick={() => loadTemplates(nextToken)}
+                  disabled={loadingMore}
+                  startIcon={loadingMore ? <CircularProgress size={16} /> : null}
+                >
+                  Load more
+                </Button>
+              </Box>
+            )}
           </Box>
         )}
       </Container>
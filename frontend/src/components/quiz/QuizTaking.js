@@ -1,7 +1,7 @@
 import React, { useState, useEffect } from 'react';
 import { useParams, useNavigate } from 'react-router-dom';
 import { templatesAPI, quizAPI } from '../../services/api';
-import { isAdmin } from '../../utils/auth';
+import { getUser, isAdmin } from '../../utils/auth';
 import './Quiz.css';
 
 const QuizTaking = () => {
@@ -14,9 +14,10 @@ const QuizTaking = () => {
   const [loading, setLoading] = useState(true);
   const [submitting, setSubmitting] = useState(false);
   const [error, setError] = useState('');
-  const [studentName, setStudentName] = useState('');
   const [quizStarted, setQuizStarted] = useState(false);
   const userIsAdmin = isAdmin();
+  // Results are filed under the signed-in user; the API takes the name from the session token
+  const studentName = getUser()?.full_name || getUser()?.username || '';
 
   useEffect(() => {
     loadTemplate();
@@ -135,7 +136,6 @@ const QuizTaking = () => {
 
       const quizData = {
         template_id: templateId,
-        student_name: studentName,
         answers: answersWithPdf
       };
 
@@ -195,17 +195,7 @@ const QuizTaking = () => {
           <p className="quiz-details">{template.title}</p>
           <p className="quiz-details">{template.subject} - {template.course}</p>
           
-          <div className="form-group">
-            <label htmlFor="studentName">Enter Your Name</label>
-            <input
-              id="studentName"
-              type="text"
-              value={studentName}
-              onChange={(e) => setStudentName(e.target.value)}
-              placeholder="Your full name"
-              autoFocus
-            />
-          </div>
+          <p className="quiz-details">Taking this quiz as <strong>{studentName}</strong></p>
 
           {error && <div className="error-message">{error}</div>}
 
@@ -215,10 +205,6 @@ const QuizTaking = () => {
             </button>
             <button 
               onClick={() => {
-                if (!studentName.trim()) {
-                  setError('Please enter your name to continue');
-                  return;
-                }
                 setError('');
                 setQuizStarted(true);
               }}
@@ -341,6 +341,9 @@ const ResultsReport = () => {
 
               <div className="questions-answers">
                 <h3>Questions & Answers</h3>
+                {selectedResult.questions_unavailable && (
+                  <div className="error-message">{selectedResult.questions_unavailable}</div>
+                )}
                 {selectedResult.evaluations && selectedResult.evaluations.map((evaluation, index) => {
                   const question = selectedResult.questions && selectedResult.questions[evaluation.question_index];
                   return (
@@ -31,6 +31,7 @@ const TemplateCreator = () => {
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState('');
   const [success, setSuccess] = useState('');
+  const [warnings, setWarnings] = useState([]);
   
   // Form state
   const [title, setTitle] = useState('');
@@ -184,6 +185,7 @@ const TemplateCreator = () => {
     e.preventDefault();
     setError('');
     setSuccess('');
+    setWarnings([]);
 
     if (!validateForm()) {
       setError('Please fix the validation errors before submitting');
@@ -209,11 +211,14 @@ const TemplateCreator = () => {
 
       const response = await templatesAPI.createTemplate(templateData);
       setSuccess('Template created successfully!');
-      
-      // Redirect to dashboard after 2 seconds
-      setTimeout(() => {
-        navigate('/dashboard');
-      }, 2000);
+      // Stay on the page while the editor reads any rubric warnings
+      setWarnings(response.data.warnings || []);
+      if (!response.data.warnings?.length) {
+        // Redirect to dashboard after 2 seconds
+        setTimeout(() => {
+          navigate('/dashboard');
+        }, 2000);
+      }
     } catch (err) {
       const errorMessage = err.response?.data?.message || 'Failed to create template';
       setError(errorMessage);
@@ -381,6 +386,12 @@ const TemplateCreator = () => {
             </Alert>
           )}
 
+          {warnings.map((warning) => (
+            <Alert severity="warning" sx={{ mb: 3 }} key={warning}>
+              {warning}
+            </Alert>
+          ))}
+
           {/* Submit Button */}
           <Box display="flex" gap={2}>
             <Button
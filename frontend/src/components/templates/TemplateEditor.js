@@ -33,12 +33,14 @@ const TemplateEditor = () => {
   const [saving, setSaving] = useState(false);
   const [error, setError] = useState('');
   const [success, setSuccess] = useState('');
+  const [warnings, setWarnings] = useState([]);
   
   // Form state
   const [title, setTitle] = useState('');
   const [subject, setSubject] = useState('');
   const [course, setCourse] = useState('');
   const [questions, setQuestions] = useState([]);
+  const [version, setVersion] = useState(0);
 
   // Validation errors
   const [validationErrors, setValidationErrors] = useState({
@@ -62,6 +64,7 @@ const TemplateEditor = () => {
       setTitle(template.title);
       setSubject(template.subject);
       setCourse(template.course);
+      setVersion(template.version || 0);
       
       // Convert questions to elaborate format (handle both old MCQ and new elaborate formats)
       setQuestions(template.questions.map(q => ({
@@ -179,6 +182,7 @@ const TemplateEditor = () => {
     e.preventDefault();
     setError('');
     setSuccess('');
+    setWarnings([]);
 
     if (!validateForm()) {
       setError('Please fix the validation errors before submitting');
@@ -201,14 +205,20 @@ const TemplateEditor = () => {
         questions: cleanedQuestions,
       };
 
-      await templatesAPI.updateTemplate(templateId, templateData);
+      const response = await templatesAPI.patchTemplate(templateId, templateData, version);
+      setVersion(response.data.version);
       setSuccess('Template updated successfully!');
-      
-      setTimeout(() => {
-        navigate('/dashboard');
-      }, 2000);
+      // Stay on the page while the editor reads any rubric warnings
+      setWarnings(response.data.warnings || []);
+      if (!response.data.warnings?.length) {
+        setTimeout(() => {
+          navigate('/dashboard');
+        }, 2000);
+      }
     } catch (err) {
-      const errorMessage = err.response?.data?.message || 'Failed to update template';
+      const errorMessage = err.response?.status === 409
+        ? 'This template was changed by someone else. Reload the page to get the latest version before saving.'
+        : err.response?.data?.message || 'Failed to update template';
       setError(errorMessage);
     } finally {
       setSaving(false);
@@ -376,6 +386,12 @@ const TemplateEditor = () => {
             </Alert>
           )}
 
+          {warnings.map((warning) => (
+            <Alert severity="warning" sx={{ mb: 3 }} key={warning}>
+              {warning}
+            </Alert>
+          ))}
+
           {/* Submit Button */}
           <Box display="flex" gap={2}>
             <Button
@@ -9,6 +9,8 @@ const UserManagement = () => {
   const [showModal, setShowModal] = useState(false);
   const [editingUser, setEditingUser] = useState(null);
   const [filterRole, setFilterRole] = useState('');
+  const [nextToken, setNextToken] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
   
   const [formData, setFormData] = useState({
     username: '',
@@ -23,18 +25,25 @@ const UserManagement = () => {
     loadUsers();
   }, [filterRole]);
 
-  const loadUsers = async () => {
-    setLoading(true);
+  const loadUsers = async (pageToken = null) => {
+    if (pageToken) {
+      setLoadingMore(true);
+    } else {
+      setLoading(true);
+    }
     setError('');
     try {
       const filters = filterRole ? { role: filterRole } : {};
-      const response = await usersAPI.getUsers(filters);
-      setUsers(response.data.users);
+      const response = await usersAPI.getUsers(filters, pageToken);
+      // Later pages are appended to the ones already shown
+      setUsers(prev => (pageToken ? [...prev, ...response.data.users] : response.data.users));
+      setNextToken(response.data.next_token || null);
     } catch (err) {
       console.error('Error loading users:', err);
       setError(err.response?.data?.error || 'Failed to load users');
     } finally {
       setLoading(false);
+      setLoadingMore(false);
     }
   };
 
@@ -196,6 +205,17 @@ const UserManagement = () => {
               )}
             </tbody>
           </table>
+          {nextToken && (
+            <div className="load-more">
+              <button
+                className="btn-secondary"
+                onClick={() => loadUsers(nextToken)}
+                disabled={loadingMore}
+              >
+                {loadingMore ? 'Loading...' : 'Load more'}
+              </button>
+            </div>
+          )}
         </div>
       )}
 
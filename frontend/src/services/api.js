@@ -10,14 +10,14 @@ const api = axios.create({
   },
 });
 
-// Add request interceptor to include user role in headers
+// Add request interceptor to send the session token issued at login
 api.interceptors.request.use((config) => {
   const userStr = localStorage.getItem('user');
   if (userStr) {
     try {
       const user = JSON.parse(userStr);
-      if (user.role) {
-        config.headers['X-User-Role'] = user.role;
+      if (user.token) {
+        config.headers['Authorization'] = `Bearer ${user.token}`;
       }
     } catch (e) {
       console.error('Failed to parse user from localStorage', e);
@@ -26,6 +26,19 @@ api.interceptors.request.use((config) => {
   return config;
 });
 
+// An expired or invalid session token means the user has to log in again
+api.interceptors.response.use(
+  (response) => response,
+  (error) => {
+    const isLogin = error.config?.url?.endsWith('/users/login');
+    if (error.response?.status === 401 && !isLogin) {
+      localStorage.removeItem('user');
+      window.location.assign('/login');
+    }
+    return Promise.reject(error);
+  }
+);
+
 // Authentication API calls
 export const authAPI = {
   login: (username, password) => api.post('/users/login', { username, password }),
@@ -33,10 +46,11 @@ export const authAPI = {
 
 // User Management API calls (Admin only)
 export const usersAPI = {
-  getUsers: (filters) => {
+  getUsers: (filters, nextToken) => {
     const params = {};
     if (filters?.role) params.role = filters.role;
     if (filters?.is_active !== undefined) params.is_active = filters.is_active;
+    if (nextToken) params.next_token = nextToken;
     return api.get('/users', { params });
   },
   getUserById: (userId) => api.get(`/users/${userId}`),
@@ -47,21 +61,34 @@ export const usersAPI = {
 
 // Templates API calls
 export const templatesAPI = {
-  getTemplates: (subject, course) => {
+  getTemplates: (subject, course, nextToken) => {
     const params = {};
     if (subject) params.subject = subject;
     if (course) params.course = course;
+    if (nextToken) params.next_token = nextToken;
     return api.get('/templates', { params });
   },
+  // Every course and subject with a template, not only those on the pages loaded so far
+  getTemplateFilters: () => api.get('/templates/filters'),
   getTemplateById: (templateId) => api.get(`/templates/${templateId}`),
   createTemplate: (templateData) => api.post('/templates', templateData),
   updateTemplate: (templateId, templateData) => api.put(`/templates/${templateId}`, templateData),
+  // Sends only the fields being edited plus the version they were read at; 409 means someone else saved first
+  patchTemplate: (templateId, changes, version) => api.patch(`/templates/${templateId}`, { ...changes, version }),
   deleteTemplate: (templateId) => api.delete(`/templates/${templateId}`),
 };
 
 // Quiz API calls
 export const quizAPI = {
   submitQuiz: (quizData) => api.post('/submit', quizData),
+  // Paged delivery: omit sessionId on the first page to start a session
+  getQuizPage: (templateId, page, pageSize, sessionId) => {
+    const params = { page, page_size: pageSize };
+    if (sessionId) params.session_id = sessionId;
+    return api.get(`/templates/${templateId}/quiz`, { params });
+  },
+  saveAnswer: (sessionId, questionIndex, answerText) =>
+    api.post('/submit/answer', { session_id: sessionId, question_index: questionIndex, answer_text: answerText }),
 };
 
 // Results API calls
@@ -13,7 +13,9 @@ export const getUser = () => {
 };
 
 export const isAuthenticated = () => {
-  return getUser() !== null;
+  const user = getUser();
+  // Sessions from before token login, or past their expiry, need a new login
+  return Boolean(user && user.token && (!user.expires_at || user.expires_at * 1000 > Date.now()));
 };
 
 export const isAdmin = () => {
@@ -19,39 +19,39 @@ try {
     Write-Host "[1/6] Updating user-crud Lambda..." -ForegroundColor Green
     Set-Location "$rootDir\backend\users"
     if (Test-Path "user_crud.zip") { Remove-Item "user_crud.zip" -Force }
-    Compress-Archive -Path "user_crud.py" -DestinationPath "user_crud.zip" -Force
+    Compress-Archive -Path "user_crud.py", "..\shared" -DestinationPath "user_crud.zip" -Force
     aws lambda update-function-code --function-name "msc-evaluate-user-crud-$Environment" --zip-file fileb://user_crud.zip --region $Region | Out-Null
     Write-Host "   ✓ user-crud updated" -ForegroundColor Green
 
     Write-Host "[2/6] Updating template-api Lambda..." -ForegroundColor Green
     Set-Location "$rootDir\backend\templates"
     if (Test-Path "template_api.zip") { Remove-Item "template_api.zip" -Force }
-    Compress-Archive -Path "template_api.py" -DestinationPath "template_api.zip" -Force
+    Compress-Archive -Path "template_api.py", "..\shared" -DestinationPath "template_api.zip" -Force
     aws lambda update-function-code --function-name "msc-evaluate-template-api-$Environment" --zip-file fileb://template_api.zip --region $Region | Out-Null
     Write-Host "   ✓ template-api updated" -ForegroundColor Green
 
     Write-Host "[3/6] Updating take-quiz Lambda..." -ForegroundColor Green
     Set-Location "$rootDir\backend\quiz"
     if (Test-Path "take_quiz.zip") { Remove-Item "take_quiz.zip" -Force }
-    Compress-Archive -Path "take_quiz.py" -DestinationPath "take_quiz.zip" -Force
+    Compress-Archive -Path "take_quiz.py", "..\shared" -DestinationPath "take_quiz.zip" -Force
     aws lambda update-function-code --function-name "msc-evaluate-take-quiz-$Environment" --zip-file fileb://take_quiz.zip --region $Region | Out-Null
     Write-Host "   ✓ take-quiz updated" -ForegroundColor Green
 
     Write-Host "[4/6] Updating submit-quiz Lambda..." -ForegroundColor Green
     if (Test-Path "submit_quiz.zip") { Remove-Item "submit_quiz.zip" -Force }
-    Compress-Archive -Path "submit_quiz.py" -DestinationPath "submit_quiz.zip" -Force
+    Compress-Archive -Path "submit_quiz.py", "..\shared" -DestinationPath "submit_quiz.zip" -Force
     aws lambda update-function-code --function-name "msc-evaluate-submit-quiz-$Environment" --zip-file fileb://submit_quiz.zip --region $Region | Out-Null
     Write-Host "   ✓ submit-quiz updated" -ForegroundColor Green
 
     Write-Host "[5/6] Updating get-results Lambda..." -ForegroundColor Green
     if (Test-Path "get_results.zip") { Remove-Item "get_results.zip" -Force }
-    Compress-Archive -Path "get_results.py" -DestinationPath "get_results.zip" -Force
+    Compress-Archive -Path "get_results.py", "..\shared" -DestinationPath "get_results.zip" -Force
     aws lambda update-function-code --function-name "msc-evaluate-get-results-$Environment" --zip-file fileb://get_results.zip --region $Region | Out-Null
     Write-Host "   ✓ get-results updated" -ForegroundColor Green
 
     Write-Host "[6/6] Updating delete-result Lambda..." -ForegroundColor Green
     if (Test-Path "delete_result.zip") { Remove-Item "delete_result.zip" -Force }
-    Compress-Archive -Path "delete_result.py" -DestinationPath "delete_result.zip" -Force
+    Compress-Archive -Path "delete_result.py", "..\shared" -DestinationPath "delete_result.zip" -Force
     aws lambda update-function-code --function-name "msc-evaluate-delete-result-$Environment" --zip-file fileb://delete_result.zip --region $Region | Out-Null
     Write-Host "   ✓ delete-result updated" -ForegroundColor Green
 